@@ -12,6 +12,8 @@
 #ifndef LSST_IP_DIFFIM_ASSESSSPATIALKERNELVISITOR_H
 #define LSST_IP_DIFFIM_ASSESSSPATIALKERNELVISITOR_H
 
+#include <vector>
+
 #include "lsst/afw/math.h"
 #include "lsst/afw/image.h"
 #include "lsst/ip/diffim.h"
@@ -35,12 +37,22 @@ namespace detail {
             );
         virtual ~AssessSpatialKernelVisitor() {};
 
-        void reset() {_nGood = 0; _nRejected = 0; _nProcessed = 0;}
+        void reset() {_nGood = 0; _nRejected = 0; _nProcessed = 0; _queue.clear();}
 
         int getNGood() {return _nGood;}
         int getNRejected() {return _nRejected;}
         int getNProcessed() {return _nProcessed;}
+
+        /*
+           With more than one thread, processCandidate() only queues the
+           candidates to be assessed; processQueuedCandidates() must then be
+           called after visiting the cells to assess them in parallel.
+        */
+        void setNThreads(int nThreads) {_nThreads = nThreads;}
+        int getNThreads() {return _nThreads;}
+
         void processCandidate(lsst::afw::math::SpatialCellCandidate *candidate);
+        void processQueuedCandidates();
 
     private:
         std::shared_ptr<lsst::afw::math::LinearCombinationKernel> _spatialKernel;   ///< Spatial kernel function
@@ -53,6 +65,16 @@ namespace detail {
        
         bool _useCoreStats;                   ///< Extracted from policy
         int _coreRadius;                      ///< Extracted from policy
+        int _nThreads;                        ///< Number of threads used to assess candidates
+        std::vector<lsst::afw::math::SpatialCellCandidate *> _queue; ///< Candidates waiting to be assessed
+
+        void _processCandidate(lsst::afw::math::SpatialCellCandidate *candidate,
+                               lsst::afw::math::Kernel &spatialKernel,
+                               lsst::afw::math::Kernel::SpatialFunction const &spatialBackground,
+                               ImageStatistics<PixelT> &imstats,
+                               int &nGood,
+                               int &nRejected,
+                               int &nProcessed);
     };
 
     template<typename PixelT>
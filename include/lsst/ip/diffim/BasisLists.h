@@ -110,11 +110,53 @@ namespace diffim {
         lsst::afw::math::KernelList const &kernelListIn
         );
 
+    /**
+     * @brief A FixedKernel that remembers the separable factorisation of an Alard/Lupton basis kernel
+     *
+     * @note The kernel image is scale * yFactor (x) xFactor - offset * K_0, where
+     * (x) is the outer product and K_0 is the first kernel of the basis list made
+     * by makeAlardLuptonBasisList.  The 1-D factors are the (sum-normalized)
+     * Gaussian times the x or y polynomial term.
+     *
+     * @ingroup ip_diffim
+     */
+    class AlardLuptonKernel : public lsst::afw::math::FixedKernel {
+    public:
+        typedef std::shared_ptr<AlardLuptonKernel> Ptr;
+
+        /**
+         * @param image    Kernel image
+         * @param xFactor  1-D factor along x (columns) of the raw basis kernel
+         * @param yFactor  1-D factor along y (rows) of the raw basis kernel
+         * @param scale    Scaling of the raw separable kernel
+         * @param offset   Amount of the first basis kernel subtracted from the scaled raw kernel
+         */
+        AlardLuptonKernel(lsst::afw::image::Image<Pixel> const &image,
+                          std::vector<double> const &xFactor,
+                          std::vector<double> const &yFactor,
+                          double scale,
+                          double offset);
+        virtual ~AlardLuptonKernel() {};
+
+        std::shared_ptr<lsst::afw::math::Kernel> clone() const override;
+
+        std::vector<double> const& getXFactor() const { return _xFactor; }
+        std::vector<double> const& getYFactor() const { return _yFactor; }
+        double getScale() const { return _scale; }
+        double getOffset() const { return _offset; }
+
+    private:
+        std::vector<double> _xFactor;   ///< 1-D factor along x
+        std::vector<double> _yFactor;   ///< 1-D factor along y
+        double _scale;                  ///< Scaling of the separable term
+        double _offset;                 ///< Coefficient of the first basis kernel
+    };
+
     /**
      * @brief Build a set of Alard/Lupton basis kernels
      *
-     * @note Should consider implementing as SeparableKernels for additional speed,
-     * but this will make the normalization a bit more complicated
+     * @note The kernels are AlardLuptonKernels, which retain their separable
+     * factorisation so that basis convolutions can be done with 1-D passes
      * 
      * @param halfWidth  size is 2*N + 1
      * @param nGauss     number of gaussians
@@ -13,6 +13,7 @@
 #define LSST_IP_DIFFIM_BUILDSINGLEKERNELVISITOR_H
 
 #include <memory>
+#include <vector>
 
 #include "lsst/afw/image.h"
 #include "lsst/afw/math.h"
@@ -54,9 +55,18 @@ namespace detail {
         
         int getNRejected()    {return _nRejected;}
         int getNProcessed()   {return _nProcessed;}
-        void reset()          {_nRejected = 0; _nProcessed = 0;}
+        void reset()          {_nRejected = 0; _nProcessed = 0; _queue.clear();}
+
+        /*
+           With more than one thread, processCandidate() only queues the
+           candidates to be built; processQueuedCandidates() must then be
+           called after visiting the cells to build them in parallel.
+        */
+        void setNThreads(int nThreads)   {_nThreads = nThreads;}
+        int getNThreads()                {return _nThreads;}
         
         void processCandidate(lsst::afw::math::SpatialCellCandidate *candidate);
+        void processQueuedCandidates();
 
     private:
         lsst::afw::math::KernelList const _basisList; ///< Basis set
@@ -70,6 +80,13 @@ namespace detail {
 
         bool _useCoreStats;                   ///< Extracted from _policy
         int _coreRadius;                      ///< Extracted from _policy
+        int _nThreads;                        ///< Number of threads used to build candidates
+        std::vector<lsst::afw::math::SpatialCellCandidate *> _queue; ///< Candidates waiting to be built
+
+        void _processCandidate(lsst::afw::math::SpatialCellCandidate *candidate,
+                               ImageStatistics<PixelT> &imstats,
+                               int &nRejected,
+                               int &nProcessed);
     };
     
     template<typename PixelT>
@@ -12,6 +12,10 @@
 #ifndef LSST_IP_DIFFIM_BUILDSPATIALKERNELVISITOR_H
 #define LSST_IP_DIFFIM_BUILDSPATIALKERNELVISITOR_H
 
+#include <map>
+#include <set>
+#include <utility>
+
 #include "Eigen/Core"
 #include "lsst/afw/math.h"
 #include "lsst/afw/image.h"
@@ -36,6 +40,14 @@ namespace detail {
 
         int getNCandidates() {return _nCandidates;}
 
+        /*
+           Start a new visit of the cells.  Candidates already in the spatial
+           solution that are not visited again before solveLinearEquation() are
+           removed from it; those visited again with the same single kernel
+           solution are not added again.
+        */
+        void reset() {_nCandidates = 0; _visited.clear();}
+
         void processCandidate(lsst::afw::math::SpatialCellCandidate *candidate);
 
         void solveLinearEquation();
@@ -46,8 +58,12 @@ namespace detail {
                   lsst::afw::math::Kernel::SpatialFunctionPtr> getSolutionPair();
 
     private:
+        typedef std::pair<lsst::afw::geom::Point2D, std::shared_ptr<StaticKernelSolution<PixelT> > > Constraint;
+
         std::shared_ptr<SpatialKernelSolution> _kernelSolution;
         int _nCandidates;                  ///< Number of candidates visited
+        std::map<int, Constraint> _constraints; ///< Single kernel solutions in _kernelSolution, by candidate id
+        std::set<int> _visited;            ///< Ids of candidates visited since reset()
     };
 
     template<typename PixelT>
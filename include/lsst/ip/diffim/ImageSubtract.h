@@ -89,6 +89,59 @@ namespace diffim {
         bool invert=true
         );
 
+    /**
+     * @brief Execute fundamental task of convolving template and subtracting it from science image,
+     * writing the difference into a caller supplied image
+     * 
+     * @note The difference is computed in a single pass over the convolved template, without
+     * any temporary images.  differenceImage must have the dimensions of templateImage and
+     * must not share pixels with either input.
+     * 
+     * @param differenceImage  MaskedImage to write the difference image into
+     * @param templateImage  MaskedImage to apply convolutionKernel to
+     * @param scienceMaskedImage  MaskedImage from which convolved templateImage is subtracted 
+     * @param convolutionKernel  Kernel to apply to templateImage
+     * @param background  Background scalar or function to subtract after convolution
+     * @param invert  Invert the output difference image
+     * 
+     * @ingroup ip_diffim
+     */
+    template <typename PixelT, typename BackgroundT>
+    void convolveAndSubtract(
+        lsst::afw::image::MaskedImage<PixelT> &differenceImage,
+        lsst::afw::image::MaskedImage<PixelT> const& templateImage,
+        lsst::afw::image::MaskedImage<PixelT> const& scienceMaskedImage,
+        lsst::afw::math::Kernel const& convolutionKernel,
+        BackgroundT background,
+        bool invert=true
+        );
+
+    /**
+     * @brief Execute fundamental task of convolving template and subtracting it from science image,
+     * writing the difference into a caller supplied image
+     * 
+     * @note This version accepts an Image for the template; the mask and variance of the
+     * difference are those of scienceMaskedImage
+     * 
+     * @param differenceImage  MaskedImage to write the difference image into
+     * @param templateImage  Image to apply convolutionKernel to
+     * @param scienceMaskedImage  MaskedImage from which convolved templateImage is subtracted 
+     * @param convolutionKernel  Kernel to apply to templateImage
+     * @param background  Background scalar or function to subtract after convolution
+     * @param invert  Invert the output difference image
+     * 
+     * @ingroup ip_diffim
+     */
+    template <typename PixelT, typename BackgroundT>
+    void convolveAndSubtract(
+        lsst::afw::image::MaskedImage<PixelT> &differenceImage,
+        lsst::afw::image::Image<PixelT> const& templateImage,
+        lsst::afw::image::MaskedImage<PixelT> const& scienceMaskedImage,
+        lsst::afw::math::Kernel const& convolutionKernel,
+        BackgroundT background,
+        bool invert=true
+        );
+
     /**
      * @brief Turns a 2-d Image into a 2-d Eigen Matrix
      *
@@ -12,6 +12,8 @@
 #ifndef LSST_IP_DIFFIM_KERNELPCA_H
 #define LSST_IP_DIFFIM_KERNELPCA_H
 
+#include <vector>
+
 #include "lsst/afw/image.h"
 #include "lsst/afw/math.h"
 
@@ -46,12 +48,26 @@ namespace detail {
         virtual ~KernelPcaVisitor() {};
         
         lsst::afw::math::KernelList getEigenKernels();
+        void reset() {_queue.clear();}
         void processCandidate(lsst::afw::math::SpatialCellCandidate *candidate);
         void subtractMean();
         PTR(ImageT) returnMean() {return _mean;}
+
+        /*
+           With more than one thread, processCandidate() only queues the
+           candidates; processQueuedCandidates() must then be called after
+           visiting the cells to make their kernel images in parallel.
+        */
+        void setNThreads(int nThreads) {_nThreads = nThreads;}
+        int getNThreads() {return _nThreads;}
+        void processQueuedCandidates();
     private:
         std::shared_ptr<KernelPca<ImageT> > _imagePca;  ///< Structure to fill with images
         PTR(ImageT) _mean;                                ///< Mean image calculated before Pca
+        int _nThreads;                                    ///< Number of threads used to make kernel images
+        std::vector<lsst::afw::math::SpatialCellCandidate *> _queue; ///< Candidates waiting to be added
+
+        PTR(ImageT) _makeKernelImage(lsst::afw::math::SpatialCellCandidate *candidate);
     };
 
     template<typename PixelT>
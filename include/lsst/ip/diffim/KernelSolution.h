@@ -12,7 +12,9 @@
 #ifndef LSST_IP_DIFFIM_KERNELSOLUTION_H
 #define LSST_IP_DIFFIM_KERNELSOLUTION_H
 
+#include <atomic>
 #include <memory>
+#include <string>
 #include "Eigen/Core"
 
 #include "lsst/afw/math.h"
@@ -44,7 +46,8 @@ namespace diffim {
 
         enum ConditionNumberType {
             EIGENVALUE = 0,
-            SVD        = 1
+            SVD        = 1,
+            ESTIMATE   = 2
         };
 
         explicit KernelSolution(Eigen::MatrixXd mMat,
@@ -58,6 +61,21 @@ namespace diffim {
         virtual void solve(Eigen::MatrixXd const& mMat, 
                            Eigen::VectorXd const& bVec);
         KernelSolvedBy getSolvedBy() {return _solvedBy;} 
+        /**
+         * @brief Set the first method tried by solve()
+         *
+         * @note The methods are tried in the order CHOLESKY_LLT, CHOLESKY_LDLT, LU,
+         * EIGENVECTOR, starting from solveMethod, until one succeeds.
+         */
+        void setSolveMethod(KernelSolvedBy solveMethod);
+        KernelSolvedBy getSolveMethod() const {return _solveMethod;}
+        /// Convert a solveMethod Policy string, e.g. "CHOLESKY_LLT", to its KernelSolvedBy value
+        static KernelSolvedBy parseSolveMethod(std::string const& solveMethod);
+        /**
+         * @note ESTIMATE returns the 1-norm condition number estimated from the
+         * factorization made by the most recent solve, i.e. of M + lambda H for a
+         * regularized solution.  Before a solve it factorizes M.
+         */
         virtual double getConditionNumber(ConditionNumberType conditionType);
         virtual double getConditionNumber(Eigen::MatrixXd const& mMat, ConditionNumberType conditionType);
 
@@ -74,8 +92,10 @@ namespace diffim {
         Eigen::VectorXd _bVec;               ///< Derived least squares B vector
         Eigen::VectorXd _aVec;               ///< Derived least squares solution matrix
         KernelSolvedBy _solvedBy;                               ///< Type of algorithm used to make solution
+        KernelSolvedBy _solveMethod;                            ///< First algorithm tried by solve
+        double _conditionEstimate;                              ///< Condition number estimate from the solve
         bool _fitForBackground;                                 ///< Background terms included in fit
-        static int _SolutionId;                                 ///< Unique identifier for solution
+        static std::atomic<int> _SolutionId;                    ///< Unique identifier for solution
 
     };
 
@@ -101,10 +121,20 @@ namespace diffim {
         virtual double getKsum();
         virtual std::pair<std::shared_ptr<lsst::afw::math::Kernel>, double> getSolutionPair();
 
+        /**
+         * @brief Keep the design matrix, image and inverse variance vectors after build()
+         *
+         * @note If false, build() accumulates M and B over blocks of rows and the
+         * full design matrix is never held in memory.
+         */
+        void setStoreDesignMatrix(bool storeDesignMatrix) {_storeDesignMatrix = storeDesignMatrix;}
+        bool getStoreDesignMatrix() const {return _storeDesignMatrix;}
+
     protected:
         Eigen::MatrixXd _cMat;               ///< K_i x R
         Eigen::VectorXd _iVec;               ///< Vectorized I
         Eigen::VectorXd _ivVec;              ///< Inverse variance
+        bool _storeDesignMatrix;             ///< Keep _cMat, _iVec and _ivVec after build
 
         std::shared_ptr<lsst::afw::math::Kernel> _kernel;                   ///< Derived single-object convolution kernel
         double _background;                                     ///< Derived differential background estimate
@@ -112,6 +142,11 @@ namespace diffim {
 
         void _setKernel();                                      ///< Set kernel after solution
         void _setKernelUncertainty();                           ///< Not implemented
+        void _fillDesignMatrix(lsst::afw::image::Image<InputT> const &templateImage,
+                               Eigen::MatrixXd const &eigenTemplate,
+                               lsst::afw::math::KernelList const &basisList,
+                               int startRow, int nRows, int startCol, int nCols,
+                               Eigen::MatrixXd &cMat);  ///< Fill C for a block of the good pixels
     };
 
 
@@ -187,6 +222,9 @@ namespace diffim {
         void addConstraint(float xCenter, float yCenter,
                            Eigen::MatrixXd const& qMat,
                            Eigen::VectorXd const& wVec);
+        void removeConstraint(float xCenter, float yCenter,
+                              Eigen::MatrixXd const& qMat,
+                              Eigen::VectorXd const& wVec);
 
         void solve();
         std::shared_ptr<lsst::afw::image::Image<lsst::afw::math::Kernel::Pixel>> makeKernelImage(lsst::afw::geom::Point2D const& pos);
@@ -209,6 +247,9 @@ namespace diffim {
 
         void _setKernel();                                       ///< Set kernel after solution
         void _setKernelUncertainty();                            ///< Not implemented
+        void _addConstraint(float xCenter, float yCenter,
+                            Eigen::MatrixXd const& qMat,
+                            Eigen::VectorXd const& wVec);        ///< Add (or with negated inputs, remove) terms
     };
 
 }}} // end of namespace lsst::ip::diffim
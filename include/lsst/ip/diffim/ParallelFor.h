@@ -0,0 +1,69 @@
+// -*- lsst-c++ -*-
+/**
+ * @file ParallelFor.h
+ *
+ * @brief Fan a loop over independent items out over a set of threads
+ *
+ * @ingroup ip_diffim
+ */
+
+#ifndef LSST_IP_DIFFIM_PARALLELFOR_H
+#define LSST_IP_DIFFIM_PARALLELFOR_H
+
+#include <algorithm>
+#include <atomic>
+#include <exception>
+#include <thread>
+#include <vector>
+
+namespace lsst {
+namespace ip {
+namespace diffim {
+namespace detail {
+
+    /**
+     * @brief Call func(item, thread) for each item in [0, nItems) using nThreads threads
+     *
+     * @note Items are handed out in order from a shared counter, so which
+     * thread processes a given item is not deterministic; func should write
+     * its results per item.  The thread index runs from 0 to nThreads-1 and
+     * may be used to select per-thread workspaces.  If any call throws, the
+     * exception from the lowest numbered item is rethrown after all threads
+     * have finished.
+     *
+     * @ingroup ip_diffim
+     */
+    template <typename FuncT>
+    void parallelFor(int nItems, int nThreads, FuncT func) {
+        std::vector<std::exception_ptr> errors(nItems);
+        std::atomic<int> next(0);
+
+        auto worker = [&](int thread) {
+            for (int item = next++; item < nItems; item = next++) {
+                try {
+                    func(item, thread);
+                } catch (...) {
+                    errors[item] = std::current_exception();
+                }
+            }
+        };
+
+        std::vector<std::thread> threads;
+        for (int thread = 1; thread < std::min(nThreads, nItems); ++thread) {
+            threads.emplace_back(worker, thread);
+        }
+        worker(0);
+        for (std::thread &thread : threads) {
+            thread.join();
+        }
+
+        for (std::exception_ptr const &error : errors) {
+            if (error) {
+                std::rethrow_exception(error);
+            }
+        }
+    }
+
+}}}} // end of namespace lsst::ip::diffim::detail
+
+#endif
@@ -36,6 +36,9 @@ from .diaCatalogSourceSelector import *
 from .dipoleMeasurement import *
 from .diffimTools import *
 from .kernelCandidateQa import *
+from .spatialKernelImageCache import *
+from .fftConvolution import *
+from .basisConvolution import *
 from .getTemplate import *
 from .diaCatalogSourceSelector import *
 from lsst.meas.base import wrapSimpleAlgorithm
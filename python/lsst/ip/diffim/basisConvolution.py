@@ -0,0 +1,216 @@
+# This file is part of ip_diffim.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["convolveSpatialBasis"]
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import lsst.afw.image as afwImage
+from .fftConvolution import _OverlapAddCorrelator, _badPixels, _kernelEdge, _growMask
+
+
+def _lagrangeMatrix(nodes, positions):
+    """Return the matrix evaluating the Lagrange basis polynomials of
+    ``nodes`` at ``positions``, of shape (len(positions), len(nodes)).
+    """
+    matrix = np.ones((len(positions), len(nodes)))
+    for i, node in enumerate(nodes):
+        for j, other in enumerate(nodes):
+            if i != j:
+                matrix[:, i] *= (positions - other) / (node - other)
+    return matrix
+
+
+def _evaluateSpatialFunction(function, xPos, yPos):
+    """Evaluate a polynomial spatial function at every pixel of a grid.
+
+    A two-dimensional polynomial of order ``n`` is exactly reproduced by its
+    tensor-product Lagrange interpolant on ``(n + 1) x (n + 1)`` nodes, so
+    the function is only called at the nodes and the full image follows from
+    two matrix products.  Chebyshev nodes keep the interpolant well
+    conditioned.
+
+    Parameters
+    ----------
+    function : `lsst.afw.math.Function2D`
+        Polynomial spatial function with a ``getOrder`` method, e.g.
+        `lsst.afw.math.PolynomialFunction2D` or
+        `lsst.afw.math.Chebyshev1Function2D`.
+    xPos, yPos : `numpy.ndarray`
+        Positions of the pixel columns and rows.
+
+    Returns
+    -------
+    image : `numpy.ndarray`
+        The function evaluated at each pixel, of shape
+        (len(yPos), len(xPos)).
+    """
+    try:
+        nNodes = function.getOrder() + 1
+    except AttributeError:
+        raise ValueError("Spatial function %s is not a polynomial" % (type(function).__name__,))
+    cheb = np.cos((2*np.arange(nNodes) + 1)*np.pi/(2*nNodes))
+
+    def nodes(positions):
+        center = 0.5*(positions[0] + positions[-1])
+        halfWidth = 0.5*(positions[-1] - positions[0]) + 0.5
+        return center + halfWidth*cheb
+
+    xNodes = nodes(xPos)
+    yNodes = nodes(yPos)
+    values = np.array([[function(x, y) for x in xNodes] for y in yNodes])
+    return _lagrangeMatrix(yNodes, yPos).dot(values).dot(_lagrangeMatrix(xNodes, xPos).T)
+
+
+def convolveSpatialBasis(outMaskedImage, inMaskedImage, kernel, nThreads=1, blockSize=None, fft=np.fft):
+    """Convolve a MaskedImage with a spatially varying
+    `lsst.afw.math.LinearCombinationKernel` one basis kernel at a time.
+
+    The input is convolved once with each basis kernel and the results are
+    combined with images of the spatial coefficients evaluated at every
+    pixel.  Unlike the interpolated convolution of `lsst.afw.math.convolve`
+    this is exact at every pixel, and the basis convolutions are
+    independent so they are spread over ``nThreads`` threads.  Each
+    convolution is an overlap-add FFT convolution over blocks of the input,
+    so the transforms are the size of a padded block, not of the image.
+
+    Parameters
+    ----------
+    outMaskedImage : `lsst.afw.image.MaskedImage`
+        Convolved image; must have the dimensions of ``inMaskedImage``.
+    inMaskedImage : `lsst.afw.image.MaskedImage`
+        Image to convolve.
+    kernel : `lsst.afw.math.LinearCombinationKernel`
+        Kernel to convolve with; spatial functions must be polynomials.  The
+        kernel is not normalized.
+    nThreads : `int`, optional
+        Number of threads over which to spread the basis convolutions.
+    blockSize : `int`, optional
+        Size of the square blocks the image is cut into; defaults to four
+        times the larger kernel dimension, but at least 256.
+    fft : `lsst.ip.diffim.FftBackend` or module, optional
+        FFT implementation to use; defaults to `numpy.fft`.
+
+    Raises
+    ------
+    ValueError
+        Raised if the images differ in size, or a spatial function is not a
+        polynomial.
+
+    Notes
+    -----
+    The output matches `lsst.afw.math.convolve` with ``doNormalize=False``
+    and ``doCopyEdge=False``: the image is the sum over the basis kernels of
+    the coefficient image times the input correlated with the basis, the
+    mask is the OR of the input mask over the footprint of the basis kernels,
+    and the variance is the input variance correlated with the squared
+    kernel.  Since the square of a linear combination mixes the bases, the
+    variance needs ``n (n + 1) / 2`` correlations for ``n`` basis kernels,
+    which dominates the cost for large bases; this is meant for the few
+    bases of a PCA, not a full Alard-Lupton basis.  Pixels within the kernel
+    border are set to NaN, with variance infinity and mask ``NO_DATA``.  A
+    non-finite input pixel makes every output pixel whose kernel footprint
+    covers it NaN.
+    """
+    if outMaskedImage.getDimensions() != inMaskedImage.getDimensions():
+        raise ValueError("Output dimensions %s differ from input dimensions %s" %
+                         (outMaskedImage.getDimensions(), inMaskedImage.getDimensions()))
+
+    basisList = kernel.getKernelList()
+    nBasis = len(basisList)
+    kimage = afwImage.ImageD(kernel.getDimensions())
+    basisArrays = []
+    for basis in basisList:
+        basis.computeImage(kimage, False)
+        basisArrays.append(kimage.getArray().copy())
+    footprint = np.any([array != 0. for array in basisArrays], axis=0).astype(float)
+
+    height, width = inMaskedImage.getImage().getArray().shape
+    xy0 = inMaskedImage.getXY0()
+    xPos = xy0.getX() + np.arange(width, dtype=float)
+    yPos = xy0.getY() + np.arange(height, dtype=float)
+    if kernel.isSpatiallyVarying():
+        coeffs = [_evaluateSpatialFunction(f, xPos, yPos) for f in kernel.getSpatialFunctionList()]
+    else:
+        coeffs = list(kernel.getKernelParameters())
+
+    ctr = kernel.getCtr()
+    kernelShape = basisArrays[0].shape
+    if blockSize is None:
+        blockSize = max(4*max(kernelShape), 256)
+    correlator = _OverlapAddCorrelator((height, width), kernelShape, (ctr.getY(), ctr.getX()), blockSize,
+                                       fft=fft)
+    badImage, image = _badPixels(inMaskedImage.getImage().getArray().astype(float))
+    badVariance, variance = _badPixels(inMaskedImage.getVariance().getArray().astype(float))
+
+    # Each thread sums its share of the terms, so at most nThreads partial
+    # images are held at once
+    def sumTerms(terms, term):
+        partial = np.zeros((height, width))
+        for t in terms:
+            partial += term(t)
+        return partial
+
+    def runTerms(terms, term):
+        nWorkers = max(1, min(nThreads, len(terms)))
+        if nWorkers == 1:
+            return sumTerms(terms, term)
+        with ThreadPoolExecutor(nWorkers) as executor:
+            partials = executor.map(lambda i: sumTerms(terms[i::nWorkers], term), range(nWorkers))
+            return sum(partials)
+
+    # Kernel transforms are made as each term needs them, and are block-sized
+    def imageTerm(i):
+        return coeffs[i]*correlator(image, correlator.transformKernel(basisArrays[i]))
+
+    def varianceTerm(ij):
+        i, j = ij
+        product = correlator.transformKernel(basisArrays[i]*basisArrays[j])
+        scale = 1. if i == j else 2.
+        return scale*coeffs[i]*coeffs[j]*correlator(variance, product)
+
+    outImage = runTerms(list(range(nBasis)), imageTerm)
+    outVariance = runTerms([(i, j) for i in range(nBasis) for j in range(i, nBasis)], varianceTerm)
+
+    footprintFft = correlator.transformKernel(footprint)
+
+    def spread(pixels):
+        # Pixels whose kernel footprint covers any of the given input pixels
+        return correlator(pixels.astype(float), footprintFft) > 0.5
+
+    if badImage.any():
+        outImage[spread(badImage)] = np.nan
+    if badVariance.any():
+        outVariance[spread(badVariance)] = np.nan
+
+    outMask = _growMask(inMaskedImage.getMask().getArray(), spread)
+
+    # Pixels within the kernel border, as afw sets them
+    edge = _kernelEdge((height, width), kernelShape, (ctr.getY(), ctr.getX()))
+    outImage[edge] = np.nan
+    outVariance[edge] = np.inf
+    outMask[edge] = afwImage.Mask.getPlaneBitMask("NO_DATA")
+
+    outMaskedImage.getImage().getArray()[:, :] = outImage
+    outMaskedImage.getVariance().getArray()[:, :] = outVariance
+    outMaskedImage.getMask().getArray()[:, :] = outMask
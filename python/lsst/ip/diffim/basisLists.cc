@@ -27,6 +27,8 @@
 
 #include "ndarray/pybind11.h"
 
+#include "lsst/afw/image/Image.h"
+#include "lsst/afw/math/Kernel.h"
 #include "lsst/ip/diffim/BasisLists.h"
 
 namespace py = pybind11;
@@ -40,6 +42,17 @@ PYBIND11_MODULE(basisLists, mod) {
     py::module::import("lsst.afw.math");
     py::module::import("lsst.pex.policy");
 
+    py::class_<AlardLuptonKernel, std::shared_ptr<AlardLuptonKernel>, afw::math::FixedKernel> clsAlardLupton(
+            mod, "AlardLuptonKernel");
+    clsAlardLupton.def(py::init<afw::image::Image<afw::math::Kernel::Pixel> const &, std::vector<double> const &,
+                                std::vector<double> const &, double, double>(),
+                       "image"_a, "xFactor"_a, "yFactor"_a, "scale"_a, "offset"_a);
+    clsAlardLupton.def("clone", &AlardLuptonKernel::clone);
+    clsAlardLupton.def("getXFactor", &AlardLuptonKernel::getXFactor);
+    clsAlardLupton.def("getYFactor", &AlardLuptonKernel::getYFactor);
+    clsAlardLupton.def("getScale", &AlardLuptonKernel::getScale);
+    clsAlardLupton.def("getOffset", &AlardLuptonKernel::getOffset);
+
     mod.def("makeDeltaFunctionBasisList", &makeDeltaFunctionBasisList, "width"_a, "height"_a);
     mod.def("makeRegularizationMatrix", &makeRegularizationMatrix, "policy"_a);
     mod.def("makeForwardDifferenceMatrix", &makeForwardDifferenceMatrix, "width"_a, "height"_a, "orders"_a,
@@ -59,6 +59,10 @@ void declareAssessSpatialKernelVisitor(py::module& mod, std::string const& suffi
     cls.def("getNRejected", &AssessSpatialKernelVisitor<PixelT>::getNRejected);
     cls.def("getNProcessed", &AssessSpatialKernelVisitor<PixelT>::getNProcessed);
     cls.def("processCandidate", &AssessSpatialKernelVisitor<PixelT>::processCandidate, "candidate"_a);
+    cls.def("setNThreads", &AssessSpatialKernelVisitor<PixelT>::setNThreads, "nThreads"_a);
+    cls.def("getNThreads", &AssessSpatialKernelVisitor<PixelT>::getNThreads);
+    cls.def("processQueuedCandidates", &AssessSpatialKernelVisitor<PixelT>::processQueuedCandidates,
+            py::call_guard<py::gil_scoped_release>());
 
     mod.def("makeAssessSpatialKernelVisitor", &makeAssessSpatialKernelVisitor<PixelT>, "spatialKernel"_a,
             "spatialBackground"_a, "policy"_a);
@@ -66,6 +66,10 @@ void declareBuildSingleKernelVisitor(py::module& mod, std::string const& suffix)
     cls.def("getNProcessed", &BuildSingleKernelVisitor<PixelT>::getNProcessed);
     cls.def("reset", &BuildSingleKernelVisitor<PixelT>::reset);
     cls.def("processCandidate", &BuildSingleKernelVisitor<PixelT>::processCandidate, "candidate"_a);
+    cls.def("setNThreads", &BuildSingleKernelVisitor<PixelT>::setNThreads, "nThreads"_a);
+    cls.def("getNThreads", &BuildSingleKernelVisitor<PixelT>::getNThreads);
+    cls.def("processQueuedCandidates", &BuildSingleKernelVisitor<PixelT>::processQueuedCandidates,
+            py::call_guard<py::gil_scoped_release>());
 
     mod.def("makeBuildSingleKernelVisitor",
             (std::shared_ptr<BuildSingleKernelVisitor<PixelT>>(*)(afw::math::KernelList const&,
@@ -58,6 +58,7 @@ void declareBuildSpatialKernelVisitor(py::module& mod, std::string const& suffix
     cls.def(py::init<afw::math::KernelList, afw::geom::Box2I const&, pex::policy::Policy>(), "basisList"_a,
             "regionBBox"_a, "policy"_a);
 
+    cls.def("reset", &BuildSpatialKernelVisitor<PixelT>::reset);
     cls.def("getNCandidates", &BuildSpatialKernelVisitor<PixelT>::getNCandidates);
     cls.def("processCandidate", &BuildSpatialKernelVisitor<PixelT>::processCandidate, "candidate"_a);
     cls.def("solveLinearEquation", &BuildSpatialKernelVisitor<PixelT>::solveLinearEquation);
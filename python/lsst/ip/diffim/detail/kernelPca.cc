@@ -79,6 +79,11 @@ void declareKernelPcaVisitor(py::module& mod, std::string const& suffix) {
 
     cls.def("getEigenKernels", &KernelPcaVisitor<PixelT>::getEigenKernels);
     cls.def("processCandidate", &KernelPcaVisitor<PixelT>::processCandidate, "candidate"_a);
+    cls.def("reset", &KernelPcaVisitor<PixelT>::reset);
+    cls.def("setNThreads", &KernelPcaVisitor<PixelT>::setNThreads, "nThreads"_a);
+    cls.def("getNThreads", &KernelPcaVisitor<PixelT>::getNThreads);
+    cls.def("processQueuedCandidates", &KernelPcaVisitor<PixelT>::processQueuedCandidates,
+            py::call_guard<py::gil_scoped_release>());
     cls.def("subtractMean", &KernelPcaVisitor<PixelT>::subtractMean);
     cls.def("returnMean", &KernelPcaVisitor<PixelT>::returnMean);
 
@@ -525,7 +525,9 @@ class NbasisEvaluator(object):
                     k = len(kList)
                     visitor = diffimLib.BuildSingleKernelVisitorF(kList, pexConfig.makePolicy(bicConfig))
                     visitor.setSkipBuilt(False)
+                    visitor.setNThreads(bicConfig.nThreads)
                     kernelCellSet.visitCandidates(visitor, bicConfig.nStarPerCell)
+                    visitor.processQueuedCandidates()
 
                     for cell in kernelCellSet.getCellList():
                         for cand in cell.begin(False):  # False = include bad candidates
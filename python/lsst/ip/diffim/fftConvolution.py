@@ -0,0 +1,439 @@
+# This file is part of ip_diffim.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["convolveFft", "convolveImage", "convolveLowRank", "lowRankTerms", "FftBackend", "goodFftSize"]
+
+import numpy as np
+
+import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
+
+
+class FftBackend(object):
+    """Two-dimensional FFTs through a configurable library.
+
+    Parameters
+    ----------
+    name : `str`, optional
+        ``"numpy"`` for `numpy.fft`, or ``"scipy"`` for `scipy.fft`, which
+        can spread each transform over several threads.
+    nThreads : `int`, optional
+        Number of threads for the ``"scipy"`` backend; negative values count
+        back from the number of CPUs, so -1 uses them all.
+
+    Raises
+    ------
+    ValueError
+        Raised if ``name`` is not a known backend.
+    RuntimeError
+        Raised if the ``"scipy"`` backend is requested but `scipy.fft` is
+        not available.
+
+    Attributes
+    ----------
+    keepsSinglePrecision : `bool`
+        Whether transforms of float32 and complex64 arrays stay in single
+        precision; `scipy.fft` does, while `numpy.fft` before numpy 2.0
+        returns complex128 and float64.
+
+    Notes
+    -----
+    The methods take the arguments of their `numpy.fft` namesakes, and the
+    backends agree to rounding.
+    """
+
+    def __init__(self, name="numpy", nThreads=1):
+        if name == "numpy":
+            self._module = np.fft
+            self._kwargs = {}
+        elif name == "scipy":
+            try:
+                import scipy.fft
+            except ImportError as e:
+                raise RuntimeError("The scipy FFT backend requires scipy.fft: %s" % e)
+            self._module = scipy.fft
+            self._kwargs = dict(workers=nThreads)
+        else:
+            raise ValueError("Unknown FFT backend %r" % name)
+        self.name = name
+        self.nThreads = nThreads
+        self.keepsSinglePrecision = self.rfft2(np.zeros((2, 2), dtype=np.float32)).dtype == np.complex64
+
+    def fft2(self, a, s=None, axes=(-2, -1)):
+        return self._module.fft2(a, s, axes, **self._kwargs)
+
+    def ifft2(self, a, s=None, axes=(-2, -1)):
+        return self._module.ifft2(a, s, axes, **self._kwargs)
+
+    def rfft2(self, a, s=None, axes=(-2, -1)):
+        return self._module.rfft2(a, s, axes, **self._kwargs)
+
+    def irfft2(self, a, s=None, axes=(-2, -1)):
+        return self._module.irfft2(a, s, axes, **self._kwargs)
+
+
+def goodFftSize(n):
+    """Return the smallest integer >= ``n`` with no prime factor above 5,
+    for which FFTs are fast.
+    """
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+
+def _badPixels(array):
+    """Return the non-finite pixels of ``array`` and a copy with them zeroed.
+    """
+    bad = ~np.isfinite(array)
+    if bad.any():
+        array = np.where(bad, 0., array)
+    return bad, array
+
+
+def _kernelEdge(shape, kernelShape, kernelCtr):
+    """Return the pixels of an image of ``shape`` within the kernel border,
+    i.e. those that `lsst.afw.math.convolve` does not compute.
+    """
+    height, width = shape
+    kernelHeight, kernelWidth = kernelShape
+    ctrY, ctrX = kernelCtr
+    edge = np.ones(shape, dtype=bool)
+    edge[ctrY:height - kernelHeight + ctrY + 1, ctrX:width - kernelWidth + ctrX + 1] = False
+    return edge
+
+
+def _growMask(inMask, spread):
+    """Return the OR of each bit of ``inMask`` over the kernel footprint.
+
+    Parameters
+    ----------
+    inMask : `numpy.ndarray`
+        Input mask array.
+    spread : callable
+        Function returning, for a boolean array of input pixels, the
+        boolean array of output pixels whose kernel footprint covers any of
+        them.
+    """
+    outMask = np.zeros_like(inMask)
+    allBits = int(np.bitwise_or.reduce(inMask, axis=None))
+    bit = 1
+    while bit <= allBits:
+        if allBits & bit:
+            outMask[spread((inMask & bit) != 0)] |= bit
+        bit <<= 1
+    return outMask
+
+
+class _OverlapAddCorrelator(object):
+    """Correlate arrays with kernels of one shape by overlap-add FFT
+    convolution, matching the orientation of `lsst.afw.math.convolve`.
+
+    The input is cut into blocks of at most ``blockSize`` pixels on a side.
+    Each block is correlated through zero-padded real FFTs and the results,
+    which overlap by the kernel size, are added into the output.  The
+    kernel transforms are the size of one padded block, not of the image.
+    The transforms are taken with ``fft``, `numpy.fft` or an `FftBackend`.
+    """
+
+    def __init__(self, shape, kernelShape, kernelCtr, blockSize, fft=np.fft):
+        self.fft = fft
+        self.shape = shape
+        self.kernelShape = kernelShape
+        self.blockShape = tuple(min(blockSize, n) for n in shape)
+        self.fftShape = tuple(goodFftSize(b + k - 1) for b, k in zip(self.blockShape, kernelShape))
+        y0 = kernelShape[0] - 1 - kernelCtr[0]
+        x0 = kernelShape[1] - 1 - kernelCtr[1]
+        self.slices = (slice(y0, y0 + shape[0]), slice(x0, x0 + shape[1]))
+
+    def transformKernel(self, array):
+        # afw convolution is a correlation, i.e. a convolution with the flipped kernel
+        return self.fft.rfft2(array[::-1, ::-1], self.fftShape)
+
+    def __call__(self, array, kernelFft):
+        kernelHeight, kernelWidth = self.kernelShape
+        blockHeight, blockWidth = self.blockShape
+        full = np.zeros((self.shape[0] + kernelHeight - 1, self.shape[1] + kernelWidth - 1))
+        for y0 in range(0, self.shape[0], blockHeight):
+            for x0 in range(0, self.shape[1], blockWidth):
+                block = array[y0:y0 + blockHeight, x0:x0 + blockWidth]
+                height = block.shape[0] + kernelHeight - 1
+                width = block.shape[1] + kernelWidth - 1
+                product = self.fft.rfft2(block, self.fftShape)*kernelFft
+                inverse = self.fft.irfft2(product, self.fftShape)
+                full[y0:y0 + height, x0:x0 + width] += inverse[:height, :width]
+        return full[self.slices]
+
+
+def convolveFft(outImage, inImage, kernel, doNormalize=False, doCopyEdge=False, blockSize=None, fft=np.fft):
+    """Convolve an Image or MaskedImage with a spatially invariant kernel by
+    overlap-add FFT convolution.
+
+    Parameters
+    ----------
+    outImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+        Convolved image; must have the type and dimensions of ``inImage``.
+    inImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+        Image to convolve.
+    kernel : `lsst.afw.math.Kernel`
+        Spatially invariant kernel to convolve with.
+    doNormalize : `bool`, optional
+        Normalize the kernel to sum to one?
+    doCopyEdge : `bool`, optional
+        Copy the input pixels within the kernel border, OR'ing in the
+        ``EDGE`` mask bit, rather than setting them to NaN with variance
+        infinity and mask ``NO_DATA``?
+    blockSize : `int`, optional
+        Size of the square blocks the image is cut into; defaults to four
+        times the larger kernel dimension, but at least 256.
+    fft : `FftBackend` or module, optional
+        FFT implementation to use; defaults to `numpy.fft`.
+
+    Raises
+    ------
+    ValueError
+        Raised if the images differ in size or the kernel is spatially
+        varying.
+
+    Notes
+    -----
+    The output matches `lsst.afw.math.convolve` to rounding.  The variance
+    is correlated with the squared kernel, and each mask bit is OR'ed over
+    the pixels where the kernel is non-zero.  A non-finite input pixel makes
+    every output pixel whose kernel footprint covers it NaN, rather than
+    spreading through the transforms.
+    """
+    if outImage.getDimensions() != inImage.getDimensions():
+        raise ValueError("Output dimensions %s differ from input dimensions %s" %
+                         (outImage.getDimensions(), inImage.getDimensions()))
+    if kernel.isSpatiallyVarying():
+        raise ValueError("FFT convolution requires a spatially invariant kernel")
+
+    kimage = afwImage.ImageD(kernel.getDimensions())
+    kernel.computeImage(kimage, doNormalize)
+    kernelArray = kimage.getArray()
+    ctr = kernel.getCtr()
+    kernelCtr = (ctr.getY(), ctr.getX())
+    if blockSize is None:
+        blockSize = max(4*max(kernelArray.shape), 256)
+
+    isMasked = hasattr(inImage, "getMask")
+    inPlanes = [inImage.getImage(), inImage.getVariance()] if isMasked else [inImage]
+    outPlanes = [outImage.getImage(), outImage.getVariance()] if isMasked else [outImage]
+    kernelArrays = [kernelArray, kernelArray**2] if isMasked else [kernelArray]
+
+    shape = inPlanes[0].getArray().shape
+    correlator = _OverlapAddCorrelator(shape, kernelArray.shape, kernelCtr, blockSize, fft=fft)
+    footprintFft = correlator.transformKernel((kernelArray != 0.).astype(float))
+
+    def spread(pixels):
+        # Pixels whose kernel footprint covers any of the given input pixels
+        return correlator(pixels.astype(float), footprintFft) > 0.5
+
+    edge = _kernelEdge(shape, kernelArray.shape, kernelCtr)
+    for inPlane, outPlane, planeKernel in zip(inPlanes, outPlanes, kernelArrays):
+        bad, array = _badPixels(inPlane.getArray().astype(float))
+        result = correlator(array, correlator.transformKernel(planeKernel))
+        if bad.any():
+            result[spread(bad)] = np.nan
+        if doCopyEdge:
+            result[edge] = inPlane.getArray()[edge]
+        else:
+            result[edge] = np.nan if inPlane is inPlanes[0] else np.inf
+        outPlane.getArray()[:, :] = result
+
+    if isMasked:
+        inMask = inImage.getMask().getArray()
+        outMask = _growMask(inMask, spread)
+        if doCopyEdge:
+            outMask[edge] = inMask[edge] | afwImage.Mask.getPlaneBitMask("EDGE")
+        else:
+            outMask[edge] = afwImage.Mask.getPlaneBitMask("NO_DATA")
+        outImage.getMask().getArray()[:, :] = outMask
+
+
+def lowRankTerms(kernelArray, energyFraction=1.0, maxRank=None):
+    """Return the fewest separable terms of the singular value decomposition
+    of a kernel that hold a given fraction of its squared sum.
+
+    Parameters
+    ----------
+    kernelArray : `numpy.ndarray`
+        Kernel image.
+    energyFraction : `float`, optional
+        Fraction of the squared sum of ``kernelArray`` to keep; 1 keeps it
+        all, to rounding.
+    maxRank : `int`, optional
+        Return None rather than more than this many terms.
+
+    Returns
+    -------
+    terms : `tuple` of `numpy.ndarray` or None
+        The columns, of shape ``(height, rank)``, and rows, of shape
+        ``(rank, width)``, whose products sum to the approximate kernel.
+    """
+    u, s, vt = np.linalg.svd(kernelArray)
+    energy = np.cumsum(s**2)
+    target = min(energyFraction, 1.0 - 1e-12)*energy[-1]
+    rank = int(np.searchsorted(energy, target)) + 1
+    if maxRank is not None and rank > maxRank:
+        return None
+    return u[:, :rank]*s[:rank], vt[:rank]
+
+
+def _correlateSeparable(array, columns, rows):
+    """Correlate ``array`` with the kernel ``columns.dot(rows)`` as a sum of
+    one-dimensional passes, returning only the pixels the whole kernel
+    covers.
+    """
+    kernelHeight, kernelWidth = columns.shape[0], rows.shape[1]
+    height = max(array.shape[0] - kernelHeight + 1, 0)
+    width = max(array.shape[1] - kernelWidth + 1, 0)
+    result = np.zeros((height, width))
+    for column, row in zip(columns.T, rows):
+        rowPass = np.zeros((array.shape[0], width))
+        for u, tap in enumerate(row):
+            rowPass += tap*array[:, u:u + width]
+        for v, tap in enumerate(column):
+            result += tap*rowPass[v:v + height]
+    return result
+
+
+def convolveLowRank(outImage, inImage, kernelArray, terms=None, kernelCtr=None, doCopyEdge=False):
+    """Convolve an Image or MaskedImage with a kernel image, approximated by a
+    sum of separable terms, in one-dimensional passes.
+
+    Parameters
+    ----------
+    outImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+        Convolved image; must have the type and dimensions of ``inImage``.
+    inImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+        Image to convolve.
+    kernelArray : `numpy.ndarray`
+        Kernel image.
+    terms : `tuple` of `numpy.ndarray`, optional
+        Separable terms of the kernel, as returned by `lowRankTerms`;
+        defaults to an exact decomposition.
+    kernelCtr : `tuple` of `int`, optional
+        Kernel center pixel (y, x); defaults to that of an
+        `lsst.afw.math.FixedKernel` of ``kernelArray``.
+    doCopyEdge : `bool`, optional
+        Copy the input pixels within the kernel border, OR'ing in the
+        ``EDGE`` mask bit, rather than setting them to NaN with variance
+        infinity and mask ``NO_DATA``?
+
+    Raises
+    ------
+    ValueError
+        Raised if the images differ in size.
+
+    Notes
+    -----
+    Orientation and edges are those of `lsst.afw.math.convolve`.  A kernel
+    of rank ``r`` costs ``r`` times the kernel height plus width operations
+    per pixel, rather than their product.  The variance is correlated with
+    the exact square of the approximate kernel, which has at most
+    ``r*(r + 1)/2`` separable terms, and each mask bit is OR'ed over the
+    whole kernel box.
+    """
+    if outImage.getDimensions() != inImage.getDimensions():
+        raise ValueError("Output dimensions %s differ from input dimensions %s" %
+                         (outImage.getDimensions(), inImage.getDimensions()))
+    kernelShape = kernelArray.shape
+    if kernelCtr is None:
+        kernelCtr = ((kernelShape[0] - 1)//2, (kernelShape[1] - 1)//2)
+    columns, rows = lowRankTerms(kernelArray) if terms is None else terms
+
+    isMasked = hasattr(inImage, "getMask")
+    inPlanes = [inImage.getImage(), inImage.getVariance()] if isMasked else [inImage]
+    outPlanes = [outImage.getImage(), outImage.getVariance()] if isMasked else [outImage]
+    planeTerms = [(columns, rows)]
+    if isMasked:
+        # The square of a sum of separable terms is a sum of their pairwise products
+        rank = rows.shape[0]
+        pairs = [(i, j) for i in range(rank) for j in range(i, rank)]
+        weights = np.array([1. if i == j else 2. for i, j in pairs])
+        planeTerms.append((np.array([columns[:, i]*columns[:, j] for i, j in pairs]).T*weights,
+                           np.array([rows[i]*rows[j] for i, j in pairs])))
+
+    shape = inPlanes[0].getArray().shape
+    ctrY, ctrX = kernelCtr
+    good = (slice(ctrY, ctrY + max(shape[0] - kernelShape[0] + 1, 0)),
+            slice(ctrX, ctrX + max(shape[1] - kernelShape[1] + 1, 0)))
+    edge = _kernelEdge(shape, kernelShape, kernelCtr)
+    for inPlane, outPlane, (planeColumns, planeRows) in zip(inPlanes, outPlanes, planeTerms):
+        inArray = inPlane.getArray()
+        result = np.empty(shape)
+        result[good] = _correlateSeparable(inArray.astype(float), planeColumns, planeRows)
+        if doCopyEdge:
+            result[edge] = inArray[edge]
+        else:
+            result[edge] = np.nan if inPlane is inPlanes[0] else np.inf
+        outPlane.getArray()[:, :] = result
+
+    if isMasked:
+        inMask = inImage.getMask().getArray()
+        width = max(shape[1] - kernelShape[1] + 1, 0)
+        rowPass = np.zeros((shape[0], width), dtype=inMask.dtype)
+        for u in range(kernelShape[1]):
+            rowPass |= inMask[:, u:u + width]
+        outMask = np.zeros_like(inMask)
+        for v in range(kernelShape[0]):
+            outMask[good] |= rowPass[v:v + outMask[good].shape[0]]
+        if doCopyEdge:
+            outMask[edge] = inMask[edge] | afwImage.Mask.getPlaneBitMask("EDGE")
+        else:
+            outMask[edge] = afwImage.Mask.getPlaneBitMask("NO_DATA")
+        outImage.getMask().getArray()[:, :] = outMask
+
+
+def convolveImage(outImage, inImage, kernel, convolutionControl, fftMinSize=0, fft=np.fft):
+    """Convolve like `lsst.afw.math.convolve`, using `convolveFft` for large
+    spatially invariant kernels.
+
+    Parameters
+    ----------
+    outImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+        Convolved image.
+    inImage : `lsst.afw.image.Image` or `lsst.afw.image.MaskedImage`
+        Image to convolve.
+    kernel : `lsst.afw.math.Kernel`
+        Kernel to convolve with.
+    convolutionControl : `lsst.afw.math.ConvolutionControl`
+        Convolution options.
+    fftMinSize : `int`, optional
+        Use FFT convolution for spatially invariant kernels with at least
+        this many pixels along either side; non-positive to always convolve
+        directly.
+    fft : `FftBackend` or module, optional
+        FFT implementation for `convolveFft`; defaults to `numpy.fft`.
+    """
+    useFft = (fftMinSize > 0 and not kernel.isSpatiallyVarying() and
+              max(kernel.getWidth(), kernel.getHeight()) >= fftMinSize)
+    if useFft:
+        convolveFft(outImage, inImage, kernel, doNormalize=convolutionControl.getDoNormalize(),
+                    doCopyEdge=convolutionControl.getDoCopyEdge(), fft=fft)
+    else:
+        afwMath.convolve(outImage, inImage, kernel, convolutionControl)
@@ -32,6 +32,8 @@ import lsst.log
 
 from .imageMapReduce import (ImageMapReduceConfig, ImageMapReduceTask,
                              ImageMapper)
+from .spatialKernelImageCache import SpatialKernelImageCache
+from .fftConvolution import convolveImage, FftBackend
 
 __all__ = ("DecorrelateALKernelTask", "DecorrelateALKernelConfig",
            "DecorrelateALKernelMapper", "DecorrelateALKernelMapReduceConfig",
@@ -47,6 +49,29 @@ class DecorrelateALKernelConfig(pexConfig.Config):
         doc="""Mask planes to ignore for sigma-clipped statistics""",
         default=("INTRP", "EDGE", "DETECTED", "SAT", "CR", "BAD", "NO_DATA", "DETECTED_NEGATIVE")
     )
+    fftConvolveMinSize = pexConfig.Field(
+        dtype=int,
+        doc="""Convolve with the decorrelation kernel by overlap-add FFTs if it has at least this
+                 many pixels along either side, rather than in direct space with afw.math.convolve.
+                 Non-positive to always convolve directly.  Direct convolution of a MaskedImage costs
+                 about twice the kernel area in operations per pixel, and the FFT a fixed number of
+                 transforms per pixel, which is cheaper from about 15 pixels on.""",
+        default=15,
+    )
+    fftBackend = pexConfig.ChoiceField(
+        dtype=str,
+        doc="""Library computing the FFTs of the decorrelation kernel and diffim PSF""",
+        default="numpy",
+        allowed={
+            "numpy": "numpy.fft, single-threaded",
+            "scipy": "scipy.fft, multi-threaded with fftThreads threads",
+        }
+    )
+    fftThreads = pexConfig.Field(
+        dtype=int,
+        doc="""Number of threads for each FFT with the scipy fftBackend; -1 for one per CPU""",
+        default=1,
+    )
 
 
 class DecorrelateALKernelTask(pipeBase.Task):
@@ -99,6 +124,7 @@ class DecorrelateALKernelTask(pipeBase.Task):
         self.statsControl.setNumSigmaClip(3.)
         self.statsControl.setNumIter(3)
         self.statsControl.setAndMask(afwImage.Mask.getPlaneBitMask(self.config.ignoreMaskPlanes))
+        self._fft = FftBackend(self.config.fftBackend, self.config.fftThreads)
 
     def computeVarianceMean(self, exposure):
         statObj = afwMath.makeStatistics(exposure.getMaskedImage().getVariance(),
@@ -207,12 +233,14 @@ class DecorrelateALKernelTask(pipeBase.Task):
             preConvKernel.computeImage(kimg2, False)
             pck = kimg2.getArray()
         corrKernel = DecorrelateALKernelTask._computeDecorrelationKernel(kimg.getArray(), svar, tvar,
-                                                                         pck)
-        correctedExposure, corrKern = DecorrelateALKernelTask._doConvolve(subtractedExposure, corrKernel)
+                                                                         pck, fft=self._fft)
+        correctedExposure, corrKern = DecorrelateALKernelTask._doConvolve(
+            subtractedExposure, corrKernel, fftMinSize=self.config.fftConvolveMinSize, fft=self._fft)
 
         # Compute the subtracted exposure's updated psf
         psf = subtractedExposure.getPsf().computeKernelImage(afwGeom.Point2D(xcen, ycen)).getArray()
-        psfc = DecorrelateALKernelTask.computeCorrectedDiffimPsf(corrKernel, psf, svar=svar, tvar=tvar)
+        psfc = DecorrelateALKernelTask.computeCorrectedDiffimPsf(corrKernel, psf, svar=svar, tvar=tvar,
+                                                                 fft=self._fft)
         psfcI = afwImage.ImageD(psfc.shape[0], psfc.shape[1])
         psfcI.getArray()[:, :] = psfc
         psfcK = afwMath.FixedKernel(psfcI)
@@ -225,7 +253,7 @@ class DecorrelateALKernelTask(pipeBase.Task):
         return pipeBase.Struct(correctedExposure=correctedExposure, correctionKernel=corrKern)
 
     @staticmethod
-    def _computeDecorrelationKernel(kappa, svar=0.04, tvar=0.04, preConvKernel=None):
+    def _computeDecorrelationKernel(kappa, svar=0.04, tvar=0.04, preConvKernel=None, fft=np.fft):
         """Compute the Lupton decorrelation post-conv. kernel for decorrelating an
         image difference, based on the PSF-matching kernel.
 
@@ -239,6 +267,8 @@ class DecorrelateALKernelTask(pipeBase.Task):
             Average variance of template image used for PSF matching
         preConvKernel If not None, then pre-filtering was applied
             to science exposure, and this is the pre-convolution kernel.
+        fft : `lsst.ip.diffim.FftBackend`, optional
+            Provider of ``fft2`` and ``ifft2``; defaults to `numpy.fft`.
 
         Returns
         -------
@@ -263,18 +293,18 @@ class DecorrelateALKernelTask(pipeBase.Task):
                 diff = (kappa.shape[0] - mk.shape[0]) // 2
                 mk = np.pad(mk, (diff, diff), mode='constant')
 
-        kft = np.fft.fft2(kappa)
+        kft = fft.fft2(kappa)
         kft2 = np.conj(kft) * kft
         kft2[np.abs(kft2) < MIN_KERNEL] = MIN_KERNEL
         denom = svar + tvar * kft2
         if preConvKernel is not None:
-            mk = np.fft.fft2(mk)
+            mk = fft.fft2(mk)
             mk2 = np.conj(mk) * mk
             mk2[np.abs(mk2) < MIN_KERNEL] = MIN_KERNEL
             denom = svar * mk2 + tvar * kft2
         denom[np.abs(denom) < MIN_KERNEL] = MIN_KERNEL
         kft = np.sqrt((svar + tvar) / denom)
-        pck = np.fft.ifft2(kft)
+        pck = fft.ifft2(kft)
         pck = np.fft.ifftshift(pck.real)
         fkernel = DecorrelateALKernelTask._fixEvenKernel(pck)
         if preConvKernel is not None:
@@ -290,7 +320,7 @@ class DecorrelateALKernelTask(pipeBase.Task):
         return fkernel
 
     @staticmethod
-    def computeCorrectedDiffimPsf(kappa, psf, svar=0.04, tvar=0.04):
+    def computeCorrectedDiffimPsf(kappa, psf, svar=0.04, tvar=0.04, fft=np.fft):
         """Compute the (decorrelated) difference image's new PSF.
         new_psf = psf(k) * sqrt((svar + tvar) / (svar + tvar * kappa_ft(k)**2))
 
@@ -304,6 +334,8 @@ class DecorrelateALKernelTask(pipeBase.Task):
             Average variance of science image used for PSF matching
         tvar : `float`, optional
             Average variance of template image used for PSF matching
+        fft : `lsst.ip.diffim.FftBackend`, optional
+            Provider of ``fft2`` and ``ifft2``; defaults to `numpy.fft`.
 
         Returns
         -------
@@ -319,14 +351,14 @@ class DecorrelateALKernelTask(pipeBase.Task):
             elif psf.shape[0] > kernel.shape[0]:
                 diff = (psf.shape[0] - kernel.shape[0]) // 2
                 kernel = np.pad(kernel, (diff, diff), mode='constant')
-            psf_ft = np.fft.fft2(psf)
-            kft = np.fft.fft2(kernel)
+            psf_ft = fft.fft2(psf)
+            kft = fft.fft2(kernel)
             out = psf_ft * np.sqrt((svar + tvar) / (svar + tvar * kft**2))
             return out
 
         def post_conv_psf(psf, kernel, svar, tvar):
             kft = post_conv_psf_ft2(psf, kernel, svar, tvar)
-            out = np.fft.ifft2(kft)
+            out = fft.ifft2(kft)
             return out
 
         pcf = post_conv_psf(psf=psf, kernel=kappa, svar=svar, tvar=tvar)
@@ -393,7 +425,7 @@ class DecorrelateALKernelTask(pipeBase.Task):
         return out
 
     @staticmethod
-    def _doConvolve(exposure, kernel):
+    def _doConvolve(exposure, kernel, fftMinSize=0, fft=np.fft):
         """Convolve an Exposure with a decorrelation convolution kernel.
 
         Parameters
@@ -402,6 +434,13 @@ class DecorrelateALKernelTask(pipeBase.Task):
             Input exposure to be convolved.
         kernel : `numpy.array`
             Input 2-d numpy.array to convolve the image with
+        fftMinSize : `int`, optional
+            Convolve by overlap-add FFTs if the kernel has at least this many
+            pixels along either side; non-positive to always convolve in
+            direct space.
+        fft : `lsst.ip.diffim.FftBackend` or module, optional
+            FFT implementation for the overlap-add convolution; defaults to
+            `numpy.fft`.
 
         Returns
         -------
@@ -421,7 +460,8 @@ class DecorrelateALKernelTask(pipeBase.Task):
         kern.setCtrY(maxloc[1])
         outExp = exposure.clone()  # Do this to keep WCS, PSF, masks, etc.
         convCntrl = afwMath.ConvolutionControl(False, True, 0)
-        afwMath.convolve(outExp.getMaskedImage(), exposure.getMaskedImage(), kern, convCntrl)
+        convolveImage(outExp.getMaskedImage(), exposure.getMaskedImage(), kern, convCntrl,
+                      fftMinSize=fftMinSize, fft=fft)
 
         return outExp, kern
 
@@ -545,6 +585,20 @@ class DecorrelateALKernelSpatialConfig(pexConfig.Config):
         default=("INTRP", "EDGE", "DETECTED", "SAT", "CR", "BAD", "NO_DATA", "DETECTED_NEGATIVE")
     )
 
+    useKernelImageCache = pexConfig.Field(
+        dtype=bool,
+        doc="""When spatially varying, interpolate the matching kernel images from a
+               SpatialKernelImageCache instead of computing them for every sub-image""",
+        default=False
+    )
+
+    kernelImageCacheSize = pexConfig.Field(
+        dtype=int,
+        doc="""Number of grid nodes along each axis of the SpatialKernelImageCache""",
+        default=10,
+        check=lambda x: x >= 1
+    )
+
     def setDefaults(self):
         self.decorrelateMapReduceConfig.gridStepX = self.decorrelateMapReduceConfig.gridStepY = 40
         self.decorrelateMapReduceConfig.cellSizeX = self.decorrelateMapReduceConfig.cellSizeY = 41
@@ -661,6 +715,10 @@ class DecorrelateALKernelSpatialTask(pipeBase.Task):
         if spatiallyVarying:
             self.log.info("Variance (science, template): (%f, %f)", svar, tvar)
             self.log.info("Variance (uncorrected diffim): %f", var)
+            if self.config.useKernelImageCache:
+                psfMatchingKernel = SpatialKernelImageCache(psfMatchingKernel, subtractedExposure.getBBox(),
+                                                            self.config.kernelImageCacheSize,
+                                                            self.config.kernelImageCacheSize)
             config = self.config.decorrelateMapReduceConfig
             task = ImageMapReduceTask(config=config)
             results = task.run(subtractedExposure, science=scienceExposure,
@@ -22,6 +22,8 @@
 
 import numpy as np
 import abc
+import collections
+import multiprocessing
 
 import lsst.afw.image as afwImage
 import lsst.afw.geom as afwGeom
@@ -30,7 +32,7 @@ import lsst.meas.algorithms as measAlg
 import lsst.pex.config as pexConfig
 import lsst.pipe.base as pipeBase
 
-__all__ = ("ImageMapReduceTask", "ImageMapReduceConfig",
+__all__ = ("ImageMapReduceTask", "ImageMapReduceConfig", "ImageMapReduceCells",
            "ImageMapper", "ImageMapperConfig",
            "ImageReducer", "ImageReducerConfig")
 
@@ -42,10 +44,10 @@ exposure, or return summary results for each sub-exposure.
 
 This provides a framework for arbitrary mapper-reducer
 operations on an exposure by implementing simple operations in
-subTasks. It currently is not parallelized, although it could be in
-the future. It does enable operations such as spatially-mapped
-processing on a grid across an image, processing regions surrounding
-centroids (such as for PSF processing), etc.
+subTasks. The sub-exposures may optionally be processed in parallel
+(`ImageMapReduceConfig.nWorkers`). It does enable operations such as
+spatially-mapped processing on a grid across an image, processing
+regions surrounding centroids (such as for PSF processing), etc.
 
 It is implemented as primary Task, `ImageMapReduceTask` which contains
 two subtasks, `ImageMapper` and `ImageReducer`.
@@ -78,6 +80,32 @@ implemented `reduceOperation` is 'none', in which case the
 `mapperResults` list is simply returned directly.
 """
 
+# Grid box corners computed by `ImageMapReduceTask._generateGrid`, by
+# exposure bounding box, grid config and PSF FWHM; least recently used last.
+_gridCache = collections.OrderedDict()
+_GRID_CACHE_SIZE = 256
+
+# Task, exposure, grid boxes and arguments of the `ImageMapReduceTask._mapCells`
+# call being processed, inherited by its forked worker processes.
+_mapperState = None
+
+
+def _runMapperCell(index):
+    """Run the mapper on one grid cell in a worker process.
+
+    Parameters
+    ----------
+    index : `int`
+        Index of the cell in the grid boxes being mapped.
+
+    Returns
+    -------
+    result : `lsst.pipe.base.Struct`
+        The output of `mapper.run` on the cell.
+    """
+    task, exposure, boxes0, boxes1, doClone, kwargs = _mapperState
+    return task._mapCell(exposure, boxes0[index], boxes1[index], doClone, **kwargs)
+
 
 class ImageMapperConfig(pexConfig.Config):
     """Configuration parameters for ImageMapper
@@ -165,6 +193,9 @@ class ImageReducerConfig(pexConfig.Config):
                        into correct location in new exposure""",
             "average": """same as copy, but also average pixels from overlapped regions
                        (NaNs ignored)""",
+            "feather": """same as average, but weight each subimage's pixels by a taper
+                       falling from one to near zero over `featherWidth` pixels at its
+                       edges, to blend overlapped regions without seams (NaNs ignored)""",
             "coaddPsf": """Instead of constructing an Exposure, take a list of returned
                        PSFs and use CoaddPsf to construct a single PSF that covers the
                        entire input exposure""",
@@ -175,6 +206,14 @@ class ImageReducerConfig(pexConfig.Config):
         doc="""Mask planes to set for invalid pixels""",
         default=('INVALID_MAPREDUCE', 'BAD', 'NO_DATA')
     )
+    featherWidth = pexConfig.Field(
+        dtype=float,
+        doc="""Width in pixels of the cosine taper at the edges of each subimage
+               for `reduceOperation='feather'`; at most half the overlap of
+               neighbouring subimages for seam-free blending""",
+        default=4.,
+        check=lambda x: x >= 0.
+    )
 
 
 class ImageReducer(pipeBase.Task):
@@ -203,8 +242,9 @@ class ImageReducer(pipeBase.Task):
 
         Parameters
         ----------
-        mapperResults : `list`
-            list of `lsst.pipe.base.Struct` returned by `ImageMapper.run`.
+        mapperResults : iterable
+            `lsst.pipe.base.Struct`s returned by `ImageMapper.run`; may be
+            a generator, which is consumed in a single pass.
         exposure : `lsst.afw.image.Exposure`
             the original exposure which is cloned to use as the
             basis for the resulting exposure (if
@@ -222,32 +262,59 @@ class ImageReducer(pipeBase.Task):
         Notes
         -----
         1. This currently correctly handles overlapping sub-exposures.
-           For overlapping sub-exposures, use `config.reduceOperation='average'`.
+           For overlapping sub-exposures, use `config.reduceOperation='average'`,
+           or 'feather' to blend them smoothly.
         2. This correctly handles varying PSFs, constructing the resulting
            exposure's PSF via CoaddPsf (DM-9629).
+        3. For the 'copy', 'sum', 'average' and 'feather' operations, each result is
+           folded into the new exposure as it arrives (see `startReduce`,
+           `addMapperResult` and `finishReduce`) and only its PSF and
+           bounding box are kept, so when `mapperResults` is a generator
+           only one sub-exposure need be held at a time.
 
         Known issues
 
         1. To be done: correct handling of masks (nearly there)
-        2. This logic currently makes *two* copies of the original exposure
-           (one here and one in `mapper.run()`). Possibly of concern
-           for large images on memory-constrained systems.
         """
         # No-op; simply pass mapperResults directly to ImageMapReduceTask.run
         if self.config.reduceOperation == 'none':
-            return pipeBase.Struct(result=mapperResults)
+            return pipeBase.Struct(result=list(mapperResults))
 
         if self.config.reduceOperation == 'coaddPsf':
             # Each element of `mapperResults` should contain 'psf' and 'bbox'
             coaddPsf = self._constructPsf(mapperResults, exposure)
             return pipeBase.Struct(result=coaddPsf)
 
+        accumulator = self.startReduce(exposure)
+        for item in mapperResults:
+            self.addMapperResult(accumulator, item)
+        return self.finishReduce(accumulator)
+
+    def startReduce(self, exposure):
+        """Allocate the accumulators for a 'copy', 'sum', 'average' or 'feather'
+        reduction.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            the original exposure which is cloned to use as the
+            basis for the resulting exposure
+
+        Returns
+        -------
+        accumulator : `lsst.pipe.base.Struct`
+            the reduction state, to be passed to `addMapperResult` and
+            `finishReduce`
+        """
+        reduceOp = self.config.reduceOperation
+        if reduceOp not in ('copy', 'sum', 'average', 'feather'):
+            raise ValueError('Cannot accumulate mapper results with reduceOperation=%s' % reduceOp)
+
         newExp = exposure.clone()
         newMI = newExp.getMaskedImage()
 
-        reduceOp = self.config.reduceOperation
+        weights = None
         if reduceOp == 'copy':
-            weights = None
             newMI.getImage()[:, :] = np.nan
             newMI.getVariance()[:, :] = np.nan
         else:
@@ -255,31 +322,82 @@ class ImageReducer(pipeBase.Task):
             newMI.getVariance()[:, :] = 0.
             if reduceOp == 'average':  # make an array to keep track of weights
                 weights = afwImage.ImageI(newMI.getBBox())
+            elif reduceOp == 'feather':  # fractional weights
+                weights = afwImage.ImageD(newMI.getBBox())
 
-        for item in mapperResults:
-            item = item.subExposure  # Expected named value in the pipeBase.Struct
-            if not (isinstance(item, afwImage.ExposureF) or isinstance(item, afwImage.ExposureI) or
-                    isinstance(item, afwImage.ExposureU) or isinstance(item, afwImage.ExposureD)):
-                raise TypeError("""Expecting an Exposure type, got %s.
-                                   Consider using `reduceOperation="none".""" % str(type(item)))
-            subExp = newExp.Factory(newExp, item.getBBox())
-            subMI = subExp.getMaskedImage()
-            patchMI = item.getMaskedImage()
-            isValid = ~np.isnan(patchMI.getImage().getArray() * patchMI.getVariance().getArray())
-
-            if reduceOp == 'copy':
-                subMI.getImage().getArray()[isValid] = patchMI.getImage().getArray()[isValid]
-                subMI.getVariance().getArray()[isValid] = patchMI.getVariance().getArray()[isValid]
-                subMI.getMask().getArray()[:, :] |= patchMI.getMask().getArray()
-
-            if reduceOp == 'sum' or reduceOp == 'average':  # much of these two options is the same
-                subMI.getImage().getArray()[isValid] += patchMI.getImage().getArray()[isValid]
-                subMI.getVariance().getArray()[isValid] += patchMI.getVariance().getArray()[isValid]
-                subMI.getMask().getArray()[:, :] |= patchMI.getMask().getArray()
-                if reduceOp == 'average':
-                    # wtsView is a view into the `weights` Image
-                    wtsView = afwImage.ImageI(weights, item.getBBox())
-                    wtsView.getArray()[isValid] += 1
+        return pipeBase.Struct(exposure=exposure, newExp=newExp, weights=weights, psfResults=[],
+                               featherWeights={})
+
+    def addMapperResult(self, accumulator, mapperResult):
+        """Fold one `ImageMapper.run` result into a reduction.
+
+        Only the PSF and bounding box of its sub-exposure are kept, so the
+        caller may release `mapperResult` once this returns.
+
+        Parameters
+        ----------
+        accumulator : `lsst.pipe.base.Struct`
+            the reduction state returned by `startReduce`
+        mapperResult : `lsst.pipe.base.Struct`
+            result of `ImageMapper.run`, containing a sub-exposure named
+            'subExposure'
+        """
+        reduceOp = self.config.reduceOperation
+        item = mapperResult.subExposure  # Expected named value in the pipeBase.Struct
+        if not (isinstance(item, afwImage.ExposureF) or isinstance(item, afwImage.ExposureI) or
+                isinstance(item, afwImage.ExposureU) or isinstance(item, afwImage.ExposureD)):
+            raise TypeError("""Expecting an Exposure type, got %s.
+                               Consider using `reduceOperation="none".""" % str(type(item)))
+        newExp = accumulator.newExp
+        subExp = newExp.Factory(newExp, item.getBBox())
+        subMI = subExp.getMaskedImage()
+        patchMI = item.getMaskedImage()
+        isValid = ~np.isnan(patchMI.getImage().getArray() * patchMI.getVariance().getArray())
+
+        if reduceOp == 'copy':
+            subMI.getImage().getArray()[isValid] = patchMI.getImage().getArray()[isValid]
+            subMI.getVariance().getArray()[isValid] = patchMI.getVariance().getArray()[isValid]
+            subMI.getMask().getArray()[:, :] |= patchMI.getMask().getArray()
+
+        if reduceOp == 'sum' or reduceOp == 'average':  # much of these two options is the same
+            subMI.getImage().getArray()[isValid] += patchMI.getImage().getArray()[isValid]
+            subMI.getVariance().getArray()[isValid] += patchMI.getVariance().getArray()[isValid]
+            subMI.getMask().getArray()[:, :] |= patchMI.getMask().getArray()
+            if reduceOp == 'average':
+                # wtsView is a view into the `weights` Image
+                wtsView = afwImage.ImageI(accumulator.weights, item.getBBox())
+                wtsView.getArray()[isValid] += 1
+
+        if reduceOp == 'feather':
+            cellWeights = self._getFeatherWeights(accumulator, isValid.shape)
+            subMI.getImage().getArray()[isValid] += (cellWeights*patchMI.getImage().getArray())[isValid]
+            subMI.getVariance().getArray()[isValid] += (cellWeights*patchMI.getVariance().getArray())[isValid]
+            subMI.getMask().getArray()[:, :] |= patchMI.getMask().getArray()
+            wtsView = afwImage.ImageD(accumulator.weights, item.getBBox())
+            wtsView.getArray()[isValid] += cellWeights[isValid]
+
+        if reduceOp != 'copy':
+            if item.getWcs() != accumulator.exposure.getWcs():
+                raise ValueError('Wcs of subExposure is different from exposure')
+            accumulator.psfResults.append(pipeBase.Struct(psf=item.getPsf(), bbox=item.getBBox()))
+
+    def finishReduce(self, accumulator):
+        """Complete a 'copy', 'sum', 'average' or 'feather' reduction.
+
+        Parameters
+        ----------
+        accumulator : `lsst.pipe.base.Struct`
+            the reduction state returned by `startReduce`, to which all
+            mapper results have been added
+
+        Returns
+        -------
+        A `lsst.pipe.base.Struct` containing the new `lsst.afw.image.Exposure`
+        (named 'exposure').
+        """
+        reduceOp = self.config.reduceOperation
+        newExp = accumulator.newExp
+        newMI = newExp.getMaskedImage()
 
         # New mask plane - for debugging map-reduced images
         mask = newMI.getMask()
@@ -292,15 +410,16 @@ class ImageReducer(pipeBase.Task):
             # set mask to INVALID for pixels where produced exposure is NaN
             mask.getArray()[isNan[0], isNan[1]] |= bad
 
-        if reduceOp == 'average':
-            wts = weights.getArray().astype(np.float)
-            self.log.info('AVERAGE: Maximum overlap: %f', np.nanmax(wts))
-            self.log.info('AVERAGE: Average overlap: %f', np.nanmean(wts))
-            self.log.info('AVERAGE: Minimum overlap: %f', np.nanmin(wts))
+        if reduceOp == 'average' or reduceOp == 'feather':
+            label = reduceOp.upper()
+            wts = accumulator.weights.getArray().astype(np.float)
+            self.log.info('%s: Maximum overlap: %f', label, np.nanmax(wts))
+            self.log.info('%s: Average overlap: %f', label, np.nanmean(wts))
+            self.log.info('%s: Minimum overlap: %f', label, np.nanmin(wts))
             wtsZero = np.equal(wts, 0.)
             wtsZeroInds = np.where(wtsZero)
             wtsZeroSum = len(wtsZeroInds[0])
-            self.log.info('AVERAGE: Number of zero pixels: %f (%f%%)', wtsZeroSum,
+            self.log.info('%s: Number of zero pixels: %f (%f%%)', label, wtsZeroSum,
                           wtsZeroSum * 100. / wtsZero.size)
             notWtsZero = ~wtsZero
             tmp = newMI.getImage().getArray()
@@ -315,12 +434,46 @@ class ImageReducer(pipeBase.Task):
                 mask.getArray()[wtsZeroInds] |= bad
 
         # Not sure how to construct a PSF when reduceOp=='copy'...
-        if reduceOp == 'sum' or reduceOp == 'average':
-            psf = self._constructPsf(mapperResults, exposure)
+        if reduceOp != 'copy':
+            psf = self._constructPsf(accumulator.psfResults, accumulator.exposure)
             newExp.setPsf(psf)
 
         return pipeBase.Struct(exposure=newExp)
 
+    def _getFeatherWeights(self, accumulator, shape):
+        """Return the 'feather' weights for a subimage of the given shape.
+
+        The weights are the product of a raised-cosine taper in x and in y,
+        rising over `config.featherWidth` pixels from each edge; they are
+        computed once per subimage shape.
+
+        Parameters
+        ----------
+        accumulator : `lsst.pipe.base.Struct`
+            the reduction state returned by `startReduce`
+        shape : `tuple` of `int`
+            the (height, width) of the subimage
+
+        Returns
+        -------
+        weights : `numpy.ndarray`
+            2D array of weights, in (0, 1]
+        """
+        weights = accumulator.featherWeights.get(shape)
+        if weights is None:
+            width = self.config.featherWidth
+
+            def taper(n):
+                # Distance of each pixel center from the nearer edge
+                distance = np.minimum(np.arange(n), np.arange(n)[::-1]) + 0.5
+                if width <= 0.:
+                    return np.ones(n)
+                return np.sin(0.5*np.pi*np.minimum(distance/width, 1.))**2
+
+            weights = np.outer(taper(shape[0]), taper(shape[1]))
+            accumulator.featherWeights[shape] = weights
+        return weights
+
     def _constructPsf(self, mapperResults, exposure):
         """Construct a CoaddPsf based on PSFs from individual subExposures
 
@@ -483,6 +636,22 @@ class ImageMapReduceConfig(pexConfig.Config):
         default=("INTRP", "EDGE", "DETECTED", "SAT", "CR", "BAD", "NO_DATA", "DETECTED_NEGATIVE")
     )
 
+    doStreamReduce = pexConfig.Field(
+        dtype=bool,
+        doc="""Pass each mapper result to the reducer as it is produced, rather than
+               collecting them all first? Then the 'copy', 'sum', 'average' and 'feather' reductions
+               hold only one sub-exposure at a time.""",
+        default=False
+    )
+
+    nWorkers = pexConfig.Field(
+        dtype=int,
+        doc="""Number of processes over which to run the mapper on the sub-exposures;
+               1 to run it serially in this process""",
+        default=1,
+        check=lambda x: x >= 1
+    )
+
 
 class ImageMapReduceTask(pipeBase.Task):
     """Split an Exposure into subExposures (optionally on a grid) and
@@ -492,9 +661,9 @@ class ImageMapReduceTask(pipeBase.Task):
     larger Exposure, and then (by default) have those subExposures
     stitched back together into a new, full-sized image.
 
-    Contrary to the expectation given by its name, this task does not
-    perform these operations in parallel, although it could be updatd
-    to provide such functionality.
+    The mapper is run serially on the subExposures by default, or over a
+    pool of `config.nWorkers` processes. The reduction is always
+    performed serially, on the mapper results in grid order.
 
     The actual operations are performed by two subTasks passed to the
     config. The exposure passed to this task's `run` method will be
@@ -520,6 +689,8 @@ class ImageMapReduceTask(pipeBase.Task):
         pipeBase.Task.__init__(self, *args, **kwargs)
 
         self.boxes0 = self.boxes1 = None
+        self.corners0 = self.corners1 = None
+        self._gridKey = None
         self.makeSubtask("mapper")
         self.makeSubtask("reducer")
 
@@ -546,11 +717,44 @@ class ImageMapReduceTask(pipeBase.Task):
 
         """
         self.log.info("Mapper sub-task: %s", self.mapper._DefaultName)
-        mapperResults = self._runMapper(exposure, **kwargs)
+        if self.config.doStreamReduce:
+            mapperResults = self._iterMapper(exposure, **kwargs)
+        else:
+            mapperResults = self._runMapper(exposure, **kwargs)
         self.log.info("Reducer sub-task: %s", self.reducer._DefaultName)
         result = self._reduceImage(mapperResults, exposure, **kwargs)
         return result
 
+    def runRegions(self, exposure, regions, **kwargs):
+        """Perform the mapper on only the grid cells overlapping the given
+        regions of the exposure.
+
+        The remaining cells are mapped only if their results are later
+        requested from the returned `ImageMapReduceCells`.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            the full exposure to process
+        regions : iterable
+            `lsst.afw.geom.Box2I`, `lsst.afw.geom.Box2D` or points
+            (`lsst.afw.geom.Point2D`, `lsst.afw.geom.Point2I` or (x, y)
+            tuples) in the parent pixel coordinates of `exposure`
+        kwargs :
+            additional keyword arguments to be passed to
+            subtask `run` methods
+
+        Returns
+        -------
+        cells : `ImageMapReduceCells`
+            the grid cells of `exposure`, with those overlapping `regions`
+            mapped
+        """
+        cells = ImageMapReduceCells(self, exposure, **kwargs)
+        self.log.info("Processing %d of %d sub-exposures",
+                      len(cells.getResults(regions)), len(cells))
+        return cells
+
     def _runMapper(self, exposure, doClone=False, **kwargs):
         """Perform `mapper.run` on each sub-exposure
 
@@ -574,27 +778,165 @@ class ImageMapReduceTask(pipeBase.Task):
         -------
         a list of `pipeBase.Struct`s as returned by `mapper.run`.
         """
-        if self.boxes0 is None:
-            self._generateGrid(exposure, **kwargs)  # possibly pass `forceEvenSized`
+        return list(self._iterMapper(exposure, doClone=doClone, **kwargs))
+
+    def _iterMapper(self, exposure, doClone=False, **kwargs):
+        """Perform `mapper.run` on each sub-exposure, yielding the results
+        in grid order as they are produced.
+
+        Parameters are as for `_runMapper`.
+
+        Yields
+        ------
+        result : `lsst.pipe.base.Struct`
+            the output of `mapper.run` on each sub-exposure
+        """
+        self._updateGrid(exposure, **kwargs)  # possibly pass `forceEvenSized`
         if len(self.boxes0) != len(self.boxes1):
             raise ValueError('Bounding boxes list and expanded bounding boxes list are of different lengths')
 
         self.log.info("Processing %d sub-exposures", len(self.boxes0))
-        mapperResults = []
-        for box0, box1 in zip(self.boxes0, self.boxes1):
-            subExp = exposure.Factory(exposure, box0)
-            expandedSubExp = exposure.Factory(exposure, box1)
-            if doClone:
-                subExp = subExp.clone()
-                expandedSubExp = expandedSubExp.clone()
-            result = self.mapper.run(subExp, expandedSubExp, exposure.getBBox(), **kwargs)
+        yield from self._mapCells(exposure, self.boxes0, self.boxes1, range(len(self.boxes0)), doClone,
+                                  **kwargs)
+
+    def _mapCells(self, exposure, boxes0, boxes1, indices, doClone=False, **kwargs):
+        """Perform `mapper.run` on the given grid cells, serially or over a
+        pool of `config.nWorkers` processes, yielding the results in the
+        order of `indices`.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            the original exposure which is used as the template
+        boxes0, boxes1 : `list` of `lsst.afw.geom.Box2I`
+            the grid of sub-exposure and expanded sub-exposure boxes
+        indices : sequence of `int`
+            indices of the cells in `boxes0` and `boxes1`
+        doClone : `bool`
+            if True, clone the subimages before passing to subtask
+        kwargs :
+            additional keyword arguments to be passed to `mapper.run`
+
+        Yields
+        ------
+        result : `lsst.pipe.base.Struct`
+            the output of `mapper.run` on each cell
+        """
+        nWorkers = min(self.config.nWorkers, len(indices))
+        if nWorkers > 1:
+            mapperResults = self._iterMapperParallel(exposure, boxes0, boxes1, indices, nWorkers, doClone,
+                                                     **kwargs)
+        else:
+            mapperResults = (self._mapCell(exposure, boxes0[index], boxes1[index], doClone, **kwargs)
+                             for index in indices)
+
+        for result, index in zip(mapperResults, indices):
             if self.config.returnSubImages:
+                subExp, expandedSubExp = self._makeSubExposures(exposure, boxes0[index], boxes1[index],
+                                                                doClone)
                 toAdd = pipeBase.Struct(inputSubExposure=subExp,
                                         inputExpandedSubExposure=expandedSubExp)
                 result.mergeItems(toAdd, 'inputSubExposure', 'inputExpandedSubExposure')
-            mapperResults.append(result)
+            yield result
 
-        return mapperResults
+    def _mapCell(self, exposure, box0, box1, doClone=False, **kwargs):
+        """Perform `mapper.run` on one grid cell.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            the original exposure which is used as the template
+        box0, box1 : `lsst.afw.geom.Box2I`
+            bounding boxes of the sub-exposure and expanded sub-exposure
+        doClone : `bool`
+            if True, clone the subimages before passing to subtask
+        kwargs :
+            additional keyword arguments to be passed to `mapper.run`
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            the output of `mapper.run`
+        """
+        subExp, expandedSubExp = self._makeSubExposures(exposure, box0, box1, doClone)
+        return self.mapper.run(subExp, expandedSubExp, exposure.getBBox(), **kwargs)
+
+    def _makeSubExposures(self, exposure, box0, box1, doClone=False):
+        """Make the sub-exposure and expanded sub-exposure of one grid cell.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            the original exposure
+        box0, box1 : `lsst.afw.geom.Box2I`
+            bounding boxes of the sub-exposure and expanded sub-exposure
+        doClone : `bool`
+            if True, clone the sub-exposures rather than returning views
+            of `exposure`
+
+        Returns
+        -------
+        subExp, expandedSubExp : `lsst.afw.image.Exposure`
+            the sub-exposure and expanded sub-exposure
+        """
+        subExp = exposure.Factory(exposure, box0)
+        expandedSubExp = exposure.Factory(exposure, box1)
+        if doClone:
+            subExp = subExp.clone()
+            expandedSubExp = expandedSubExp.clone()
+        return subExp, expandedSubExp
+
+    def _iterMapperParallel(self, exposure, boxes0, boxes1, indices, nWorkers, doClone=False, **kwargs):
+        """Perform `mapper.run` on the given grid cells over a pool of processes
+
+        The worker processes are forked from this one, so they share the
+        pixels of `exposure` (and of any exposures in `kwargs`) and the
+        mapper rather than having them pickled; each builds its
+        sub-exposures as views of the shared planes. Only the mapper
+        results are pickled back, and they are yielded in the order of
+        `indices`, so the reduction is that of the serial loop. Changes the mapper makes
+        to its own state, such as its metadata, are not propagated back.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            the original exposure which is used as the template
+        boxes0, boxes1 : `list` of `lsst.afw.geom.Box2I`
+            the grid of sub-exposure and expanded sub-exposure boxes
+        indices : sequence of `int`
+            indices of the cells in `boxes0` and `boxes1`
+        nWorkers : `int`
+            number of worker processes
+        doClone : `bool`
+            if True, clone the subimages before passing to subtask
+        kwargs :
+            additional keyword arguments to be passed to `mapper.run`
+
+        Yields
+        ------
+        result : `lsst.pipe.base.Struct`
+            the output of `mapper.run` on each sub-exposure
+        """
+        global _mapperState
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            self.log.warn("Cannot fork worker processes on this platform; running the mapper serially")
+            for index in indices:
+                yield self._mapCell(exposure, boxes0[index], boxes1[index], doClone, **kwargs)
+            return
+
+        self.log.info("Running the mapper over %d processes", nWorkers)
+        # The workers are forked, and so take their copy of the state, when the pool is created.
+        previousState = _mapperState  # This may itself be running in a worker
+        _mapperState = (self, exposure, boxes0, boxes1, doClone, kwargs)
+        try:
+            pool = context.Pool(nWorkers)
+        finally:
+            _mapperState = previousState
+        with pool:
+            chunkSize = max(1, len(indices)//(4*nWorkers))
+            yield from pool.imap(_runMapperCell, indices, chunkSize)
 
     def _reduceImage(self, mapperResults, exposure, **kwargs):
         """Reduce/merge a set of sub-exposures into a final result
@@ -619,7 +961,43 @@ class ImageMapReduceTask(pipeBase.Task):
         result = self.reducer.run(mapperResults, exposure, **kwargs)
         return result
 
-    def _generateGrid(self, exposure, forceEvenSized=False, **kwargs):
+    def _updateGrid(self, exposure, forceEvenSized=False, **kwargs):
+        """Generate the grid for `exposure` via `_generateGrid`, unless the
+        current one was generated for the same bounding box, grid config
+        and PSF, or was set directly.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            input exposure whose full bounding box is to be evenly gridded.
+        forceEvenSized : `bool`
+            force grid elements to have even-valued x- and y- dimensions?
+        """
+        # kwargs are ignored, but necessary to enable optional passing of
+        # `forceEvenSized` from `_runMapper`.
+        if self.boxes0 is None or self._gridKey is not None:
+            key = self._makeGridKey(exposure, forceEvenSized)
+            if key != self._gridKey:
+                self._generateGrid(exposure, forceEvenSized=forceEvenSized, gridKey=key)
+
+    def _makeGridKey(self, exposure, forceEvenSized=False):
+        """Return everything the grid of `exposure` depends on, as a hashable key.
+        """
+        config = self.config
+        bbox = exposure.getBBox()
+        useCentroids = config.cellCentroidsX is not None and len(config.cellCentroidsX) > 0
+        psfFwhm = None
+        if not useCentroids and config.scaleByFwhm:
+            psfFwhm = (exposure.getPsf().computeShape().getDeterminantRadius() *
+                       2.*np.sqrt(2.*np.log(2.)))
+        return (bbox.getMinX(), bbox.getMinY(), bbox.getWidth(), bbox.getHeight(), bool(forceEvenSized),
+                tuple(config.cellCentroidsX) if useCentroids else None,
+                tuple(config.cellCentroidsY or ()) if useCentroids else None,
+                config.cellSizeX, config.cellSizeY, config.gridStepX, config.gridStepY,
+                config.borderSizeX, config.borderSizeY, config.adjustGridOption,
+                config.scaleByFwhm, psfFwhm)
+
+    def _generateGrid(self, exposure, forceEvenSized=False, gridKey=None, **kwargs):
         """Generate two lists of bounding boxes that evenly grid `exposure`
 
         Unless the config was provided with `cellCentroidsX` and
@@ -631,7 +1009,14 @@ class ImageMapReduceTask(pipeBase.Task):
         bounding boxes are adjusted to ensure that they intersect the
         exposure's bounding box. The resulting lists of bounding boxes
         and corresponding expanded bounding boxes are set to
-        `self.boxes0`, `self.boxes1`.
+        `self.boxes0`, `self.boxes1`, and their corners (min x, min y,
+        max x, max y) to the `numpy.ndarray`s `self.corners0`,
+        `self.corners1`.
+
+        The corners are cached, in this process, by exposure bounding box,
+        grid config and (if `scaleByFwhm`) PSF FWHM, so gridding another
+        exposure of the same size and PSF width, with this or another
+        task, reuses them.
 
         Parameters
         ----------
@@ -640,11 +1025,55 @@ class ImageMapReduceTask(pipeBase.Task):
         forceEvenSized : `bool`
             force grid elements to have even-valued x- and y- dimensions?
             (Potentially useful if doing Fourier transform of subExposures.)
+        gridKey : `tuple`, optional
+            The key of `exposure` from `_makeGridKey`, if already computed.
         """
         # kwargs are ignored, but necessary to enable optional passing of
         # `forceEvenSized` from `_runMapper`.
-        bbox = exposure.getBBox()
+        key = self._makeGridKey(exposure, forceEvenSized) if gridKey is None else gridKey
+        corners = _gridCache.get(key)
+        if corners is None:
+            corners = self._computeGridCorners(exposure.getBBox(), forceEvenSized, psfFwhm=key[-1])
+            for array in corners:
+                array.flags.writeable = False  # Shared between tasks
+            _gridCache[key] = corners
+            if len(_gridCache) > _GRID_CACHE_SIZE:
+                _gridCache.popitem(last=False)
+        else:
+            _gridCache.move_to_end(key)
+
+        self.corners0, self.corners1 = corners
+        self._gridKey = key
+        self.boxes0 = [afwGeom.Box2I(afwGeom.Point2I(int(x0), int(y0)), afwGeom.Point2I(int(x1), int(y1)))
+                       for x0, y0, x1, y1 in self.corners0]  # "main" boxes
+        self.boxes1 = [afwGeom.Box2I(afwGeom.Point2I(int(x0), int(y0)), afwGeom.Point2I(int(x1), int(y1)))
+                       for x0, y0, x1, y1 in self.corners1]  # "expanded" boxes
+        return self.boxes0, self.boxes1
+
+    def _computeGridCorners(self, bbox, forceEvenSized=False, psfFwhm=None):
+        """Compute the corners of the grid boxes of `_generateGrid`.
+
+        Parameters
+        ----------
+        bbox : `lsst.afw.geom.Box2I`
+            bounding box to be evenly gridded.
+        forceEvenSized : `bool`
+            force grid elements to have even-valued x- and y- dimensions?
+        psfFwhm : `float`
+            PSF FWHM by which to scale the grid parameters, if
+            `scaleByFwhm`; unused if given `cellCentroidsX`
 
+        Raises
+        ------
+        ValueError
+            If `scaleByFwhm` is set and `psfFwhm` is not given.
+
+        Returns
+        -------
+        corners0, corners1 : `numpy.ndarray`
+            (N, 4) arrays of the min x, min y, max x and max y of the
+            "main" and "expanded" boxes
+        """
         # Extract the config parameters for conciseness.
         cellCentroidsX = self.config.cellCentroidsX
         cellCentroidsY = self.config.cellCentroidsY
@@ -659,10 +1088,9 @@ class ImageMapReduceTask(pipeBase.Task):
 
         if cellCentroidsX is None or len(cellCentroidsX) <= 0:
             # Not given centroids; construct them from cellSize/gridStep
-
-            psfFwhm = (exposure.getPsf().computeShape().getDeterminantRadius() *
-                       2.*np.sqrt(2.*np.log(2.)))
             if scaleByFwhm:
+                if psfFwhm is None:
+                    raise ValueError('A psfFwhm is required to grid with scaleByFwhm=True')
                 self.log.info("Scaling grid parameters by %f" % psfFwhm)
 
             def rescaleValue(val):
@@ -678,9 +1106,6 @@ class ImageMapReduceTask(pipeBase.Task):
             borderSizeX = rescaleValue(borderSizeX)
             borderSizeY = rescaleValue(borderSizeY)
 
-            nGridX = bbox.getWidth()//gridStepX
-            nGridY = bbox.getHeight()//gridStepY
-
             if adjustGridOption == 'spacing':
                 # Readjust spacings so that they fit perfectly in the image.
                 nGridX = bbox.getWidth()//cellSizeX + 1
@@ -700,63 +1125,69 @@ class ImageMapReduceTask(pipeBase.Task):
                 xLinSpace = np.arange(cellSizeX//2, bbox.getWidth() + cellSizeX//2, gridStepX)
                 yLinSpace = np.arange(cellSizeY//2, bbox.getHeight() + cellSizeY//2, gridStepY)
 
-            cellCentroids = [(x, y) for x in xLinSpace for y in yLinSpace]
+            # All x, y pairs, with y varying fastest
+            centroidsX = np.repeat(xLinSpace, len(yLinSpace))
+            centroidsY = np.tile(yLinSpace, len(xLinSpace))
 
         else:
-            # in py3 zip returns an iterator, but want to test length below, so use this instead:
-            cellCentroids = [(cellCentroidsX[i], cellCentroidsY[i]) for i in range(len(cellCentroidsX))]
-
-        # first "main" box at 0,0
-        bbox0 = afwGeom.Box2I(afwGeom.Point2I(bbox.getBegin()), afwGeom.Extent2I(cellSizeX, cellSizeY))
-        # first expanded box
-        bbox1 = afwGeom.Box2I(bbox0)
-        bbox1.grow(afwGeom.Extent2I(borderSizeX, borderSizeY))
-
-        self.boxes0 = []  # "main" boxes; store in task so can be extracted if needed
-        self.boxes1 = []  # "expanded" boxes
-
-        def _makeBoxEvenSized(bb):
-            """Force a bounding-box to have dimensions that are modulo 2."""
-
-            if bb.getWidth() % 2 == 1:  # grow to the right
-                bb.include(afwGeom.Point2I(bb.getMaxX()+1, bb.getMaxY()))  # Expand by 1 pixel!
-                bb.clip(bbox)
-                if bb.getWidth() % 2 == 1:  # clipped at right -- so grow to the left
-                    bb.include(afwGeom.Point2I(bb.getMinX()-1, bb.getMaxY()))
-                    bb.clip(bbox)
-            if bb.getHeight() % 2 == 1:  # grow upwards
-                bb.include(afwGeom.Point2I(bb.getMaxX(), bb.getMaxY()+1))  # Expand by 1 pixel!
-                bb.clip(bbox)
-                if bb.getHeight() % 2 == 1:  # clipped upwards -- so grow down
-                    bb.include(afwGeom.Point2I(bb.getMaxX(), bb.getMinY()-1))
-                    bb.clip(bbox)
-            if bb.getWidth() % 2 == 1 or bb.getHeight() % 2 == 1:  # Box is probably too big
-                raise RuntimeError('Cannot make bounding box even-sized. Probably too big.')
+            if cellCentroidsY is None or len(cellCentroidsY) < len(cellCentroidsX):
+                raise ValueError('Fewer cellCentroidsY than cellCentroidsX')
+            centroidsX = np.array(cellCentroidsX, dtype=float)
+            centroidsY = np.array(cellCentroidsY[:len(cellCentroidsX)], dtype=float)
 
-            return bb
+        cellSizeX, cellSizeY = int(cellSizeX), int(cellSizeY)
+        borderSizeX, borderSizeY = int(borderSizeX), int(borderSizeY)
 
         # Use given or grid-parameterized centroids as centers for bounding boxes
-        if cellCentroids is not None and len(cellCentroids) > 0:
-            for x, y in cellCentroids:
-                centroid = afwGeom.Point2D(x, y)
-                bb0 = afwGeom.Box2I(bbox0)
-                xoff = int(np.floor(centroid.getX())) - bb0.getWidth()//2
-                yoff = int(np.floor(centroid.getY())) - bb0.getHeight()//2
-                bb0.shift(afwGeom.Extent2I(xoff, yoff))
-                bb0.clip(bbox)
-                if forceEvenSized:
-                    bb0 = _makeBoxEvenSized(bb0)
-                bb1 = afwGeom.Box2I(bbox1)
-                bb1.shift(afwGeom.Extent2I(xoff, yoff))
-                bb1.clip(bbox)
-                if forceEvenSized:
-                    bb1 = _makeBoxEvenSized(bb1)
-
-                if bb0.getArea() > 1 and bb1.getArea() > 1:
-                    self.boxes0.append(bb0)
-                    self.boxes1.append(bb1)
+        minX = bbox.getMinX() + np.floor(centroidsX).astype(int) - cellSizeX//2
+        minY = bbox.getMinY() + np.floor(centroidsY).astype(int) - cellSizeY//2
+        corners0 = np.stack([minX, minY, minX + cellSizeX - 1, minY + cellSizeY - 1], axis=1)
+        corners1 = np.stack([minX - borderSizeX, minY - borderSizeY,
+                             minX + cellSizeX - 1 + borderSizeX, minY + cellSizeY - 1 + borderSizeY], axis=1)
+
+        areas = []
+        for corners in (corners0, corners1):
+            # Clip to `bbox`; boxes outside it become empty
+            np.maximum(corners[:, 0], bbox.getMinX(), out=corners[:, 0])
+            np.maximum(corners[:, 1], bbox.getMinY(), out=corners[:, 1])
+            np.minimum(corners[:, 2], bbox.getMaxX(), out=corners[:, 2])
+            np.minimum(corners[:, 3], bbox.getMaxY(), out=corners[:, 3])
+            isEmpty = (corners[:, 2] < corners[:, 0]) | (corners[:, 3] < corners[:, 1])
+            if forceEvenSized:
+                self._makeCornersEvenSized(corners, bbox, ~isEmpty)
+            width = corners[:, 2] - corners[:, 0] + 1
+            height = corners[:, 3] - corners[:, 1] + 1
+            areas.append(np.where(isEmpty, 0, width*height))
+
+        isValid = (areas[0] > 1) & (areas[1] > 1)
+        return corners0[isValid], corners1[isValid]
+
+    @staticmethod
+    def _makeCornersEvenSized(corners, bbox, isSet):
+        """Force boxes to have dimensions that are modulo 2, in place.
+
+        Odd-sized boxes are grown by a pixel to the right (upwards), or
+        to the left (downwards) if that would leave `bbox`.
 
-        return self.boxes0, self.boxes1
+        Parameters
+        ----------
+        corners : `numpy.ndarray`
+            (N, 4) array of the min x, min y, max x and max y of the boxes,
+            which are within `bbox`
+        bbox : `lsst.afw.geom.Box2I`
+            bounding box within which to keep the boxes
+        isSet : `numpy.ndarray`
+            which boxes to adjust (the non-empty ones)
+        """
+        for minCol, maxCol, bboxMin, bboxMax in ((0, 2, bbox.getMinX(), bbox.getMaxX()),
+                                                 (1, 3, bbox.getMinY(), bbox.getMaxY())):
+            isOdd = isSet & ((corners[:, maxCol] - corners[:, minCol]) % 2 == 0)
+            growMax = isOdd & (corners[:, maxCol] < bboxMax)
+            corners[growMax, maxCol] += 1  # Expand by 1 pixel!
+            growMin = isOdd & ~growMax & (corners[:, minCol] > bboxMin)
+            corners[growMin, minCol] -= 1
+            if np.any(isOdd & ~growMax & ~growMin):  # Box is probably too big
+                raise RuntimeError('Cannot make bounding box even-sized. Probably too big.')
 
     def plotBoxes(self, fullBBox, skip=3):
         """Plot both grids of boxes using matplotlib.
@@ -804,3 +1235,133 @@ class ImageMapReduceTask(pipeBase.Task):
             plotBox(b)
         plt.xlim(bbox.getBeginX(), bbox.getEndX())
         plt.ylim(bbox.getBeginY(), bbox.getEndY())
+
+
+def _regionToBox(region):
+    """Return the `lsst.afw.geom.Box2I` of pixels covered by a box or point.
+    """
+    if isinstance(region, afwGeom.Box2I):
+        return region
+    if isinstance(region, afwGeom.Box2D):
+        return afwGeom.Box2I(region, afwGeom.Box2I.EXPAND)
+    point = afwGeom.Point2I(int(np.floor(region[0] + 0.5)), int(np.floor(region[1] + 0.5)))
+    return afwGeom.Box2I(point, afwGeom.Extent2I(1, 1))
+
+
+class ImageMapReduceCells:
+    """The grid cells of an exposure processed by an `ImageMapReduceTask`,
+    whose mapper results are computed on demand and memoised.
+
+    Returned by `ImageMapReduceTask.runRegions`. A cell is identified by
+    its index in `boxes0` and `boxes1`, the task's grid for `exposure`
+    when this was made (the task may since have gridded other exposures),
+    and its mapper is run the first time its result is requested.
+
+    Parameters
+    ----------
+    task : `ImageMapReduceTask`
+        the task whose mapper and reducer to run
+    exposure : `lsst.afw.image.Exposure`
+        the full exposure to process
+    doClone : `bool`
+        if True, clone the subimages before passing to subtask
+    kwargs :
+        additional keyword arguments to be passed to
+        subtask `run` methods
+    """
+    def __init__(self, task, exposure, doClone=False, **kwargs):
+        self.task = task
+        self.exposure = exposure
+        self._doClone = doClone
+        self._kwargs = kwargs
+        task._updateGrid(exposure, **kwargs)  # possibly pass `forceEvenSized`
+        if len(task.boxes0) != len(task.boxes1):
+            raise ValueError('Bounding boxes list and expanded bounding boxes list are of different lengths')
+        # Keep this grid, as the task regenerates its own for other exposures
+        self.boxes0 = list(task.boxes0)
+        self.boxes1 = list(task.boxes1)
+        self._corners = np.array([(bb.getMinX(), bb.getMinY(), bb.getMaxX(), bb.getMaxY())
+                                  for bb in self.boxes0], dtype=int).reshape(-1, 4)
+        self._results = {}
+
+    def __len__(self):
+        return len(self._corners)
+
+    @property
+    def computedCells(self):
+        """Indices of the cells mapped so far, in grid order (`list` of `int`).
+        """
+        return sorted(self._results)
+
+    def findCells(self, regions):
+        """Return the indices of the cells whose sub-exposures overlap any of
+        the given regions.
+
+        Parameters
+        ----------
+        regions : iterable
+            boxes or points, as for `ImageMapReduceTask.runRegions`
+
+        Returns
+        -------
+        indices : `list` of `int`
+            indices of the overlapping cells, in grid order
+        """
+        overlaps = np.zeros(len(self), dtype=bool)
+        for region in regions:
+            box = _regionToBox(region)
+            overlaps |= ((self._corners[:, 0] <= box.getMaxX()) & (self._corners[:, 2] >= box.getMinX()) &
+                         (self._corners[:, 1] <= box.getMaxY()) & (self._corners[:, 3] >= box.getMinY()))
+        return np.flatnonzero(overlaps).tolist()
+
+    def getResults(self, regions=None, indices=None):
+        """Return the mapper results of the requested cells, mapping those not
+        already mapped.
+
+        Parameters
+        ----------
+        regions : iterable, optional
+            boxes or points, as for `ImageMapReduceTask.runRegions`, to
+            request the cells overlapping them
+        indices : iterable of `int`, optional
+            indices of the cells to request, if `regions` is None; all
+            cells if both are None
+
+        Returns
+        -------
+        mapperResults : `list`
+            the `lsst.pipe.base.Struct`s returned by `mapper.run` on the
+            requested cells, in the order of their indices
+        """
+        if regions is not None:
+            indices = self.findCells(regions)
+        elif indices is None:
+            indices = range(len(self))
+        indices = list(indices)
+        missing = [index for index in indices if index not in self._results]
+        if missing:
+            results = self.task._mapCells(self.exposure, self.boxes0, self.boxes1, missing, self._doClone,
+                                          **self._kwargs)
+            self._results.update(zip(missing, results))
+        return [self._results[index] for index in indices]
+
+    def reduce(self, regions=None):
+        """Reduce the mapper results of the cells overlapping the given
+        regions, mapping those not already mapped.
+
+        Parameters
+        ----------
+        regions : iterable, optional
+            boxes or points, as for `ImageMapReduceTask.runRegions`;
+            reduce all cells mapped so far if None
+
+        Returns
+        -------
+        output of `reducer.run()` on the results; pixels of the resulting
+        exposure outside the reduced cells are invalid
+        """
+        if regions is None:
+            mapperResults = self.getResults(indices=self.computedCells)
+        else:
+            mapperResults = self.getResults(regions)
+        return self.task._reduceImage(mapperResults, self.exposure, **self._kwargs)
@@ -34,6 +34,7 @@ import lsst.pipe.base as pipeBase
 from lsst.meas.algorithms import SourceDetectionTask, SubtractBackgroundTask
 from lsst.meas.base import SingleFrameMeasurementTask
 from .makeKernelBasisList import makeKernelBasisList
+from .basisConvolution import convolveSpatialBasis
 from .psfMatch import PsfMatchTask, PsfMatchConfigDF, PsfMatchConfigAL
 from . import utils as diffimUtils
 from . import diffimLib
@@ -62,6 +63,15 @@ class ImagePsfMatchConfig(pexConfig.Config):
         target=SingleFrameMeasurementTask,
         doc="Initial measurements used to feed stars to kernel fitting",
     )
+    maxBandMemory = pexConfig.Field(
+        dtype=float,
+        doc="""Approximate limit in MB on the working memory used by subtractExposures to convolve
+                 and subtract.  If positive, the image is convolved and subtracted in horizontal bands,
+                 each read with the kernel halo, and the full matched exposure is never made.
+                 If 0, the whole image is convolved at once.""",
+        default=0.0,
+        check=lambda x: x >= 0.0,
+    )
 
     def setDefaults(self):
         # High sigma detections only
@@ -338,7 +348,8 @@ class ImagePsfMatchTask(PsfMatchTask):
     @pipeBase.timeMethod
     def matchExposures(self, templateExposure, scienceExposure,
                        templateFwhmPix=None, scienceFwhmPix=None,
-                       candidateList=None, doWarping=True, convolveTemplate=True):
+                       candidateList=None, doWarping=True, convolveTemplate=True, doConvolve=True,
+                       matchedExposure=None):
         """Warp and PSF-match an exposure to the reference.
 
         Do the following, in order:
@@ -379,6 +390,14 @@ class ImagePsfMatchTask(PsfMatchTask):
             - if `False`, ``templateExposure`` is warped if doWarping,
               ``scienceExposure`` is convolved
 
+        doConvolve : `bool`, optional
+            Convolve by the PSF matching kernel?  If `False` only the kernel
+            and background model are fit, and ``matchedExposure`` is `None`.
+        matchedExposure : `lsst.afw.image.ExposureF`, optional
+            Exposure with the bounding box of ``scienceExposure`` into which
+            to write the PSF-matched exposure, rather than allocating a new
+            one.
+
         Returns
         -------
         results : `lsst.pipe.base.Struct`
@@ -400,6 +419,9 @@ class ImagePsfMatchTask(PsfMatchTask):
         RuntimeError
            Raised if doWarping is False and ``templateExposure`` and
            ``scienceExposure`` WCSs do not match
+        ValueError
+           Raised if ``matchedExposure`` does not have the bounding box of
+           the exposure to convolve
         """
         if not self._validateWcs(templateExposure, scienceExposure):
             if doWarping:
@@ -427,28 +449,41 @@ class ImagePsfMatchTask(PsfMatchTask):
                 scienceFwhmPix = self.getFwhmPix(scienceExposure.getPsf())
                 self.log.info("scienceFwhmPix: {}".format(scienceFwhmPix))
 
+        matchedMaskedImage = None
+        if matchedExposure is not None:
+            matchedMaskedImage = matchedExposure.getMaskedImage()
+
         kernelSize = makeKernelBasisList(self.kConfig, templateFwhmPix, scienceFwhmPix)[0].getWidth()
         candidateList = self.makeCandidateList(templateExposure, scienceExposure, kernelSize, candidateList)
 
         if convolveTemplate:
             results = self.matchMaskedImages(
                 templateExposure.getMaskedImage(), scienceExposure.getMaskedImage(), candidateList,
-                templateFwhmPix=templateFwhmPix, scienceFwhmPix=scienceFwhmPix)
+                templateFwhmPix=templateFwhmPix, scienceFwhmPix=scienceFwhmPix, doConvolve=doConvolve,
+                matchedMaskedImage=matchedMaskedImage)
         else:
             results = self.matchMaskedImages(
                 scienceExposure.getMaskedImage(), templateExposure.getMaskedImage(), candidateList,
-                templateFwhmPix=scienceFwhmPix, scienceFwhmPix=templateFwhmPix)
+                templateFwhmPix=scienceFwhmPix, scienceFwhmPix=templateFwhmPix, doConvolve=doConvolve,
+                matchedMaskedImage=matchedMaskedImage)
 
-        psfMatchedExposure = afwImage.makeExposure(results.matchedImage, scienceExposure.getWcs())
-        psfMatchedExposure.setFilter(templateExposure.getFilter())
-        psfMatchedExposure.setPhotoCalib(scienceExposure.getPhotoCalib())
+        psfMatchedExposure = None
+        if doConvolve:
+            if matchedExposure is None:
+                psfMatchedExposure = afwImage.makeExposure(results.matchedImage, scienceExposure.getWcs())
+            else:
+                psfMatchedExposure = matchedExposure
+                psfMatchedExposure.setWcs(scienceExposure.getWcs())
+            psfMatchedExposure.setFilter(templateExposure.getFilter())
+            psfMatchedExposure.setPhotoCalib(scienceExposure.getPhotoCalib())
         results.warpedExposure = templateExposure
         results.matchedExposure = psfMatchedExposure
         return results
 
     @pipeBase.timeMethod
     def matchMaskedImages(self, templateMaskedImage, scienceMaskedImage, candidateList,
-                          templateFwhmPix=None, scienceFwhmPix=None):
+                          templateFwhmPix=None, scienceFwhmPix=None, doConvolve=True,
+                          matchedMaskedImage=None):
         """PSF-match a MaskedImage (templateMaskedImage) to a reference MaskedImage (scienceMaskedImage).
 
         Do the following, in order:
@@ -474,6 +509,14 @@ class ImagePsfMatchTask(PsfMatchTask):
 
             - Currently supported: list of Footprints or measAlg.PsfCandidateF
 
+        doConvolve : `bool`, optional
+            Convolve by the PSF matching kernel?  If `False` only the kernel
+            and background model are fit, and ``matchedImage`` is `None`.
+        matchedMaskedImage : `lsst.afw.image.MaskedImageF`, optional
+            MaskedImage with the bounding box of ``templateMaskedImage`` into
+            which to write the PSF-matched image, rather than allocating a new
+            one.
+
         Returns
         -------
         result : `callable`
@@ -490,6 +533,9 @@ class ImagePsfMatchTask(PsfMatchTask):
         ------
         RuntimeError
             Raised if input images have different dimensions
+        ValueError
+            Raised if ``matchedMaskedImage`` does not have the bounding box
+            of ``templateMaskedImage``
         """
         import lsstDebug
         display = lsstDebug.Info(__name__).display
@@ -509,6 +555,10 @@ class ImagePsfMatchTask(PsfMatchTask):
             self.log.error("ERROR: Input images different size")
             raise RuntimeError("Input images different size")
 
+        if matchedMaskedImage is not None and matchedMaskedImage.getBBox() != templateMaskedImage.getBBox():
+            raise ValueError("Output image bounding box %s differs from input %s" %
+                               (matchedMaskedImage.getBBox(), templateMaskedImage.getBBox()))
+
         if display and displayTemplate:
             disp = afwDisplay.Display(frame=lsstDebug.frame)
             disp.mtv(templateMaskedImage, title="Image to convolve")
@@ -548,9 +598,12 @@ class ImagePsfMatchTask(PsfMatchTask):
 
         spatialSolution, psfMatchingKernel, backgroundModel = self._solve(kernelCellSet, basisList)
 
-        psfMatchedMaskedImage = afwImage.MaskedImageF(templateMaskedImage.getBBox())
-        doNormalize = False
-        afwMath.convolve(psfMatchedMaskedImage, templateMaskedImage, psfMatchingKernel, doNormalize)
+        psfMatchedMaskedImage = None
+        if doConvolve:
+            psfMatchedMaskedImage = matchedMaskedImage
+            if psfMatchedMaskedImage is None:
+                psfMatchedMaskedImage = afwImage.MaskedImageF(templateMaskedImage.getBBox())
+            self._convolve(psfMatchedMaskedImage, templateMaskedImage, psfMatchingKernel)
         return pipeBase.Struct(
             matchedImage=psfMatchedMaskedImage,
             psfMatchingKernel=psfMatchingKernel,
@@ -561,7 +614,8 @@ class ImagePsfMatchTask(PsfMatchTask):
     @pipeBase.timeMethod
     def subtractExposures(self, templateExposure, scienceExposure,
                           templateFwhmPix=None, scienceFwhmPix=None,
-                          candidateList=None, doWarping=True, convolveTemplate=True):
+                          candidateList=None, doWarping=True, convolveTemplate=True,
+                          subtractedExposure=None, matchedExposure=None, inPlace=False):
         """Register, Psf-match and subtract two Exposures.
 
         Do the following, in order:
@@ -603,6 +657,22 @@ class ImagePsfMatchTask(PsfMatchTask):
             - if `False`, ``templateExposure`` is warped if doWarping,
               ``scienceExposure is`` convolved
 
+        subtractedExposure : `lsst.afw.image.ExposureF`, optional
+            Exposure with the bounding box of ``scienceExposure`` into which
+            to write the difference, rather than allocating a new one.  Its
+            pixels are overwritten and its `lsst.afw.image.ExposureInfo` is
+            copied from ``scienceExposure``.
+        matchedExposure : `lsst.afw.image.ExposureF`, optional
+            Exposure into which to write the PSF-matched image; see
+            `matchExposures`.  Not allowed with a positive
+            ``config.maxBandMemory``, where no matched image is made.
+        inPlace : `bool`, optional
+            Write the difference into ``scienceExposure`` itself, for callers
+            that no longer need the science pixels.  Not allowed together
+            with ``subtractedExposure``, nor with ``convolveTemplate=False``
+            and a positive ``config.maxBandMemory``, where the science image
+            is read band by band while the difference is written.
+
         Returns
         -------
         result : `lsst.pipe.base.Struct`
@@ -612,11 +682,40 @@ class ImagePsfMatchTask(PsfMatchTask):
                 scienceExposure - (matchedImage + backgroundModel)
             - ``matchedImage`` : ``templateExposure`` after warping to match
                                  ``templateExposure`` (if doWarping true),
-                                 and convolving with psfMatchingKernel
+                                 and convolving with psfMatchingKernel;
+                                 `None` if ``config.maxBandMemory`` is positive
             - ``psfMatchingKernel`` : PSF matching kernel
             - ``backgroundModel`` : differential background model
             - ``kernelCellSet`` : SpatialCellSet used to determine PSF matching kernel
+
+        Raises
+        ------
+        ValueError
+            Raised if ``matchedExposure`` is given with a positive
+            ``config.maxBandMemory``.
+        ValueError
+            Raised if ``inPlace`` is set and ``subtractedExposure`` is given.
+        ValueError
+            Raised if ``inPlace`` is set with ``convolveTemplate=False`` and a
+            positive ``config.maxBandMemory``.
+        ValueError
+            Raised if ``subtractedExposure`` does not have the bounding box
+            of ``scienceExposure``, or ``matchedExposure`` that of the image
+            to convolve.
         """
+        doBands = self.config.maxBandMemory > 0
+        # Invalid combinations of output arguments are caller errors, all ValueError
+        if doBands and matchedExposure is not None:
+            raise ValueError("Cannot write a matchedExposure when subtracting in bands "
+                             "(config.maxBandMemory > 0)")
+        if inPlace and subtractedExposure is not None:
+            raise ValueError("Cannot both subtract in place and into subtractedExposure")
+        if inPlace and doBands and not convolveTemplate:
+            raise ValueError("Cannot subtract in place into the science image while convolving it in bands")
+        if subtractedExposure is not None and subtractedExposure.getBBox() != scienceExposure.getBBox():
+            raise ValueError("Output exposure bounding box %s differs from science exposure %s" %
+                               (subtractedExposure.getBBox(), scienceExposure.getBBox()))
+
         results = self.matchExposures(
             templateExposure=templateExposure,
             scienceExposure=scienceExposure,
@@ -624,20 +723,38 @@ class ImagePsfMatchTask(PsfMatchTask):
             scienceFwhmPix=scienceFwhmPix,
             candidateList=candidateList,
             doWarping=doWarping,
-            convolveTemplate=convolveTemplate
+            convolveTemplate=convolveTemplate,
+            doConvolve=not doBands,
+            matchedExposure=matchedExposure,
         )
 
-        subtractedExposure = afwImage.ExposureF(scienceExposure, True)
+        newExposure = subtractedExposure is None and not inPlace
+        if inPlace:
+            subtractedExposure = scienceExposure
+        elif newExposure:
+            subtractedExposure = afwImage.ExposureF(scienceExposure, True)
+        else:
+            self._copyExposureInfo(subtractedExposure, scienceExposure)
+            if convolveTemplate:
+                subtractedExposure.getMaskedImage().assign(scienceExposure.getMaskedImage())
+
         if convolveTemplate:
-            subtractedMaskedImage = subtractedExposure.getMaskedImage()
-            subtractedMaskedImage -= results.matchedExposure.getMaskedImage()
-            subtractedMaskedImage -= results.backgroundModel
+            convolvedMaskedImage = results.warpedExposure.getMaskedImage()
+        else:
+            if newExposure:
+                subtractedExposure.setMaskedImage(results.warpedExposure.getMaskedImage())
+            else:
+                subtractedExposure.getMaskedImage().assign(results.warpedExposure.getMaskedImage())
+            convolvedMaskedImage = scienceExposure.getMaskedImage()
+        subtractedMaskedImage = subtractedExposure.getMaskedImage()
+        if doBands:
+            self._subtractInBands(subtractedMaskedImage, convolvedMaskedImage,
+                                  results.psfMatchingKernel, results.backgroundModel)
         else:
-            subtractedExposure.setMaskedImage(results.warpedExposure.getMaskedImage())
-            subtractedMaskedImage = subtractedExposure.getMaskedImage()
             subtractedMaskedImage -= results.matchedExposure.getMaskedImage()
             subtractedMaskedImage -= results.backgroundModel
 
+        if not convolveTemplate:
             # Preserve polarity of differences
             subtractedMaskedImage *= -1
 
@@ -657,9 +774,10 @@ class ImagePsfMatchTask(PsfMatchTask):
             disp = afwDisplay.Display(frame=lsstDebug.frame)
             disp.mtv(templateExposure, title="Template")
             lsstDebug.frame += 1
-            disp = afwDisplay.Display(frame=lsstDebug.frame)
-            disp.mtv(results.matchedExposure, title="Matched template")
-            lsstDebug.frame += 1
+            if results.matchedExposure is not None:
+                disp = afwDisplay.Display(frame=lsstDebug.frame)
+                disp.mtv(results.matchedExposure, title="Matched template")
+                lsstDebug.frame += 1
             disp = afwDisplay.Display(frame=lsstDebug.frame)
             disp.mtv(scienceExposure, title="Science Image")
             lsstDebug.frame += 1
@@ -741,6 +859,87 @@ class ImagePsfMatchTask(PsfMatchTask):
 
         return results
 
+    @staticmethod
+    def _copyExposureInfo(outExposure, exposure):
+        """Copy the `lsst.afw.image.ExposureInfo` of an Exposure, with a
+        deep copy of its metadata, to another.
+        """
+        outExposure.setInfo(afwImage.ExposureInfo(exposure.getInfo(), True))
+
+    def _convolve(self, outMaskedImage, inMaskedImage, kernel):
+        """Convolve a MaskedImage by the PSF matching kernel, without
+        normalizing, as set by ``convolutionMode``.
+        """
+        if self.kConfig.convolutionMode == "basis":
+            convolveSpatialBasis(outMaskedImage, inMaskedImage, kernel, nThreads=self.kConfig.nThreads)
+        else:
+            doNormalize = False
+            afwMath.convolve(outMaskedImage, inMaskedImage, kernel, doNormalize)
+
+    def _getBandHeight(self, width, kernel):
+        """Return the number of rows per band that keeps the working memory
+        of `_subtractInBands` within ``config.maxBandMemory``.
+        """
+        # An afw MaskedImageF has 4 byte image, mask and variance pixels; the
+        # basis convolution also holds float64 coefficient, input, output and
+        # per-thread partial images, and their padded transforms
+        bytesPerPixel = 12
+        if self.kConfig.convolutionMode == "basis":
+            bytesPerPixel += 8*(kernel.getNKernelParameters() + 2*self.kConfig.nThreads + 8)
+        halo = kernel.getHeight() - 1
+        bandHeight = int(self.config.maxBandMemory*2**20 // (bytesPerPixel*width)) - halo
+        if bandHeight < 1:
+            self.log.warn("maxBandMemory of %.1f MB is too small for a kernel halo of %d rows; "
+                          "using bands of one row", self.config.maxBandMemory, halo)
+            bandHeight = 1
+        return bandHeight
+
+    def _subtractInBands(self, differenceMaskedImage, maskedImage, kernel, backgroundModel):
+        """Subtract a MaskedImage convolved by a kernel, and a background
+        model, from a MaskedImage in place, one horizontal band at a time.
+
+        Parameters
+        ----------
+        differenceMaskedImage : `lsst.afw.image.MaskedImage`
+            Image to subtract from.
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Image to convolve; must have the bounding box of
+            ``differenceMaskedImage``.
+        kernel : `lsst.afw.math.Kernel`
+            PSF matching kernel.
+        backgroundModel : `lsst.afw.math.Function2D`
+            Differential background model.
+
+        Notes
+        -----
+        Each band is convolved from a view of ``maskedImage`` grown by the
+        kernel halo, so away from the image edges the result matches
+        convolving the whole image; only the bands are ever copied.  With
+        ``convolutionMode="afw"`` the kernel interpolation grid differs from
+        band to band, which changes the result by up to the afw
+        interpolation tolerance.
+        """
+        bbox = differenceMaskedImage.getBBox()
+        bandHeight = self._getBandHeight(bbox.getWidth(), kernel)
+        ctrY = kernel.getCtr().getY()
+        halo = kernel.getHeight() - 1
+        nBands = 0
+        for y0 in range(bbox.getBeginY(), bbox.getEndY(), bandHeight):
+            height = min(bandHeight, bbox.getEndY() - y0)
+            bandBBox = afwGeom.Box2I(afwGeom.Point2I(bbox.getBeginX(), y0),
+                                     afwGeom.Extent2I(bbox.getWidth(), height))
+            inBBox = afwGeom.Box2I(afwGeom.Point2I(bbox.getBeginX(), y0 - ctrY),
+                                   afwGeom.Extent2I(bbox.getWidth(), height + halo))
+            inBBox.clip(bbox)
+
+            convolved = afwImage.MaskedImageF(inBBox)
+            self._convolve(convolved, maskedImage.Factory(maskedImage, inBBox), kernel)
+            band = differenceMaskedImage.Factory(differenceMaskedImage, bandBBox)
+            band -= convolved.Factory(convolved, bandBBox)
+            band -= backgroundModel
+            nBands += 1
+        self.log.debug("Convolved and subtracted in %d bands of %d rows", nBands, bandHeight)
+
     def getSelectSources(self, exposure, sigma=None, doSmooth=True, idFactory=None):
         """Get sources to use for Psf-matching.
 
@@ -65,6 +65,22 @@ void declareConvolveAndSubtract(py::module &mod) {
                     convolveAndSubtract,
             "templateImage"_a, "scienceMaskedImage"_a, "convolutionKernel"_a, "background"_a,
             "invert"_a = true);
+
+    mod.def("convolveAndSubtract",
+            (void (*)(afw::image::MaskedImage<PixelT> &, afw::image::MaskedImage<PixelT> const &,
+                      afw::image::MaskedImage<PixelT> const &, afw::math::Kernel const &, BackgroundT,
+                      bool)) &
+                    convolveAndSubtract,
+            "differenceImage"_a, "templateImage"_a, "scienceMaskedImage"_a, "convolutionKernel"_a,
+            "background"_a, "invert"_a = true);
+
+    mod.def("convolveAndSubtract",
+            (void (*)(afw::image::MaskedImage<PixelT> &, afw::image::Image<PixelT> const &,
+                      afw::image::MaskedImage<PixelT> const &, afw::math::Kernel const &, BackgroundT,
+                      bool)) &
+                    convolveAndSubtract,
+            "differenceImage"_a, "templateImage"_a, "scienceMaskedImage"_a, "convolutionKernel"_a,
+            "background"_a, "invert"_a = true);
 }
 
 }  // namespace lsst::ip::diffim::<anonymous>
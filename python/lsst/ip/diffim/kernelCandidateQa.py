@@ -195,10 +195,26 @@ class KernelCandidateQa(object):
                 "D": D, "prob": prob, "A2": A2, "crit": crit, "sig": sig,
                 "rchisq": rchisq, "mseResids": mseResids}
 
-    def apply(self, candidateList, spatialKernel, spatialBackground, dof=0):
+    def apply(self, candidateList, spatialKernel, spatialBackground, dof=0, kernelImageCache=None):
         """Evaluate the QA metrics for all KernelCandidates in the
         candidateList; set the values of the metrics in their
-        associated Sources"""
+        associated Sources
+
+        Parameters
+        ----------
+        candidateList : `list` of `lsst.ip.diffim.KernelCandidateF`
+            Candidates to assess
+        spatialKernel : `lsst.afw.math.LinearCombinationKernel`
+            Spatial model of the Psf-matching kernel
+        spatialBackground : `lsst.afw.math.Function2D`
+            Spatial model of the differential background
+        dof : `int`, optional
+            Degrees of freedom used in the reduced chi^2
+        kernelImageCache : `lsst.ip.diffim.SpatialKernelImageCache`, optional
+            If set, take the spatial model images from this cache of
+            ``spatialKernel`` instead of computing them at each candidate
+        """
+        kernelImageSource = spatialKernel if kernelImageCache is None else kernelImageCache
         for kernelCandidate in candidateList:
             source = kernelCandidate.getSource()
             schema = source.schema
@@ -249,8 +265,8 @@ class KernelCandidateQa(object):
             # Calculate spatial model evaluated at each position, for
             # all candidates
             skim = afwImage.ImageD(spatialKernel.getDimensions())
-            spatialKernel.computeImage(skim, False, kernelCandidate.getXCenter(),
-                                       kernelCandidate.getYCenter())
+            kernelImageSource.computeImage(skim, False, kernelCandidate.getXCenter(),
+                                           kernelCandidate.getYCenter())
             centx, centy = calcCentroid(skim.getArray())
             stdx, stdy = calcWidth(skim.getArray(), centx, centy)
 
@@ -60,6 +60,7 @@ void declareKernelSolution(py::module &mod) {
     py::enum_<KernelSolution::ConditionNumberType>(cls, "ConditionNumberType")
             .value("EIGENVALUE", KernelSolution::ConditionNumberType::EIGENVALUE)
             .value("SVD", KernelSolution::ConditionNumberType::SVD)
+            .value("ESTIMATE", KernelSolution::ConditionNumberType::ESTIMATE)
             .export_values();
 
     cls.def("solve", (void (KernelSolution::*)()) & KernelSolution::solve);
@@ -67,6 +68,9 @@ void declareKernelSolution(py::module &mod) {
                              KernelSolution::solve,
             "mMat"_a, "bVec"_a);
     cls.def("getSolvedBy", &KernelSolution::getSolvedBy);
+    cls.def("setSolveMethod", &KernelSolution::setSolveMethod, "solveMethod"_a);
+    cls.def("getSolveMethod", &KernelSolution::getSolveMethod);
+    cls.def_static("parseSolveMethod", &KernelSolution::parseSolveMethod, "solveMethod"_a);
     cls.def("getConditionNumber", (double (KernelSolution::*)(KernelSolution::ConditionNumberType)) &
                                           KernelSolution::getConditionNumber,
             "conditionType"_a);
@@ -104,6 +108,8 @@ void declareStaticKernelSolution(py::module &mod, std::string const &suffix) {
     cls.def("getBackground", &StaticKernelSolution<InputT>::getBackground);
     cls.def("getKsum", &StaticKernelSolution<InputT>::getKsum);
     cls.def("getSolutionPair", &StaticKernelSolution<InputT>::getSolutionPair);
+    cls.def("setStoreDesignMatrix", &StaticKernelSolution<InputT>::setStoreDesignMatrix, "storeDesignMatrix"_a);
+    cls.def("getStoreDesignMatrix", &StaticKernelSolution<InputT>::getStoreDesignMatrix);
 }
 
 /**
@@ -167,6 +173,8 @@ void declareSpatialKernelSolution(py::module &mod) {
     cls.def("solve", (void (SpatialKernelSolution::*)()) & SpatialKernelSolution::solve);
     cls.def("addConstraint", &SpatialKernelSolution::addConstraint, "xCenter"_a, "yCenter"_a, "qMat"_a,
             "wVec"_a);
+    cls.def("removeConstraint", &SpatialKernelSolution::removeConstraint, "xCenter"_a, "yCenter"_a, "qMat"_a,
+            "wVec"_a);
     cls.def("makeKernelImage", &SpatialKernelSolution::makeKernelImage, "pos"_a);
     cls.def("getSolutionPair", &SpatialKernelSolution::getSolutionPair);
 }
@@ -327,11 +327,13 @@ class PsfMatchConfig(pexConfig.Config):
     )
     conditionNumberType = pexConfig.ChoiceField(
         dtype=str,
-        doc="Use singular values (SVD) or eigen values (EIGENVALUE) to determine condition number",
+        doc="""Use singular values (SVD), eigen values (EIGENVALUE) or an estimate from the
+                 solver's factorization (ESTIMATE) to determine condition number""",
         default="EIGENVALUE",
         allowed={
             "SVD": "Use singular values",
             "EIGENVALUE": "Use eigen values (faster)",
+            "ESTIMATE": "Use the 1-norm estimate from the solve; checked after solving (fastest)",
         }
     )
     maxSpatialConditionNumber = pexConfig.Field(
@@ -340,6 +342,18 @@ class PsfMatchConfig(pexConfig.Config):
         default=1.0e10,
         check=lambda x: x >= 0.0
     )
+    solveMethod = pexConfig.ChoiceField(
+        dtype=str,
+        doc="""First method used to solve the kernel and spatial kernel normal equations.
+                 If it fails the later methods are tried in the order listed.""",
+        default="CHOLESKY_LLT",
+        allowed={
+            "CHOLESKY_LLT": "Cholesky decomposition (fastest)",
+            "CHOLESKY_LDLT": "Robust Cholesky decomposition with pivoting",
+            "LU": "LU decomposition with full pivoting",
+            "EIGENVECTOR": "Pseudo-inverse from the eigen decomposition (slowest)",
+        }
+    )
     iterateSingleKernel = pexConfig.Field(
         dtype=bool,
         doc="""Remake KernelCandidate using better variance estimate after first pass?
@@ -352,6 +366,33 @@ class PsfMatchConfig(pexConfig.Config):
                  In some cases this is better for bright star residuals.""",
         default=True,
     )
+    nThreads = pexConfig.Field(
+        dtype=int,
+        doc="""Number of threads used to build, assess and Pca the kernel candidates.
+                 Candidates are processed in parallel after each visit of the cells.""",
+        default=1,
+        check=lambda x: x >= 1
+    )
+    convolutionMode = pexConfig.ChoiceField(
+        dtype=str,
+        doc="How to convolve with the spatially varying Psf-matching kernel",
+        default="afw",
+        allowed={
+            "afw": "Use lsst.afw.math.convolve, interpolating the kernel between grid points",
+            "basis": """Convolve once per basis kernel and combine the results with per-pixel
+                      spatial coefficients; exact, and uses nThreads threads.  The variance
+                      needs a convolution per pair of bases, so this is intended for
+                      PCA-sized bases (usePcaForSpatialKernel)""",
+        }
+    )
+    storeDesignMatrix = pexConfig.Field(
+        dtype=bool,
+        doc="""Keep the full design matrix of each KernelCandidate after building it?
+                 If False, the normal equations are accumulated over blocks of pixels and
+                 only they are kept, which greatly reduces memory use.
+                 Regularized solutions always keep the design matrix.""",
+        default=False,
+    )
     calculateKernelUncertainty = pexConfig.Field(
         dtype=bool,
         doc="""Calculate kernel and background uncertainties for each kernel candidate?
@@ -823,7 +864,9 @@ class PsfMatchTask(pipeBase.Task):
         nComponents = self.kConfig.numPrincipalComponents
         imagePca = diffimLib.KernelPcaD()
         importStarVisitor = diffimLib.KernelPcaVisitorF(imagePca)
+        importStarVisitor.setNThreads(self.kConfig.nThreads)
         kernelCellSet.visitCandidates(importStarVisitor, nStarPerCell)
+        importStarVisitor.processQueuedCandidates()
         if self.kConfig.subtractMeanForPca:
             importStarVisitor.subtractMean()
         imagePca.analyze()
@@ -853,7 +896,9 @@ class PsfMatchTask(pipeBase.Task):
         # New Kernel visitor for this new basis list (no regularization explicitly)
         singlekvPca = diffimLib.BuildSingleKernelVisitorF(spatialBasisList, policy)
         singlekvPca.setSkipBuilt(False)
+        singlekvPca.setNThreads(self.kConfig.nThreads)
         kernelCellSet.visitCandidates(singlekvPca, nStarPerCell)
+        singlekvPca.processQueuedCandidates()
         singlekvPca.setSkipBuilt(True)
         nRejectedPca = singlekvPca.getNRejected()
 
@@ -905,10 +950,14 @@ class PsfMatchTask(pipeBase.Task):
             singlekv = diffimLib.BuildSingleKernelVisitorF(basisList, policy, self.hMat)
         else:
             singlekv = diffimLib.BuildSingleKernelVisitorF(basisList, policy)
+        singlekv.setNThreads(self.kConfig.nThreads)
 
         # Visitor for the kernel sum rejection
         ksv = diffimLib.KernelSumVisitorF(policy)
 
+        # Visitor for the spatial kernel fit
+        spatialkv = None
+
         # Main loop
         t0 = time.time()
         try:
@@ -922,6 +971,7 @@ class PsfMatchTask(pipeBase.Task):
                     log.log("TRACE1." + self.log.getName() + "._solve", log.DEBUG,
                             "Building single kernels...")
                     kernelCellSet.visitCandidates(singlekv, nStarPerCell)
+                    singlekv.processQueuedCandidates()
                     nRejectedSkf = singlekv.getNRejected()
                     log.log("TRACE1." + self.log.getName() + "._solve", log.DEBUG,
                             "Iteration %d, rejected %d candidates due to initial kernel fit",
@@ -975,8 +1025,11 @@ class PsfMatchTask(pipeBase.Task):
                     spatialBasisList = basisList
 
                 # We have gotten on to the spatial modeling part
+                # With a fixed basis the visitor keeps its normal equations
+                # between iterations and only updates the rejected candidates
                 regionBBox = kernelCellSet.getBBox()
-                spatialkv = diffimLib.BuildSpatialKernelVisitorF(spatialBasisList, regionBBox, policy)
+                if spatialkv is None or usePcaForSpatialKernel:
+                    spatialkv = diffimLib.BuildSpatialKernelVisitorF(spatialBasisList, regionBBox, policy)
                 kernelCellSet.visitCandidates(spatialkv, nStarPerCell)
                 spatialkv.solveLinearEquation()
                 log.log("TRACE2." + self.log.getName() + "._solve", log.DEBUG,
@@ -985,7 +1038,9 @@ class PsfMatchTask(pipeBase.Task):
 
                 # Check the quality of the spatial fit (look at residuals)
                 assesskv = diffimLib.AssessSpatialKernelVisitorF(spatialKernel, spatialBackground, policy)
+                assesskv.setNThreads(self.kConfig.nThreads)
                 kernelCellSet.visitCandidates(assesskv, nStarPerCell)
+                assesskv.processQueuedCandidates()
                 nRejectedSpatial = assesskv.getNRejected()
                 nGoodSpatial = assesskv.getNGood()
                 log.log("TRACE1." + self.log.getName() + "._solve", log.DEBUG,
@@ -1011,7 +1066,8 @@ class PsfMatchTask(pipeBase.Task):
                 if (usePcaForSpatialKernel):
                     nRejectedPca, spatialBasisList = self._createPcaBasis(kernelCellSet, nStarPerCell, policy)
                 regionBBox = kernelCellSet.getBBox()
-                spatialkv = diffimLib.BuildSpatialKernelVisitorF(spatialBasisList, regionBBox, policy)
+                if spatialkv is None or usePcaForSpatialKernel:
+                    spatialkv = diffimLib.BuildSpatialKernelVisitorF(spatialBasisList, regionBBox, policy)
                 kernelCellSet.visitCandidates(spatialkv, nStarPerCell)
                 spatialkv.solveLinearEquation()
                 log.log("TRACE2." + self.log.getName() + "._solve", log.DEBUG,
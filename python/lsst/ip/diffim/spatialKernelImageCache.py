@@ -0,0 +1,182 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+
+import numpy as np
+
+import lsst.afw.image as afwImage
+
+__all__ = ["SpatialKernelImageCache"]
+
+
+class SpatialKernelImageCache(object):
+    """Images of a spatially varying kernel precomputed on a grid of positions.
+
+    Evaluating a spatially varying `lsst.afw.math.LinearCombinationKernel`
+    re-evaluates every spatial function and re-sums every basis image.  This
+    cache does that once per node of a regular grid covering ``bbox`` and
+    answers later queries by exact lookup at the nodes, or by bilinear
+    interpolation between the four surrounding nodes elsewhere.
+
+    Parameters
+    ----------
+    kernel : `lsst.afw.math.Kernel`
+        The (spatially varying) kernel to cache.
+    bbox : `lsst.afw.geom.Box2I`
+        Region over which the kernel will be evaluated, e.g. the bounding box
+        of the `lsst.afw.math.SpatialCellSet` used to fit it.  Queries outside
+        it are clamped to its edges.
+    nGridX, nGridY : `int`, optional
+        Number of grid nodes along x and y, including both edges; at most
+        the width and height of ``bbox``.
+
+    Notes
+    -----
+    The cache has the ``getDimensions`` and ``computeImage`` methods of a
+    kernel, so it may be passed in place of the kernel to code that only
+    computes kernel images, e.g. `DecorrelateALKernelTask.run`.
+    """
+
+    def __init__(self, kernel, bbox, nGridX=10, nGridY=10):
+        if nGridX < 1 or nGridY < 1:
+            raise ValueError("Need at least one grid node along each axis, not %d x %d" %
+                             (nGridX, nGridY))
+        if not kernel.isSpatiallyVarying():
+            nGridX = nGridY = 1
+        # Nodes closer than a pixel apart would collapse onto each other
+        nGridX = min(nGridX, bbox.getWidth())
+        nGridY = min(nGridY, bbox.getHeight())
+        self.kernel = kernel
+        self.bbox = bbox
+        self.xGrid = np.linspace(bbox.getMinX(), bbox.getMaxX(), nGridX)
+        self.yGrid = np.linspace(bbox.getMinY(), bbox.getMaxY(), nGridY)
+
+        self._kimage = afwImage.ImageD(kernel.getDimensions())
+        self.images = np.empty((nGridY, nGridX) + self._kimage.getArray().shape)
+        for j, y in enumerate(self.yGrid):
+            for i, x in enumerate(self.xGrid):
+                self.images[j, i] = self._computeExact(x, y)
+        self._errorBound = None
+
+    def _computeExact(self, x, y):
+        self.kernel.computeImage(self._kimage, False, x, y)
+        return self._kimage.getArray().copy()
+
+    @staticmethod
+    def _locate(grid, value):
+        """Return the index of the grid node below ``value`` and the fractional
+        distance to the next node.
+        """
+        if len(grid) == 1:
+            return 0, 0.
+        value = min(max(value, grid[0]), grid[-1])
+        step = (grid[-1] - grid[0]) / (len(grid) - 1)
+        index = min(int((value - grid[0]) // step), len(grid) - 2)
+        frac = (value - grid[index]) / step
+        # Snap to the nodes so they are returned exactly
+        if np.isclose(frac, 0.):
+            frac = 0.
+        elif np.isclose(frac, 1.):
+            index, frac = index + 1, 0.
+        return index, frac
+
+    def getDimensions(self):
+        """Return the dimensions of the kernel images.
+        """
+        return self.kernel.getDimensions()
+
+    def getKernel(self):
+        """Return the cached kernel.
+        """
+        return self.kernel
+
+    def computeArray(self, x, y):
+        """Return the kernel image at a position as an array.
+
+        Parameters
+        ----------
+        x, y : `float`
+            Position at which to evaluate the kernel.
+
+        Returns
+        -------
+        array : `numpy.ndarray`
+            The kernel image; exact at the grid nodes, bilinearly interpolated
+            between them.
+        """
+        i, tx = self._locate(self.xGrid, x)
+        j, ty = self._locate(self.yGrid, y)
+        if tx == 0. and ty == 0.:
+            return self.images[j, i].copy()
+        # Nodes past the last one are only ever given zero weight
+        i1 = min(i + 1, len(self.xGrid) - 1)
+        j1 = min(j + 1, len(self.yGrid) - 1)
+        return ((1. - ty) * ((1. - tx) * self.images[j, i] + tx * self.images[j, i1]) +
+                ty * ((1. - tx) * self.images[j1, i] + tx * self.images[j1, i1]))
+
+    def computeImage(self, image, doNormalize, x=0.0, y=0.0):
+        """Compute the kernel image at a position, like
+        `lsst.afw.math.Kernel.computeImage`.
+
+        Parameters
+        ----------
+        image : `lsst.afw.image.ImageD`
+            Image to fill; must have the kernel dimensions.
+        doNormalize : `bool`
+            Normalize the image to sum to one?
+        x, y : `float`, optional
+            Position at which to evaluate the kernel.
+
+        Returns
+        -------
+        kSum : `float`
+            Sum of the kernel image before any normalization.
+        """
+        array = self.computeArray(x, y)
+        kSum = array.sum()
+        if doNormalize:
+            array /= kSum
+        image.getArray()[:, :] = array
+        return kSum
+
+    def getErrorBound(self):
+        """Return the estimated largest interpolation error of any pixel.
+
+        Returns
+        -------
+        errorBound : `float`
+            Largest absolute difference between the interpolated and the
+            directly computed kernel images, over the centers of the grid
+            cells and the midpoints of their edges.  This is where the error
+            of bilinear interpolation peaks when the spatial model is at most
+            quadratic.  It is computed on the first call.
+        """
+        if self._errorBound is None:
+            xTest = np.unique(np.concatenate((self.xGrid, 0.5 * (self.xGrid[1:] + self.xGrid[:-1]))))
+            yTest = np.unique(np.concatenate((self.yGrid, 0.5 * (self.yGrid[1:] + self.yGrid[:-1]))))
+            errorBound = 0.
+            for y in yTest:
+                for x in xTest:
+                    if x in self.xGrid and y in self.yGrid:
+                        continue
+                    error = np.abs(self.computeArray(x, y) - self._computeExact(x, y)).max()
+                    errorBound = max(errorBound, error)
+            self._errorBound = errorBound
+        return self._errorBound
@@ -20,6 +20,8 @@
 # see <https://www.lsstcorp.org/LegalNotices/>.
 #
 
+import collections
+
 import numpy as np
 
 import lsst.afw.image as afwImage
@@ -33,9 +35,10 @@ from .imageMapReduce import (ImageMapReduceConfig, ImageMapper,
                              ImageMapReduceTask)
 from .imagePsfMatch import (ImagePsfMatchTask, ImagePsfMatchConfig,
                             subtractAlgorithmRegistry)
+from .fftConvolution import convolveImage, convolveLowRank, lowRankTerms, FftBackend, goodFftSize
 
 __all__ = ["ZogyTask", "ZogyConfig",
-           "ZogyMapper", "ZogyMapReduceConfig",
+           "ZogyMapper", "ZogyMapperConfig", "ZogyMapReduceConfig",
            "ZogyImagePsfMatchConfig", "ZogyImagePsfMatchTask"]
 
 
@@ -117,10 +120,105 @@ class ZogyConfig(pexConfig.Config):
         doc="Mask planes to ignore for statistics"
     )
 
+    padToFastFftSize = pexConfig.Field(
+        dtype=bool,
+        default=False,
+        doc="Pad images to sizes with no prime factor above 5 for Fourier-space ZOGY. "
+        "Much faster for awkward image sizes, but the result differs from the unpadded one: "
+        "the transforms wrap around the padding rather than the image, and the PSF floor "
+        "(MIN_KERNEL) covers the whole padded array."
+    )
+
+    fftConvolveMinSize = pexConfig.Field(
+        dtype=int,
+        default=15,
+        doc="Convolve by overlap-add FFTs, rather than with afw.math.convolve, when the kernel has "
+        "at least this many pixels along either side (when inImageSpace is True). "
+        "Non-positive to always convolve in direct space."
+    )
+
+    fftBackend = pexConfig.ChoiceField(
+        dtype=str,
+        default="numpy",
+        doc="Library computing the FFTs",
+        allowed={
+            "numpy": "numpy.fft, single-threaded",
+            "scipy": "scipy.fft, multi-threaded with fftThreads threads",
+        }
+    )
+
+    fftThreads = pexConfig.Field(
+        dtype=int,
+        default=1,
+        doc="Number of threads for each FFT with the scipy fftBackend; -1 for one per CPU"
+    )
+
+    precision = pexConfig.ChoiceField(
+        dtype=str,
+        default="float64",
+        doc="Floating-point precision of the Fourier-space ZOGY diffim and Scorr calculations",
+        allowed={
+            "float64": "double precision, complex128 transforms",
+            "float32": "single precision, complex64 transforms; halves the memory of the "
+            "image-sized arrays at the cost of ~1e-6 relative rounding errors. Requires an "
+            "fftBackend that keeps single precision: scipy, or numpy from version 2.0",
+        }
+    )
+
+    kernelEnergyFraction = pexConfig.Field(
+        dtype=float,
+        default=1.,
+        doc="Approximate the image-space ZOGY kernels by keeping this fraction of their squared "
+        "sum: the square root of it when truncating them to the smallest centered box holding it "
+        "and again when splitting them into separable terms if kernelMaxRank > 0, or all of it "
+        "in the truncation otherwise; 1 to keep them whole (when inImageSpace is True).",
+        check=lambda x: 0. < x <= 1.
+    )
+
+    kernelMaxRank = pexConfig.Field(
+        dtype=int,
+        default=0,
+        doc="Convolve with each image-space ZOGY kernel as a sum of separable terms, if at most "
+        "this many hold the square root of kernelEnergyFraction of its (truncated) squared sum; "
+        "0 to always convolve with the full kernels (when inImageSpace is True).",
+        check=lambda x: x >= 0
+    )
+
 
 MIN_KERNEL = 1.0e-4
 
 
+def _truncateKernel(kernel, energyFraction):
+    """Return the smallest box of ``kernel`` around its center pixel holding
+    ``energyFraction`` of its squared sum, or ``kernel`` itself if no box
+    smaller than it does.
+
+    The box has odd dimensions, so its center pixel, as chosen by
+    `lsst.afw.math.FixedKernel`, is that of ``kernel``.
+    """
+    if energyFraction >= 1.:
+        return kernel
+    ctrY, ctrX = (kernel.shape[0] - 1)//2, (kernel.shape[1] - 1)//2
+    energy = kernel**2
+    target = energyFraction*energy.sum()
+    for half in range(min(ctrY, ctrX, kernel.shape[0] - 1 - ctrY, kernel.shape[1] - 1 - ctrX) + 1):
+        box = (slice(ctrY - half, ctrY + half + 1), slice(ctrX - half, ctrX + half + 1))
+        if energy[box].sum() >= target:
+            return kernel[box].copy()
+    return kernel
+
+
+def _splitEnergyFraction(config):
+    """Return the fractions of the image-space kernel energy kept by their
+    truncation and by their separable approximation, whose product is
+    ``config.kernelEnergyFraction``.
+    """
+    if config.kernelMaxRank > 0:
+        fraction = np.sqrt(config.kernelEnergyFraction)
+        return fraction, fraction
+    return config.kernelEnergyFraction, 1.
+
+
 class ZogyTask(pipeBase.Task):
     """Task to perform ZOGY proper image subtraction. See module-level documentation for
     additional details.
@@ -159,9 +257,27 @@ class ZogyTask(pipeBase.Task):
         **kwargs
             additional keyword arguments to be passed to
             `lsst.pipe.base.Task`
+
+        Raises
+        ------
+        ValueError
+            If `precision` is "float32" but the configured `fftBackend`
+            returns double-precision transforms of single-precision input.
         """
         pipeBase.Task.__init__(self, *args, **kwargs)
         self.template = self.science = None
+        self._fourierPrereqs = None
+        self._imageSpaceKernels = None
+        self._psfCache = self._psfCacheKey = None
+        self._psfCacheOwners = ()
+        self._psfCacheSigmaPrecision = 0.
+        self._fft = FftBackend(self.config.fftBackend, self.config.fftThreads)
+        if self.config.precision == "float32" and not self._fft.keepsSinglePrecision:
+            # Upcast transforms would hold more memory than the float64 path
+            raise ValueError("precision='float32' requires an FFT backend that keeps single precision; "
+                             "the %r backend returns double-precision transforms" % self.config.fftBackend)
+        self._floatType = np.float32 if self.config.precision == "float32" else np.float64
+        self._complexType = np.result_type(self._floatType, np.complex64)
         self.setup(templateExposure=templateExposure, scienceExposure=scienceExposure,
                    sig1=sig1, sig2=sig2, psf1=psf1, psf2=psf2, *args, **kwargs)
 
@@ -303,7 +419,7 @@ class ZogyTask(pipeBase.Task):
         return var
 
     @staticmethod
-    def _padPsfToSize(psf, size):
+    def _padPsfToSize(psf, size, dtype=float):
         """Zero-pad `psf` to the dimensions given by `size`.
 
         Parameters
@@ -312,19 +428,21 @@ class ZogyTask(pipeBase.Task):
             Input psf to be padded
         size : `list`
             Two element list containing the dimensions to pad the `psf` to
+        dtype : `numpy.dtype`, optional
+            Type of the padded array.
 
         Returns
         -------
         psf : 2D `numpy.array`
             The padded copy of the input `psf`.
         """
-        newArr = np.zeros(size)
+        newArr = np.zeros(size, dtype=dtype)
         offset = [size[0]//2 - psf.shape[0]//2 - 1, size[1]//2 - psf.shape[1]//2 - 1]
         tmp = newArr[offset[0]:(psf.shape[0] + offset[0]), offset[1]:(psf.shape[1] + offset[1])]
         tmp[:, :] = psf
         return newArr
 
-    def computePrereqs(self, psf1=None, psf2=None, padSize=0):
+    def computePrereqs(self, psf1=None, psf2=None, padSize=0, realFft=False, sigmas=None):
         """Compute standard ZOGY quantities used by (nearly) all methods.
 
         Many of the ZOGY calculations require similar quantities, including
@@ -340,14 +458,20 @@ class ZogyTask(pipeBase.Task):
             (Optional) Input psf of science image, override if already padded
         padSize : `int`, optional
             Number of pixels to pad the image on each side with zeroes.
+        realFft : `bool`, optional
+            Compute real-input FFTs, which hold only the non-negative
+            frequencies along the last axis, rather than full complex FFTs.
+        sigmas : `tuple` of `float`, optional
+            Template and science image noise to use instead of ``sig1``
+            and ``sig2``.
 
         Returns
         -------
         A `lsst.pipe.base.Struct` containing:
         - Pr : 2D `numpy.array`, the (possibly zero-padded) template PSF
         - Pn : 2D `numpy.array`, the (possibly zero-padded) science PSF
-        - Pr_hat : 2D `numpy.array`, the FFT of `Pr`
-        - Pn_hat : 2D `numpy.array`, the FFT of `Pn`
+        - Pr_hat : 2D `numpy.array`, the FFT (or real FFT) of `Pr`
+        - Pn_hat : 2D `numpy.array`, the FFT (or real FFT) of `Pn`
         - denom : 2D `numpy.array`, the denominator of equation (13) in ZOGY (2016) manuscript
         - Fd : `float`, the relative flux scaling factor between science and template
         """
@@ -362,19 +486,107 @@ class ZogyTask(pipeBase.Task):
         psf1[np.abs(psf1) <= MIN_KERNEL] = MIN_KERNEL
         psf2[np.abs(psf2) <= MIN_KERNEL] = MIN_KERNEL
 
-        sigR, sigN = self.sig1, self.sig2
-        Pr_hat = np.fft.fft2(Pr)
+        fft2 = self._fft.rfft2 if realFft else self._fft.fft2
+        complexType = np.result_type(Pr.dtype, np.complex64)
+        Pr_hat = fft2(Pr).astype(complexType, copy=False)
+        Pn_hat = fft2(Pn).astype(complexType, copy=False)
+        return self._prereqsFromTransforms(Pr, Pn, Pr_hat, Pn_hat, sigmas=sigmas)
+
+    def _prereqsFromTransforms(self, Pr, Pn, Pr_hat, Pn_hat, sigmas=None):
+        """Complete the `computePrereqs` quantities from the PSF transforms.
+        """
+        sigR, sigN = (self.sig1, self.sig2) if sigmas is None else sigmas
+        # Plain floats keep single-precision PSFs and transforms in single precision
+        sigR, sigN = float(sigR), float(sigN)
         Pr_hat2 = np.conj(Pr_hat) * Pr_hat
-        Pn_hat = np.fft.fft2(Pn)
         Pn_hat2 = np.conj(Pn_hat) * Pn_hat
         denom = np.sqrt((sigN**2 * self.Fr**2 * Pr_hat2) + (sigR**2 * self.Fn**2 * Pn_hat2))
-        Fd = self.Fr * self.Fn / np.sqrt(sigN**2 * self.Fr**2 + sigR**2 * self.Fn**2)
+        Fd = float(self.Fr * self.Fn / np.sqrt(sigN**2 * self.Fr**2 + sigR**2 * self.Fn**2))
 
         res = pipeBase.Struct(
             Pr=Pr, Pn=Pn, Pr_hat=Pr_hat, Pn_hat=Pn_hat, denom=denom, Fd=Fd
         )
         return res
 
+    def _getFftShape(self, shape):
+        """Return the shape of the Fourier-space ZOGY transforms for images
+        of ``shape``.
+        """
+        if self.config.padToFastFftSize:
+            return tuple(goodFftSize(n) for n in shape)
+        return tuple(shape)
+
+    def _computeFourierPrereqs(self, fftShape):
+        """Compute the real-FFT `computePrereqs` quantities for PSFs padded to
+        ``fftShape``, reusing the previous ones for the same PSFs and noise.
+
+        Parameters
+        ----------
+        fftShape : `tuple` of `int`
+            Shape of the transforms.
+
+        Returns
+        -------
+        preqs : `lsst.pipe.base.Struct`
+            As returned by `computePrereqs` with ``realFft=True``.
+        """
+        key = (fftShape, self.im1_psf.shape, self.im1_psf.tobytes(), self.im2_psf.shape,
+               self.im2_psf.tobytes(), self.sig1, self.sig2, self.Fr, self.Fn)
+        if self._fourierPrereqs is None or self._fourierPrereqs[0] != key:
+            def transformPsfs():
+                psf1 = ZogyTask._padPsfToSize(self.im1_psf, fftShape, dtype=self._floatType)
+                psf2 = ZogyTask._padPsfToSize(self.im2_psf, fftShape, dtype=self._floatType)
+                # PSFs are already padded
+                preqs = self.computePrereqs(psf1, psf2, padSize=0, realFft=True)
+                return preqs.Pr, preqs.Pn, preqs.Pr_hat, preqs.Pn_hat
+
+            if self._psfCache is None:
+                transforms = transformPsfs()
+            else:
+                # The transforms of PSFs shared with other tasks, e.g. other ZogyMapper cells
+                transforms = self._psfCache.get((self._psfCacheKey, fftShape, self._floatType),
+                                                transformPsfs, self._psfCacheOwners)
+            preqs = self._prereqsFromTransforms(*transforms)
+            self._fourierPrereqs = (key, preqs)
+        return self._fourierPrereqs[1]
+
+    def _rfft2Planes(self, planes, fftShape):
+        """Real-FFT a list of same-shape image planes in one call, padding
+        each with its mean to ``fftShape``, in the configured precision.
+        """
+        stack = np.empty((len(planes),) + tuple(fftShape), dtype=self._floatType)
+        for im, padded in zip(planes, stack):
+            padded[:, :] = im.mean() if im.shape != tuple(fftShape) else 0.
+            padded[:im.shape[0], :im.shape[1]] = im
+        return self._fft.rfft2(stack, axes=(-2, -1)).astype(self._complexType, copy=False)
+
+    @staticmethod
+    def _diffimSpectraInPlace(spectra, Kr_hat, Kn_hat):
+        """Turn the stacked spectra of R, N, R_var and N_var from
+        `_rfft2Planes` into those of the matched template, D, the matched
+        template variance and D_var (eq. 13), in place.
+        """
+        spectra[0] *= Kn_hat
+        spectra[1] *= Kr_hat
+        spectra[1] -= spectra[0]
+        # The variances add
+        spectra[2] *= Kn_hat
+        spectra[3] *= Kr_hat
+        spectra[3] += spectra[2]
+
+    def _irfft2Planes(self, spectra, fftShape, shape):
+        """Inverse real-FFT a stack of spectra in one call, and undo the
+        centering of the image-sized PSFs.
+
+        The result of a plane is ``np.fft.ifftshift`` of its inverse
+        transform when ``fftShape`` equals ``shape``; otherwise the same
+        shift is applied on the padded grid before cropping to ``shape``.
+        """
+        planes = self._fft.irfft2(spectra, fftShape, axes=(-2, -1))
+        planes = planes.astype(self._floatType, copy=False)
+        planes = np.roll(planes, (-(fftShape[0]//2), -(fftShape[1]//2)), axis=(-2, -1))
+        return planes[:, :shape[0], :shape[1]]
+
     def computeDiffimFourierSpace(self, debug=False, returnMatchedTemplate=False, **kwargs):
         r"""Compute ZOGY diffim `D` as proscribed in ZOGY (2016) manuscript
 
@@ -412,10 +624,9 @@ class ZogyTask(pipeBase.Task):
             - ``D_var`` : 2D `numpy.array`, the variance image for `D`
         """
         # Do all in fourier space (needs image-sized PSFs)
-        psf1 = ZogyTask._padPsfToSize(self.im1_psf, self.im1.shape)
-        psf2 = ZogyTask._padPsfToSize(self.im2_psf, self.im2.shape)
-
-        preqs = self.computePrereqs(psf1, psf2, padSize=0)  # already padded the PSFs
+        shape = self.im1.shape
+        fftShape = self._getFftShape(shape)
+        preqs = self._computeFourierPrereqs(fftShape)
 
         def _filterKernel(K, trim_amount):
             # Filter the wings of Kn, Kr, set to zero
@@ -429,43 +640,30 @@ class ZogyTask(pipeBase.Task):
         if debug and self.config.doTrimKernels:  # default False
             # Suggestion from Barak to trim Kr and Kn to remove artifacts
             # Here we just filter them (in image space) to keep them the same size
-            ps = (Kn_hat.shape[1] - 80)//2
-            Kn = _filterKernel(np.fft.ifft2(Kn_hat), ps)
-            Kn_hat = np.fft.fft2(Kn)
-            Kr = _filterKernel(np.fft.ifft2(Kr_hat), ps)
-            Kr_hat = np.fft.fft2(Kr)
-
-        def processImages(im1, im2, doAdd=False):
-            # Some masked regions are NaN or infinite!, and FFTs no likey.
-            im1[np.isinf(im1)] = np.nan
-            im1[np.isnan(im1)] = np.nanmean(im1)
-            im2[np.isinf(im2)] = np.nan
-            im2[np.isnan(im2)] = np.nanmean(im2)
-
-            R_hat = np.fft.fft2(im1)
-            N_hat = np.fft.fft2(im2)
-
-            D_hat = Kr_hat * N_hat
-            D_hat_R = Kn_hat * R_hat
-            if not doAdd:
-                D_hat -= D_hat_R
-            else:
-                D_hat += D_hat_R
-
-            D = np.fft.ifft2(D_hat)
-            D = np.fft.ifftshift(D.real) / preqs.Fd
-
-            R = None
-            if returnMatchedTemplate:
-                R = np.fft.ifft2(D_hat_R)
-                R = np.fft.ifftshift(R.real) / preqs.Fd
-
-            return D, R
+            ps = (fftShape[1] - 80)//2
+            Kn = _filterKernel(self._fft.irfft2(Kn_hat, fftShape), ps)
+            Kn_hat = self._fft.rfft2(Kn)
+            Kr = _filterKernel(self._fft.irfft2(Kr_hat, fftShape), ps)
+            Kr_hat = self._fft.rfft2(Kr)
 
-        # First do the image
-        D, R = processImages(self.im1, self.im2, doAdd=False)
-        # Do the exact same thing to the var images, except add them
-        D_var, R_var = processImages(self.im1_var, self.im2_var, doAdd=True)
+        # Some masked regions are NaN or infinite!, and FFTs no likey.
+        planes = [self.im1, self.im2, self.im1_var, self.im2_var]
+        for im in planes:
+            im[np.isinf(im)] = np.nan
+            im[np.isnan(im)] = np.nanmean(im)
+
+        # Transform the images and variances of both exposures together, and
+        # form the output spectra in the same stack
+        spectra = self._rfft2Planes(planes, fftShape)
+        self._diffimSpectraInPlace(spectra, Kr_hat, Kn_hat)
+        outputs = self._irfft2Planes(spectra if returnMatchedTemplate else spectra[1::2], fftShape, shape)
+        outputs /= preqs.Fd
+
+        R = R_var = None
+        if returnMatchedTemplate:
+            R, D, R_var, D_var = outputs
+        else:
+            D, D_var = outputs
 
         return pipeBase.Struct(D=D, D_var=D_var, R=R, R_var=R_var)
 
@@ -501,12 +699,14 @@ class ZogyTask(pipeBase.Task):
         outExp = exposure.clone()  # Do this to keep WCS, PSF, masks, etc.
         convCntrl = afwMath.ConvolutionControl(doNormalize=False, doCopyEdge=False,
                                                maxInterpolationDistance=0)
+        fftMinSize = self.config.fftConvolveMinSize
         try:
-            afwMath.convolve(outExp.getMaskedImage(), exposure.getMaskedImage(), kern, convCntrl)
+            convolveImage(outExp.getMaskedImage(), exposure.getMaskedImage(), kern, convCntrl,
+                          fftMinSize=fftMinSize, fft=self._fft)
         except AttributeError:
             # Allow exposure to actually be an image/maskedImage
             # (getMaskedImage will throw AttributeError in that case)
-            afwMath.convolve(outExp, exposure, kern, convCntrl)
+            convolveImage(outExp, exposure, kern, convCntrl, fftMinSize=fftMinSize, fft=self._fft)
 
         return outExp, kern
 
@@ -531,17 +731,19 @@ class ZogyTask(pipeBase.Task):
            the proper image difference, including correct variance,
            masks, and PSF
         """
-        preqs = self.computePrereqs(padSize=padSize)
+        padSize = self.padSize if padSize is None else padSize
+        kernels = self._computeImageSpaceKernels(padSize)
+        Kr, Kn = kernels.Kr, kernels.Kn
 
-        delta = 0.
         if debug:
+            preqs = self.computePrereqs(padSize=padSize)
             delta = 1.  # Regularize the ratio, a possible option to remove artifacts
-        Kr_hat = (preqs.Pr_hat + delta) / (preqs.denom + delta)
-        Kn_hat = (preqs.Pn_hat + delta) / (preqs.denom + delta)
-        Kr = np.fft.ifft2(Kr_hat).real
-        Kr = np.roll(np.roll(Kr, -1, 0), -1, 1)
-        Kn = np.fft.ifft2(Kn_hat).real
-        Kn = np.roll(np.roll(Kn, -1, 0), -1, 1)
+            Kr_hat = (preqs.Pr_hat + delta) / (preqs.denom + delta)
+            Kn_hat = (preqs.Pn_hat + delta) / (preqs.denom + delta)
+            Kr = self._fft.ifft2(Kr_hat).real
+            Kr = np.roll(np.roll(Kr, -1, 0), -1, 1)
+            Kn = self._fft.ifft2(Kn_hat).real
+            Kn = np.roll(np.roll(Kn, -1, 0), -1, 1)
 
         def _trimKernel(self, K, trim_amount):
             # Trim out the wings of Kn, Kr (see notebook #15)
@@ -559,14 +761,106 @@ class ZogyTask(pipeBase.Task):
             Kr = _trimKernel(Kr, padSize)
 
         # Note these are reverse-labelled, this is CORRECT!
-        exp1, _ = self._doConvolve(self.template, Kn)
-        exp2, _ = self._doConvolve(self.science, Kr)
+        exp1 = self._applyKernel(self.template, Kn)
+        exp2 = self._applyKernel(self.science, Kr)
         D = exp2
         tmp = D.getMaskedImage()
         tmp -= exp1.getMaskedImage()
-        tmp /= preqs.Fd
+        tmp /= kernels.Fd
         return pipeBase.Struct(D=D, R=exp1)
 
+    def _computeImageSpaceKernels(self, padSize):
+        """Compute the image-space ZOGY kernels, truncated to their share of
+        ``config.kernelEnergyFraction`` of their squared sum, reusing the
+        previous ones for the same PSFs and noise.
+
+        Parameters
+        ----------
+        padSize : `int`
+            Number of pixels to pad the PSFs by for the diffim kernels.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Result struct with components:
+
+            - ``Kr``, ``Kn`` : 2D `numpy.array`, the diffim kernels (eq. 13
+              of ZOGY (2016)) for the science and template images
+            - ``KrS``, ``KnS`` : 2D `numpy.array`, the S_corr kernels
+              (eqs. 28-29 of ZOGY (2016)) for the template and science images
+            - ``Fd`` : `float`, the relative flux scaling factor
+        """
+        energyFraction = _splitEnergyFraction(self.config)[0]
+        key = (padSize, self.im1_psf.shape, self.im1_psf.tobytes(), self.im2_psf.shape,
+               self.im2_psf.tobytes(), self.sig1, self.sig2, self.Fr, self.Fn, energyFraction)
+        if self._imageSpaceKernels is None or self._imageSpaceKernels[0] != key:
+            sigmas = (self.sig1, self.sig2)
+            if self._psfCache is not None and self._psfCacheSigmaPrecision > 0:
+                # Share the kernels of cells with nearly the same noise, computed for the bin's noise
+                sigmas = tuple(_quantizeSigma(sig, self._psfCacheSigmaPrecision) for sig in sigmas)
+
+            def computeKernels():
+                preqs = self.computePrereqs(padSize=padSize, sigmas=sigmas)
+                Kr = self._fft.ifft2(preqs.Pr_hat / preqs.denom).real
+                Kr = np.roll(np.roll(Kr, -1, 0), -1, 1)
+                Kn = self._fft.ifft2(preqs.Pn_hat / preqs.denom).real
+                Kn = np.roll(np.roll(Kn, -1, 0), -1, 1)
+
+                preqs = self.computePrereqs(padSize=0, sigmas=sigmas)
+                Pn_hat2 = np.conj(preqs.Pn_hat) * preqs.Pn_hat
+                KrS_hat = self.Fr * self.Fn**2. * np.conj(preqs.Pr_hat) * Pn_hat2 / preqs.denom**2.
+                Pr_hat2 = np.conj(preqs.Pr_hat) * preqs.Pr_hat
+                KnS_hat = self.Fn * self.Fr**2. * np.conj(preqs.Pn_hat) * Pr_hat2 / preqs.denom**2.
+                KrS = self._fft.ifft2(KrS_hat).real
+                KrS = np.roll(np.roll(KrS, -1, 0), -1, 1)
+                KnS = self._fft.ifft2(KnS_hat).real
+                KnS = np.roll(np.roll(KnS, -1, 0), -1, 1)
+
+                return pipeBase.Struct(Kr=_truncateKernel(Kr, energyFraction),
+                                       Kn=_truncateKernel(Kn, energyFraction),
+                                       KrS=_truncateKernel(KrS, energyFraction),
+                                       KnS=_truncateKernel(KnS, energyFraction),
+                                       Fd=preqs.Fd)
+
+            if self._psfCache is None:
+                kernels = computeKernels()
+            else:
+                kernels = self._psfCache.get((self._psfCacheKey, "imageSpace", padSize) + sigmas +
+                                             (energyFraction,),
+                                             computeKernels, self._psfCacheOwners)
+            self._imageSpaceKernels = (key, kernels)
+        return self._imageSpaceKernels[1]
+
+    def _applyKernel(self, exposure, kernel):
+        """Convolve an Exposure, MaskedImage or Image with a kernel image,
+        as a sum of separable terms if ``config.kernelMaxRank`` allows.
+
+        Parameters
+        ----------
+        exposure : `lsst.afw.image.Exposure`
+            Input exposure to be convolved.
+        kernel : `numpy.array`
+            2D `numpy.array` to convolve the image with
+
+        Returns
+        -------
+        A new `lsst.afw.image.Exposure` with the convolved pixels.
+        """
+        terms = None
+        if self.config.kernelMaxRank > 0:
+            terms = lowRankTerms(kernel, _splitEnergyFraction(self.config)[1], self.config.kernelMaxRank)
+        if terms is None:
+            outExp, _ = self._doConvolve(exposure, kernel)
+            return outExp
+
+        outExp = exposure.clone()  # Do this to keep WCS, PSF, masks, etc.
+        try:
+            convolveLowRank(outExp.getMaskedImage(), exposure.getMaskedImage(), kernel, terms)
+        except AttributeError:
+            # Allow exposure to actually be an image/maskedImage
+            convolveLowRank(outExp, exposure, kernel, terms)
+        return outExp
+
     def _setNewPsf(self, exposure, psfArr):
         """Utility method to set an exposure's PSF when provided as a 2-d numpy.array
         """
@@ -618,7 +912,7 @@ class ZogyTask(pipeBase.Task):
             if returnMatchedTemplate:
                 R = res.R
         else:
-            res = self.computeDiffimFourierSpace(**kwargs)
+            res = self.computeDiffimFourierSpace(returnMatchedTemplate=returnMatchedTemplate, **kwargs)
             D = self.science.clone()
             D.getMaskedImage().getImage().getArray()[:, :] = res.D
             D.getMaskedImage().getVariance().getArray()[:, :] = res.D_var
@@ -658,7 +952,7 @@ class ZogyTask(pipeBase.Task):
         if keepFourier:
             return Pd_hat
 
-        Pd = np.fft.ifft2(Pd_hat)
+        Pd = self._fft.ifft2(Pd_hat)
         Pd = np.fft.ifftshift(Pd).real
 
         return Pd
@@ -701,18 +995,18 @@ class ZogyTask(pipeBase.Task):
         VastSR = VastSN = 0.
         if xVarAst + yVarAst > 0:  # Do the astrometric variance correction
             if inImageSpace:
-                S_R, _ = self._doConvolve(self.template, Kr)
+                S_R = self._applyKernel(self.template, Kr)
                 S_R = S_R.getMaskedImage().getImage().getArray()
             else:
-                S_R = np.fft.ifft2(R_hat * Kr_hat)
+                S_R = self._fft.ifft2(R_hat * Kr_hat)
             gradRx, gradRy = np.gradient(S_R)
             VastSR = xVarAst * gradRx**2. + yVarAst * gradRy**2.
 
             if inImageSpace:
-                S_N, _ = self._doConvolve(self.science, Kn)
+                S_N = self._applyKernel(self.science, Kn)
                 S_N = S_N.getMaskedImage().getImage().getArray()
             else:
-                S_N = np.fft.ifft2(N_hat * Kn_hat)
+                S_N = self._fft.ifft2(N_hat * Kn_hat)
             gradNx, gradNy = np.gradient(S_N)
             VastSN = xVarAst * gradNx**2. + yVarAst * gradNy**2.
 
@@ -742,63 +1036,12 @@ class ZogyTask(pipeBase.Task):
             - ``S_var`` : the corrected variance image (denominator of eq. 25 of ZOGY (2016))
             - ``Dpsf`` : the PSF of the diffim D, likely never to be used.
         """
-        # Some masked regions are NaN or infinite!, and FFTs no likey.
-        def fix_nans(im):
-            """Replace any NaNs or Infs with the mean of the image."""
-            isbad = ~np.isfinite(im)
-            if np.any(isbad):
-                im[isbad] = np.nan
-                im[isbad] = np.nanmean(im)
-            return im
-
-        self.im1 = fix_nans(self.im1)
-        self.im2 = fix_nans(self.im2)
-        self.im1_var = fix_nans(self.im1_var)
-        self.im2_var = fix_nans(self.im2_var)
-
-        # Do all in fourier space (needs image-sized PSFs)
-        psf1 = ZogyTask._padPsfToSize(self.im1_psf, self.im1.shape)
-        psf2 = ZogyTask._padPsfToSize(self.im2_psf, self.im2.shape)
-
-        preqs = self.computePrereqs(psf1, psf2, padSize=0)  # already padded the PSFs
-
-        # Compute D_hat here (don't need D then, for speed)
-        R_hat = np.fft.fft2(self.im1)
-        N_hat = np.fft.fft2(self.im2)
-        D_hat = self.Fr * preqs.Pr_hat * N_hat - self.Fn * preqs.Pn_hat * R_hat
-        D_hat /= preqs.denom
-
-        Pd_hat = self.computeDiffimPsf(padSize=0, keepFourier=True, psf1=psf1, psf2=psf2)
-        Pd_bar = np.conj(Pd_hat)
-        S = np.fft.ifft2(D_hat * Pd_bar)
-
-        # Adjust the variance planes of the two images to contribute to the final detection
-        # (eq's 26-29).
-        Pn_hat2 = np.conj(preqs.Pn_hat) * preqs.Pn_hat
-        Kr_hat = self.Fr * self.Fn**2. * np.conj(preqs.Pr_hat) * Pn_hat2 / preqs.denom**2.
-        Pr_hat2 = np.conj(preqs.Pr_hat) * preqs.Pr_hat
-        Kn_hat = self.Fn * self.Fr**2. * np.conj(preqs.Pn_hat) * Pr_hat2 / preqs.denom**2.
-
-        Kr_hat2 = np.fft.fft2(np.fft.ifft2(Kr_hat)**2.)
-        Kn_hat2 = np.fft.fft2(np.fft.ifft2(Kn_hat)**2.)
-        var1c_hat = Kr_hat2 * np.fft.fft2(self.im1_var)
-        var2c_hat = Kn_hat2 * np.fft.fft2(self.im2_var)
-
-        # Do the astrometric variance correction
-        fGradR, fGradN = self._computeVarAstGradients(xVarAst, yVarAst, inImageSpace=False,
-                                                      R_hat=R_hat, Kr_hat=Kr_hat,
-                                                      N_hat=N_hat, Kn_hat=Kn_hat)
-
-        S_var = np.sqrt(np.fft.ifftshift(np.fft.ifft2(var1c_hat + var2c_hat)) + fGradR + fGradN)
-        S_var *= preqs.Fd
-
-        S = np.fft.ifftshift(np.fft.ifft2(Kn_hat * N_hat - Kr_hat * R_hat))
-        S *= preqs.Fd
-
+        # Share the real transforms and cached PSF prereqs of the diffim
+        res = self.computeAllFourierSpace(xVarAst=xVarAst, yVarAst=yVarAst, returnDiffim=False)
         Pd = self.computeDiffimPsf(padSize=0)
-        return pipeBase.Struct(S=S.real, S_var=S_var.real, Dpsf=Pd)
+        return pipeBase.Struct(S=res.S, S_var=res.S_var, Dpsf=Pd)
 
-    def computeScorrImageSpace(self, xVarAst=0., yVarAst=0., padSize=None, **kwargs):
+    def computeScorrImageSpace(self, xVarAst=0., yVarAst=0., padSize=None, D=None, **kwargs):
         """Compute corrected likelihood image, optimal for source detection
 
         Compute ZOGY S_corr image. This image can be thresholded for
@@ -812,6 +1055,11 @@ class ZogyTask(pipeBase.Task):
         ----------
         xVarAst, yVarAst : `float`
            estimated astrometric noise (variance of astrometric registration errors)
+        padSize : `int`
+           The amount to pad the PSFs by
+        D : `lsst.afw.image.Exposure`, optional
+           The diffim from `computeDiffimImageSpace` with the same ``padSize``,
+           if already computed; it is then not convolved again.
 
         Returns
         -------
@@ -822,37 +1070,30 @@ class ZogyTask(pipeBase.Task):
             variance, masks, and PSF
         """
         # Do convolutions in image space
-        preqs = self.computePrereqs(padSize=0)
-
         padSize = self.padSize if padSize is None else padSize
-        D = self.computeDiffimImageSpace(padSize=padSize).D
+        kernels = self._computeImageSpaceKernels(padSize)
+
+        if D is None:
+            D = self.computeDiffimImageSpace(padSize=padSize).D
         Pd = self.computeDiffimPsf()
         D = self._setNewPsf(D, Pd)
         Pd_bar = np.fliplr(np.flipud(Pd))
         S, _ = self._doConvolve(D, Pd_bar)
         tmp = S.getMaskedImage()
-        tmp *= preqs.Fd
+        tmp *= kernels.Fd
 
         # Adjust the variance planes of the two images to contribute to the final detection
         # (eq's 26-29).
-        Pn_hat2 = np.conj(preqs.Pn_hat) * preqs.Pn_hat
-        Kr_hat = self.Fr * self.Fn**2. * np.conj(preqs.Pr_hat) * Pn_hat2 / preqs.denom**2.
-        Pr_hat2 = np.conj(preqs.Pr_hat) * preqs.Pr_hat
-        Kn_hat = self.Fn * self.Fr**2. * np.conj(preqs.Pn_hat) * Pr_hat2 / preqs.denom**2.
-
-        Kr = np.fft.ifft2(Kr_hat).real
-        Kr = np.roll(np.roll(Kr, -1, 0), -1, 1)
-        Kn = np.fft.ifft2(Kn_hat).real
-        Kn = np.roll(np.roll(Kn, -1, 0), -1, 1)
-        var1c, _ = self._doConvolve(self.template.getMaskedImage().getVariance(), Kr**2.)
-        var2c, _ = self._doConvolve(self.science.getMaskedImage().getVariance(), Kn**2.)
+        Kr, Kn = kernels.KrS, kernels.KnS
+        var1c = self._applyKernel(self.template.getMaskedImage().getVariance(), Kr**2.)
+        var2c = self._applyKernel(self.science.getMaskedImage().getVariance(), Kn**2.)
 
         # Do the astrometric variance correction
         fGradR, fGradN = self._computeVarAstGradients(xVarAst, yVarAst, inImageSpace=True,
                                                       Kr=Kr, Kn=Kn)
 
         Smi = S.getMaskedImage()
-        Smi *= preqs.Fd
+        Smi *= kernels.Fd
         S_var = np.sqrt(var1c.getArray() + var2c.getArray() + fGradR + fGradN)
         S.getMaskedImage().getVariance().getArray()[:, :] = S_var
         S = self._setNewPsf(S, Pd)
@@ -896,16 +1137,275 @@ class ZogyTask(pipeBase.Task):
 
         return pipeBase.Struct(S=S)
 
+    def computeAllFourierSpace(self, xVarAst=0., yVarAst=0., returnMatchedTemplate=False,
+                               returnDiffim=True, **kwargs):
+        """Compute the ZOGY diffim `D` and corrected likelihood image `S_corr`
+        together in Fourier space.
+
+        The template and science images and variances are transformed once,
+        and the `S_corr` kernels (eqs. 28-29 of ZOGY (2016)) are derived from
+        the `D` kernels (eq. 13), so the diffim matches that of
+        `computeDiffimFourierSpace` and the likelihood image comes for little
+        more than the cost of the diffim alone.
+
+        Parameters
+        ----------
+        xVarAst, yVarAst : `float`
+           estimated astrometric noise (variance of astrometric registration errors)
+        returnMatchedTemplate : `bool`, optional
+            Calculate the template image.
+            If not set, the returned template will be None.
+        returnDiffim : `bool`, optional
+            Calculate the diffim and its variance.
+            If not set, the returned diffim will be None, and only the
+            likelihood image (and matched template) are transformed back.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            Result struct with components:
+
+            - ``D`` : 2D `numpy.array`, the proper image difference, or None
+            - ``D_var`` : 2D `numpy.array`, the variance image for `D`, or None
+            - ``R``, ``R_var`` : 2D `numpy.array`, the matched template and
+              its variance, or None
+            - ``S`` : 2D `numpy.array`, the likelihood image S (eq. 12 of ZOGY (2016))
+            - ``S_var`` : 2D `numpy.array`, the corrected variance image
+              (denominator of eq. 25 of ZOGY (2016))
+        """
+        shape = self.im1.shape
+        fftShape = self._getFftShape(shape)
+        preqs = self._computeFourierPrereqs(fftShape)
+
+        # Some masked regions are NaN or infinite!, and FFTs no likey.
+        planes = [self.im1, self.im2, self.im1_var, self.im2_var]
+        for im in planes:
+            im[np.isinf(im)] = np.nan
+            im[np.isnan(im)] = np.nanmean(im)
+
+        spectra = self._rfft2Planes(planes, fftShape)
+        R_hat, N_hat, R_var_hat, N_var_hat = spectra
+
+        # The D kernels (eq. 13), and from them the S_corr kernels (eqs. 28-29)
+        Kr_hat = self.Fr * preqs.Pr_hat / preqs.denom
+        Kn_hat = self.Fn * preqs.Pn_hat / preqs.denom
+        KrS_hat = np.conj(Kr_hat) * (Kn_hat * np.conj(Kn_hat)).real * preqs.denom
+        KnS_hat = np.conj(Kn_hat) * (Kr_hat * np.conj(Kr_hat)).real * preqs.denom
+        if getattr(preqs, 'KrS_hat2', None) is None:
+            # The S_corr variance is convolved with the squared kernels, which
+            # depend only on the PSFs and noise, so keep them with the prereqs
+            kernels = self._fft.irfft2(np.array([KrS_hat, KnS_hat]), fftShape, axes=(-2, -1))
+            kernels_hat2 = self._fft.rfft2(kernels**2., axes=(-2, -1)).astype(self._complexType, copy=False)
+            preqs.KrS_hat2, preqs.KnS_hat2 = kernels_hat2
+
+        # The filtered images, whose difference is S (eq. 12)
+        S_spectra = np.empty((2,) + spectra.shape[1:], dtype=spectra.dtype)
+        np.multiply(R_hat, KrS_hat, out=S_spectra[0])
+        np.multiply(N_hat, KnS_hat, out=S_spectra[1])
+
+        VastSR = VastSN = 0.
+        if xVarAst + yVarAst > 0:  # Do the astrometric variance correction
+            # As in `_computeVarAstGradients`, these are not re-centered
+            S_R, S_N = self._fft.irfft2(S_spectra, fftShape,
+                                        axes=(-2, -1))[:, :shape[0], :shape[1]].astype(self._floatType)
+            gradRx, gradRy = np.gradient(S_R)
+            VastSR = xVarAst * gradRx**2. + yVarAst * gradRy**2.
+            gradNx, gradNy = np.gradient(S_N)
+            VastSN = xVarAst * gradNx**2. + yVarAst * gradNy**2.
+
+        S_spectra[1] -= S_spectra[0]
+        np.multiply(preqs.KrS_hat2, R_var_hat, out=S_spectra[0])
+        S_spectra[0] += preqs.KnS_hat2 * N_var_hat
+        S_var, S = self._irfft2Planes(S_spectra, fftShape, shape)
+        S_spectra = None  # Freed before the diffim spectra are inverted
+        S *= preqs.Fd
+        S_var = np.sqrt(S_var + VastSR + VastSN) * preqs.Fd
+
+        D = D_var = R = R_var = None
+        if returnDiffim or returnMatchedTemplate:
+            # The stacked input spectra are no longer needed once S is formed
+            self._diffimSpectraInPlace(spectra, Kr_hat, Kn_hat)
+            if returnDiffim and returnMatchedTemplate:
+                R, D, R_var, D_var = self._irfft2Planes(spectra, fftShape, shape) / preqs.Fd
+            elif returnDiffim:
+                D, D_var = self._irfft2Planes(spectra[1::2], fftShape, shape) / preqs.Fd
+            else:
+                R, R_var = self._irfft2Planes(spectra[0::2], fftShape, shape) / preqs.Fd
+
+        return pipeBase.Struct(D=D, D_var=D_var, R=R, R_var=R_var, S=S, S_var=S_var)
+
+    def computeAll(self, xVarAst=0., yVarAst=0., inImageSpace=None, padSize=None,
+                   returnMatchedTemplate=False, returnDiffim=True, **kwargs):
+        """Wrapper method to compute the ZOGY proper diffim and corrected
+        likelihood image together
+
+        This is cheaper than calling `computeDiffim` and `computeScorr` in
+        turn, since in Fourier space the images are transformed once for both.
+
+        Parameters
+        ----------
+        xVarAst, yVarAst : `float`
+           estimated astrometric noise (variance of astrometric registration errors)
+        inImageSpace : `bool`
+           Override config `inImageSpace` parameter
+        padSize : `int`
+           Override config `padSize` parameter
+        returnMatchedTemplate : `bool`
+           Include the PSF-matched template in the results Struct
+        returnDiffim : `bool`
+           Include the proper image difference in the results Struct; in
+           Fourier space it is then not computed at all
+        **kwargs
+            additional keyword arguments to be passed to
+            `computeAllFourierSpace`, or `computeDiffim` in image space.
+
+        Returns
+        -------
+        An lsst.pipe.base.Struct containing:
+           - D : `lsst.afw.Exposure`
+               If `returnDiffim` is True, the proper image difference,
+               including correct variance, masks, and PSF
+           - S : `lsst.afw.Exposure`
+               the likelihood exposure S (eq. 12 of ZOGY (2016)),
+               including corrected variance, masks, and PSF
+           - R : `lsst.afw.Exposure`
+               If `returnMatchedTemplate` is True, the PSF-matched template
+               exposure
+        """
+        inImageSpace = self.config.inImageSpace if inImageSpace is None else inImageSpace
+        if inImageSpace:
+            # S is filtered from D, so convolve the images only once
+            res = self.computeDiffim(inImageSpace=True, padSize=padSize,
+                                     returnMatchedTemplate=returnMatchedTemplate, **kwargs)
+            S = self.computeScorrImageSpace(xVarAst=xVarAst, yVarAst=yVarAst, padSize=padSize,
+                                            D=res.D).S
+            return pipeBase.Struct(D=res.D if returnDiffim else None, S=S, R=res.R)
+
+        res = self.computeAllFourierSpace(xVarAst=xVarAst, yVarAst=yVarAst,
+                                          returnMatchedTemplate=returnMatchedTemplate,
+                                          returnDiffim=returnDiffim, **kwargs)
+
+        def _makeExposure(image, variance):
+            exposure = self.science.clone()
+            exposure.getMaskedImage().getImage().getArray()[:, :] = image
+            exposure.getMaskedImage().getVariance().getArray()[:, :] = variance
+            return exposure
+
+        psf = self.computeDiffimPsf()
+        S = self._setNewPsf(_makeExposure(res.S, res.S_var), psf)
+        D = R = None
+        if returnDiffim:
+            D = self._setNewPsf(_makeExposure(res.D, res.D_var), psf)
+        if returnMatchedTemplate:
+            R = _makeExposure(res.R, res.R_var)
+        return pipeBase.Struct(D=D, S=S, R=R)
+
+
+def _quantizeSigma(sigma, precision):
+    """Round a noise level to the nearest of a geometric series of levels
+    a factor ``1 + precision`` apart.
+    """
+    step = np.log1p(precision)
+    return float(np.exp(np.round(np.log(sigma)/step)*step))
+
+
+class _PsfTransformCache(object):
+    """Least-recently-used cache of PSF images and transforms shared by the
+    cells of a `ZogyMapper`.
+
+    Parameters
+    ----------
+    maxSize : `int`
+        Maximum number of entries.
+    """
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.hits = self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, compute, owners=()):
+        """Return the value for ``key``, calling ``compute()`` to make it if
+        it is not cached.
+
+        Keys may hold the ``id`` of ``owners``, the objects the value was
+        computed from; an entry is only reused for the very same objects, so
+        a recycled ``id`` cannot return a stale value.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and all(a is b for a, b in zip(entry[0], owners)):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = compute()
+        self._entries[key] = (tuple(owners), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+        return value
+
+    def getHitRate(self):
+        """Return the fraction of lookups answered from the cache.
+        """
+        total = self.hits + self.misses
+        return self.hits/total if total > 0 else 0.
+
+
+class ZogyMapperConfig(ZogyConfig):
+    """Configuration parameters for the ZogyMapper
+    """
+    psfCacheSize = pexConfig.Field(
+        dtype=int,
+        default=0,
+        doc="Maximum number of PSF images and PSF transforms kept for reuse by later cells; "
+        "0 to compute them for every cell.",
+        check=lambda x: x >= 0
+    )
+
+    psfCachePositionQuantum = pexConfig.Field(
+        dtype=float,
+        default=200.,
+        doc="With psfCacheSize > 0, evaluate the PSFs at the centers of squares of this many "
+        "pixels rather than at the cell centers, so cells in the same square share them. "
+        "0 to evaluate them at the cell centers.",
+        check=lambda x: x >= 0.
+    )
+
+    psfCacheSigmaPrecision = pexConfig.Field(
+        dtype=float,
+        default=0.05,
+        doc="With psfCacheSize > 0, compute the image-space kernels for noise levels rounded to "
+        "this relative precision, so cells with nearly the same noise share them. "
+        "0 to compute them for each cell's own noise.",
+        check=lambda x: x >= 0.
+    )
+
 
 class ZogyMapper(ZogyTask, ImageMapper):
     """Task to be used as an ImageMapper for performing
     ZOGY image subtraction on a grid of subimages.
+
+    With ``config.psfCacheSize`` > 0 the PSF images, keyed on the PSF models
+    and (quantized) position, and their Fourier-space transforms, keyed also
+    on the transform shape, are reused by later cells; so are the
+    image-space kernels, keyed also on the (rounded) image noise. The cache
+    statistics are reported in the task metadata as ``psfCacheHits``,
+    ``psfCacheMisses`` and ``psfCacheHitRate``.
+
+    Each worker process forked by `ImageMapReduceTask` when
+    ``nWorkers`` > 1 fills its own copy of the cache, so entries are only
+    shared by the cells a worker maps, and the statistics in the metadata
+    cover only the cells mapped in this process.
     """
-    ConfigClass = ZogyConfig
+    ConfigClass = ZogyMapperConfig
     _DefaultName = 'ip_diffim_ZogyMapper'
 
     def __init__(self, *args, **kwargs):
         ImageMapper.__init__(self, *args, **kwargs)
+        self._psfCache = None
+        if self.config.psfCacheSize > 0:
+            self._psfCache = _PsfTransformCache(self.config.psfCacheSize)
 
     def run(self, subExposure, expandedSubExposure, fullBBox, template,
             **kwargs):
@@ -990,16 +1490,6 @@ class ZogyMapper(ZogyTask, ImageMapper):
                              constant_values=0.)
             return psf
 
-        psf2 = subExp2.getPsf().computeKernelImage(center).getArray()
-        psf2 = _makePsfSquare(psf2)
-
-        psf1 = template.getPsf().computeKernelImage(center).getArray()
-        psf1 = _makePsfSquare(psf1)
-
-        # from diffimTests.diffimTests ...
-        if subExp1.getDimensions()[0] < psf1.shape[0] or subExp1.getDimensions()[1] < psf1.shape[1]:
-            return pipeBase.Struct(subExposure=subExposure)
-
         def _filterPsf(psf):
             """Filter a noisy Psf to remove artifacts. Subject of future research."""
             # only necessary if it's from a measured psf and PsfEx seems to always make PSFs of size 41x41
@@ -1011,18 +1501,56 @@ class ZogyMapper(ZogyTask, ImageMapper):
 
             return psf
 
-        psf1b = psf2b = None
-        if self.config.doFilterPsfs:  # default True
-            # Note this *really* helps for measured psfs.
-            psf1b = _filterPsf(psf1)
-            psf2b = _filterPsf(psf2)
+        def _computePsfs(position):
+            psf2 = subExp2.getPsf().computeKernelImage(position).getArray()
+            psf2 = _makePsfSquare(psf2)
+
+            psf1 = template.getPsf().computeKernelImage(position).getArray()
+            psf1 = _makePsfSquare(psf1)
+
+            psf1b = psf2b = None
+            if self.config.doFilterPsfs:  # default True
+                # Note this *really* helps for measured psfs.
+                psf1b = _filterPsf(psf1)
+                psf2b = _filterPsf(psf2)
+            return psf1, psf2, psf1b, psf2b
+
+        if self._psfCache is None:
+            psf1, psf2, psf1b, psf2b = _computePsfs(center)
+        else:
+            # Reuse the PSFs, and below their transforms, of cells in the same quantum
+            quantum = self.config.psfCachePositionQuantum
+            if quantum > 0:
+                center = afwGeom.Point2D((np.floor(center.getX()/quantum) + 0.5)*quantum,
+                                         (np.floor(center.getY()/quantum) + 0.5)*quantum)
+            psfOwners = (template.getPsf(), subExp2.getPsf())
+            psfCacheKey = (id(psfOwners[0]), id(psfOwners[1]), center.getX(), center.getY())
+            psf1, psf2, psf1b, psf2b = self._psfCache.get(psfCacheKey, lambda: _computePsfs(center),
+                                                          psfOwners)
+            # ZogyTask modifies its PSFs in place, and needs them explicitly to match the transforms
+            psf1b = (psf1 if psf1b is None else psf1b).copy()
+            psf2b = (psf2 if psf2b is None else psf2b).copy()
+
+        # from diffimTests.diffimTests ...
+        if subExp1.getDimensions()[0] < psf1.shape[0] or subExp1.getDimensions()[1] < psf1.shape[1]:
+            return pipeBase.Struct(subExposure=subExposure)
 
         config = ZogyConfig()
+        config.fftBackend = self.config.fftBackend
+        config.fftThreads = self.config.fftThreads
+        config.precision = self.config.precision
+        config.kernelEnergyFraction = self.config.kernelEnergyFraction
+        config.kernelMaxRank = self.config.kernelMaxRank
         if imageSpace is True:
             config.inImageSpace = imageSpace
             config.padSize = padSize  # Don't need padding if doing all in fourier space
         task = ZogyTask(templateExposure=subExp1, scienceExposure=subExp2,
                         sig1=sig1, sig2=sig2, psf1=psf1b, psf2=psf2b, config=config)
+        if self._psfCache is not None:
+            task._psfCache = self._psfCache
+            task._psfCacheKey = psfCacheKey
+            task._psfCacheOwners = psfOwners
+            task._psfCacheSigmaPrecision = self.config.psfCacheSigmaPrecision
 
         if not doScorr:
             res = task.computeDiffim(**kwargs)
@@ -1031,6 +1559,11 @@ class ZogyMapper(ZogyTask, ImageMapper):
             res = task.computeScorr(**kwargs)
             D = res.S
 
+        if self._psfCache is not None:
+            self.metadata.set("psfCacheHits", self._psfCache.hits)
+            self.metadata.set("psfCacheMisses", self._psfCache.misses)
+            self.metadata.set("psfCacheHitRate", self._psfCache.getHitRate())
+
         outExp = D.Factory(D, subExposure.getBBox())
         out = pipeBase.Struct(subExposure=outExp)
         return out
@@ -1060,6 +1593,12 @@ class ZogyImagePsfMatchConfig(ImagePsfMatchConfig):
         doc='ZogyMapReduce config to use when running Zogy on each sub-image (spatially-varying)',
     )
 
+    doMatchedTemplate = pexConfig.Field(
+        dtype=bool,
+        default=False,
+        doc='Also compute the PSF-matched template (matchedExposure) when not spatially varying',
+    )
+
     def setDefaults(self):
         self.zogyMapReduceConfig.gridStepX = self.zogyMapReduceConfig.gridStepY = 40
         self.zogyMapReduceConfig.cellSizeX = self.zogyMapReduceConfig.cellSizeY = 41
@@ -1129,6 +1668,10 @@ class ZogyImagePsfMatchTask(ImagePsfMatchTask):
         A `lsst.pipe.base.Struct` containing these fields:
         - subtractedExposure: subtracted Exposure
         - warpedExposure: templateExposure after warping to match scienceExposure (if doWarping true)
+        - matchedExposure: the PSF-matched template (if spatiallyVarying is false and
+          config.doMatchedTemplate is true)
+        - scoreExposure: the Scorr exposure (if spatiallyVarying and inImageSpace are false and
+          doPreConvolve is true)
         """
 
         mn1 = self._computeImageMean(templateExposure)
@@ -1184,8 +1727,16 @@ class ZogyImagePsfMatchTask(ImagePsfMatchTask):
             task = ZogyTask(scienceExposure=scienceExposure, templateExposure=templateExposure,
                             config=config)
             if not doPreConvolve:
-                results = task.computeDiffim(inImageSpace=inImageSpace)
+                results = task.computeDiffim(inImageSpace=inImageSpace,
+                                             returnMatchedTemplate=self.config.doMatchedTemplate)
+                results.matchedExposure = results.R
+            elif not inImageSpace:
+                # One pass yields the Scorr image and, if requested, the matched template
+                results = task.computeAll(inImageSpace=False, returnDiffim=False,
+                                          returnMatchedTemplate=self.config.doMatchedTemplate)
                 results.matchedExposure = results.R
+                results.scoreExposure = results.S
+                results.D = results.S
             else:
                 results = task.computeScorr(inImageSpace=inImageSpace)
                 results.D = results.S
@@ -9,6 +9,10 @@
  * @ingroup ip_diffim
  */
 
+#include <algorithm>
+#include <memory>
+#include <vector>
+
 #include "lsst/afw/math.h"
 #include "lsst/afw/image.h"
 #include "lsst/log/Log.h"
@@ -18,6 +22,7 @@
 #include "lsst/ip/diffim/ImageSubtract.h"
 #include "lsst/ip/diffim/KernelCandidate.h"
 #include "lsst/ip/diffim/AssessSpatialKernelVisitor.h"
+#include "lsst/ip/diffim/ParallelFor.h"
 
 #define DEBUG_IMAGES 0
 
@@ -65,7 +70,9 @@ namespace detail {
         _nRejected(0),
         _nProcessed(0),
         _useCoreStats(_policy.getBool("useCoreStats")),
-        _coreRadius(_policy.getInt("candidateCoreRadius"))
+        _coreRadius(_policy.getInt("candidateCoreRadius")),
+        _nThreads(1),
+        _queue()
     {};
 
     template<typename PixelT>
@@ -84,7 +91,67 @@ namespace detail {
                        "Cannot process candidate %d, continuing", kCandidate->getId());
             return;
         }
-        
+
+        if (_nThreads > 1) {
+            _queue.push_back(candidate);
+            return;
+        }
+        _processCandidate(candidate, *_spatialKernel, *_spatialBackground, _imstats,
+                          _nGood, _nRejected, _nProcessed);
+    }
+
+    /**
+     * @brief Assess the candidates queued by processCandidate() using the
+     * requested number of threads
+     *
+     * @note Evaluating a spatial kernel or background changes its internal
+     * state, so each thread works with its own clones of the models and its
+     * own ImageStatistics.  The counts are summed over the candidates in the
+     * order they were visited.
+     */
+    template<typename PixelT>
+    void AssessSpatialKernelVisitor<PixelT>::processQueuedCandidates() {
+        int const nCandidates = _queue.size();
+        int const nWorkers = std::max(1, std::min(_nThreads, nCandidates));
+        std::vector<std::shared_ptr<afwMath::Kernel> > spatialKernels;
+        std::vector<afwMath::Kernel::SpatialFunctionPtr> spatialBackgrounds;
+        for (int thread = 0; thread < nWorkers; ++thread) {
+            spatialKernels.push_back(_spatialKernel->clone());
+            spatialBackgrounds.push_back(_spatialBackground->clone());
+        }
+        std::vector<ImageStatistics<PixelT> > imstats(nWorkers, ImageStatistics<PixelT>(_policy));
+        std::vector<int> nGood(nCandidates, 0);
+        std::vector<int> nRejected(nCandidates, 0);
+        std::vector<int> nProcessed(nCandidates, 0);
+
+        LOGL_DEBUG("TRACE2.ip.diffim.AssessSpatialKernelVisitor.processQueuedCandidates",
+                   "Assessing %d candidates with %d threads", nCandidates, nWorkers);
+        parallelFor(nCandidates, nWorkers, [&](int i, int thread) {
+                _processCandidate(_queue[i], *spatialKernels[thread], *spatialBackgrounds[thread],
+                                  imstats[thread], nGood[i], nRejected[i], nProcessed[i]);
+            });
+
+        for (int i = 0; i < nCandidates; ++i) {
+            _nGood += nGood[i];
+            _nRejected += nRejected[i];
+            _nProcessed += nProcessed[i];
+        }
+        _queue.clear();
+    }
+
+    template<typename PixelT>
+    void AssessSpatialKernelVisitor<PixelT>::_processCandidate(
+        lsst::afw::math::SpatialCellCandidate *candidate,
+        lsst::afw::math::Kernel &spatialKernel,
+        lsst::afw::math::Kernel::SpatialFunction const &spatialBackground,
+        ImageStatistics<PixelT> &imstats,
+        int &nGood,
+        int &nRejected,
+        int &nProcessed
+        ) {
+
+        KernelCandidate<PixelT> *kCandidate = dynamic_cast<KernelCandidate<PixelT> *>(candidate);
+
         LOGL_DEBUG("TRACE1.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                    "Processing candidate %d", kCandidate->getId());
 
@@ -93,14 +160,14 @@ namespace detail {
            Davis crew.  I need a "local" version of the spatially varying
            Kernel
         */
-        afwImage::Image<double> kImage(_spatialKernel->getDimensions());
-        double kSum = _spatialKernel->computeImage(kImage, false, 
+        afwImage::Image<double> kImage(spatialKernel.getDimensions());
+        double kSum = spatialKernel.computeImage(kImage, false, 
                                                    kCandidate->getXCenter(), kCandidate->getYCenter());
         std::shared_ptr<afwMath::Kernel>
             kernelPtr(new afwMath::FixedKernel(kImage));
         /* </hack> */
         
-        double background = (*_spatialBackground)(kCandidate->getXCenter(), kCandidate->getYCenter());
+        double background = spatialBackground(kCandidate->getXCenter(), kCandidate->getYCenter());
         
         MaskedImageT diffim = kCandidate->getDifferenceImage(kernelPtr, background);
 
@@ -112,9 +179,9 @@ namespace detail {
         /* Official resids */
         try {
             if (_useCoreStats) 
-                _imstats.apply(diffim, _coreRadius);
+                imstats.apply(diffim, _coreRadius);
             else
-                _imstats.apply(diffim);
+                imstats.apply(diffim);
         } catch (pexExcept::Exception& e) {
             LOGL_DEBUG("TRACE2.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                        "Unable to calculate imstats for Candidate %d", kCandidate->getId());
@@ -122,10 +189,10 @@ namespace detail {
             return;
         }
 
-        _nProcessed += 1;
+        nProcessed += 1;
         
         LOGL_DEBUG("TRACE4.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
-                   "Chi2 = %.3f", _imstats.getVariance());
+                   "Chi2 = %.3f", imstats.getVariance());
         LOGL_DEBUG("TRACE4.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                    "X = %.2f Y = %.2f",
                    kCandidate->getXCenter(),
@@ -137,58 +204,58 @@ namespace detail {
         LOGL_DEBUG("TRACE2.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                    "Candidate %d resids = %.3f +/- %.3f sigma (%d pix)",
                    kCandidate->getId(),
-                   _imstats.getMean(),
-                   _imstats.getRms(),
-                   _imstats.getNpix());
+                   imstats.getMean(),
+                   imstats.getRms(),
+                   imstats.getNpix());
         
-        bool meanIsNan = std::isnan(_imstats.getMean());
-        bool rmsIsNan  = std::isnan(_imstats.getRms());
+        bool meanIsNan = std::isnan(imstats.getMean());
+        bool rmsIsNan  = std::isnan(imstats.getRms());
         if (meanIsNan || rmsIsNan) {
             kCandidate->setStatus(afwMath::SpatialCellCandidate::BAD);
             LOGL_DEBUG("TRACE3.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                        "Rejecting candidate %d, encountered NaN",
                        kCandidate->getId());
-            _nRejected += 1;
+            nRejected += 1;
             return;
         }
         
         if (_policy.getBool("spatialKernelClipping")) {            
-            if (fabs(_imstats.getMean()) > _policy.getDouble("candidateResidualMeanMax")) {
+            if (fabs(imstats.getMean()) > _policy.getDouble("candidateResidualMeanMax")) {
                 kCandidate->setStatus(afwMath::SpatialCellCandidate::BAD);
                 LOGL_DEBUG("TRACE3.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                            "Rejecting candidate %d; bad mean residual : |%.3f| > %.3f",
                            kCandidate->getId(),
-                           _imstats.getMean(),
+                           imstats.getMean(),
                            _policy.getDouble("candidateResidualMeanMax"));
-                _nRejected += 1;
+                nRejected += 1;
             }
-            else if (_imstats.getRms() > _policy.getDouble("candidateResidualStdMax")) {
+            else if (imstats.getRms() > _policy.getDouble("candidateResidualStdMax")) {
                 kCandidate->setStatus(afwMath::SpatialCellCandidate::BAD);
                 LOGL_DEBUG("TRACE3.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                            "Rejecting candidate %d; bad residual rms : %.3f > %.3f",
                            kCandidate->getId(),
-                           _imstats.getRms(),
+                           imstats.getRms(),
                            _policy.getDouble("candidateResidualStdMax"));
-                _nRejected += 1;
+                nRejected += 1;
             }
             else {
                 kCandidate->setStatus(afwMath::SpatialCellCandidate::GOOD);
                 LOGL_DEBUG("TRACE3.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                            "Spatial kernel OK");
-                _nGood += 1;
+                nGood += 1;
             }
         }
         else {
             kCandidate->setStatus(afwMath::SpatialCellCandidate::GOOD);
             LOGL_DEBUG("TRACE5.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                        "Sigma clipping not enabled");
-            _nGood += 1;
+            nGood += 1;
         }
 
         /* Core resids for debugging */
         if (!(_useCoreStats)) {
             try {
-                _imstats.apply(diffim, _coreRadius);
+                imstats.apply(diffim, _coreRadius);
             } catch (pexExcept::Exception& e) {
                 LOGL_DEBUG("TRACE2.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                            "Unable to calculate core imstats for Candidate %d",
@@ -199,9 +266,9 @@ namespace detail {
             LOGL_DEBUG("TRACE3.ip.diffim.AssessSpatialKernelVisitor.processCandidate",
                        "Candidate %d core resids = %.3f +/- %.3f sigma (%d pix)",
                        kCandidate->getId(),
-                       _imstats.getMean(),
-                       _imstats.getRms(),
-                       _imstats.getNpix());
+                       imstats.getMean(),
+                       imstats.getRms(),
+                       imstats.getNpix());
         }
     }
 
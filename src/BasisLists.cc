@@ -64,11 +64,43 @@ namespace diffim {
         return kernelBasisList;
     }
     
+    AlardLuptonKernel::AlardLuptonKernel(
+        lsst::afw::image::Image<Pixel> const &image,
+        std::vector<double> const &xFactor,
+        std::vector<double> const &yFactor,
+        double scale,
+        double offset
+        ) :
+        afwMath::FixedKernel(image),
+        _xFactor(xFactor),
+        _yFactor(yFactor),
+        _scale(scale),
+        _offset(offset)
+    {
+        if ((static_cast<int>(xFactor.size()) != image.getWidth()) ||
+            (static_cast<int>(yFactor.size()) != image.getHeight())) {
+            throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+                              "Separable factors do not match the kernel dimensions");
+        }
+    }
+
+    std::shared_ptr<afwMath::Kernel> AlardLuptonKernel::clone() const {
+        afwImage::Image<Pixel> image(getDimensions());
+        (void)computeImage(image, false);
+        std::shared_ptr<afwMath::Kernel> retPtr(
+            new AlardLuptonKernel(image, _xFactor, _yFactor, _scale, _offset)
+            );
+        retPtr->setCtr(this->getCtr());
+        return retPtr;
+    }
+
    /** 
     * @brief Generate an Alard-Lupton basis set of Kernels.
     *
-    * @note Should consider implementing as SeparableKernels for additional speed,
-    * but this will make the normalization a bit more complicated
+    * @note The basis is renormalized as in renormalizeKernelList.  Each raw
+    * kernel (a Gaussian times a polynomial term) is separable, so it is built
+    * as the outer product of its x and y factors, and the factors and
+    * renormalization are stored in the returned AlardLuptonKernels.
     * 
     * @return Vector of Alard-Lupton Kernels.
     *
@@ -95,6 +127,7 @@ namespace diffim {
         }
         int fullWidth = 2 * halfWidth + 1;
         Image image(afwGeom::Extent2I(fullWidth, fullWidth));
+        Image image0(afwGeom::Extent2I(fullWidth, fullWidth));
         
         afwMath::KernelList kernelBasisList;
         for (int i = 0; i < nGauss; i++) {
@@ -106,43 +139,77 @@ namespace diffim {
 
             LOGL_DEBUG("TRACE1.ip.diffim.BasisLists.makeAlardLuptonBasisList",
                        "Gaussian %d : sigma %.2f degree %d", i, sig, deg);
+
+            /* 1-D Gaussian, normalized such that the 2-D outer product sums to 1 */
+            std::vector<double> gauss(fullWidth);
+            double gSum = 0.;
+            for (int u = -halfWidth; u <= halfWidth; u++) {
+                gauss[u + halfWidth] = std::exp(-0.5 * u * u / (sig * sig));
+                gSum += gauss[u + halfWidth];
+            }
+            for (int u = 0; u < fullWidth; u++) {
+                gauss[u] /= gSum;
+            }
             
-            afwMath::GaussianFunction2<Pixel> gaussian(sig, sig);
-            afwMath::AnalyticKernel kernel(fullWidth, fullWidth, gaussian);
-            afwMath::PolynomialFunction2<Pixel> polynomial(deg);
-            
-            for (int j = 0, n = 0; j <= deg; j++) {
-                for (int k = 0; k <= (deg - j); k++, n++) {
-                    /* for 0th order term, skip polynomial */
-                    (void)kernel.computeImage(image, true);
-                    if (n == 0) {
-                        std::shared_ptr<afwMath::Kernel> 
-                            kernelPtr(new afwMath::FixedKernel(image));
-                        kernelBasisList.push_back(kernelPtr);
-                        continue;
+            /* Polynomial terms in the order of afwMath::PolynomialFunction2 : 1, x, y, x^2, xy, y^2, ... */
+            for (int order = 0; order <= deg; order++) {
+                for (int yDeg = 0; yDeg <= order; yDeg++) {
+                    int xDeg = order - yDeg;
+
+                    /* Evaluate polynomial from -1 to 1 */
+                    std::vector<double> xFactor(gauss);
+                    std::vector<double> yFactor(gauss);
+                    for (int u = -halfWidth; u <= halfWidth; u++) {
+                        xFactor[u + halfWidth] *= std::pow(u / static_cast<double>(halfWidth), xDeg);
+                        yFactor[u + halfWidth] *= std::pow(u / static_cast<double>(halfWidth), yDeg);
                     }
-                    
-                    /* gaussian to be modified by this term in the polynomial */
-                    polynomial.setParameter(n, 1.);
-                    (void)kernel.computeImage(image, true);
-                    for (int y = 0, v = -halfWidth; y < image.getHeight(); y++, v++) {
-                        int u = -halfWidth;
-                        for (Image::xy_locator ptr = image.xy_at(0, y), 
-                                 end = image.xy_at(image.getWidth(), y); 
-                             ptr != end; ++ptr.x(), u++) {
-                            /* Evaluate from -1 to 1 */
-                            *ptr  = *ptr * polynomial(u/static_cast<double>(halfWidth), 
-                                                      v/static_cast<double>(halfWidth));
+
+                    double kSum = 0.;
+                    for (int y = 0; y < image.getHeight(); y++) {
+                        Image::x_iterator ptr = image.row_begin(y);
+                        for (int x = 0; x < image.getWidth(); x++, ++ptr) {
+                            *ptr = xFactor[x] * yFactor[y];
+                            kSum += *ptr;
                         }
                     }
+
+                    /* Renormalize as in renormalizeKernelList */
+                    double scale = 1.;
+                    double offset = 0.;
+                    if (kernelBasisList.empty()) {
+                        /* First kernel is normalized to kSum 1. */
+                        scale = 1. / kSum;
+                        image *= scale;
+                        image0 = Image(image, true);
+                    } else {
+                        if (fabs(kSum) > std::numeric_limits<float>::epsilon()) {
+                            image /= kSum;
+                            image -= image0;
+                            scale = 1. / kSum;
+                            offset = 1.;
+                        }
+
+                        /* Rescale such that the inner product is 1 */
+                        double kNorm = 0.;
+                        for (int y = 0; y < image.getHeight(); y++) {
+                            for (Image::x_iterator ptr = image.row_begin(y), end = image.row_end(y);
+                                 ptr != end; ++ptr) {
+                                kNorm += *ptr * *ptr;
+                            }
+                        }
+                        kNorm = std::sqrt(kNorm);
+                        image /= kNorm;
+                        scale /= kNorm;
+                        offset /= kNorm;
+                    }
+
                     std::shared_ptr<afwMath::Kernel> 
-                        kernelPtr(new afwMath::FixedKernel(image));
+                        kernelPtr(new AlardLuptonKernel(image, xFactor, yFactor, scale, offset));
                     kernelBasisList.push_back(kernelPtr);
-                    polynomial.setParameter(n, 0.);
                 }
             }
         }
-        return renormalizeKernelList(kernelBasisList);
+        return kernelBasisList;
     }
     
     
@@ -9,7 +9,9 @@
  * @ingroup ip_diffim
  */
 
+#include <algorithm>
 #include <memory>
+#include <vector>
 #include "Eigen/Core"
 
 #include "lsst/afw/math.h"
@@ -21,6 +23,7 @@
 #include "lsst/ip/diffim/ImageSubtract.h"
 #include "lsst/ip/diffim/KernelCandidate.h"
 #include "lsst/ip/diffim/BuildSingleKernelVisitor.h"
+#include "lsst/ip/diffim/ParallelFor.h"
 
 #define DEBUG_MATRIX 0
 
@@ -100,7 +103,9 @@ namespace detail {
         _nProcessed(0),
         _useRegularization(false),
         _useCoreStats(_policy.getBool("useCoreStats")),
-        _coreRadius(_policy.getInt("candidateCoreRadius"))
+        _coreRadius(_policy.getInt("candidateCoreRadius")),
+        _nThreads(1),
+        _queue()
     {};
 
     template<typename PixelT>
@@ -120,7 +125,9 @@ namespace detail {
         _nProcessed(0),
         _useRegularization(true),
         _useCoreStats(_policy.getBool("useCoreStats")),
-        _coreRadius(_policy.getInt("candidateCoreRadius"))
+        _coreRadius(_policy.getInt("candidateCoreRadius")),
+        _nThreads(1),
+        _queue()
     {};
 
     
@@ -142,7 +149,52 @@ namespace detail {
         if (_skipBuilt and kCandidate->isInitialized()) {
             return;
         }
-        
+
+        if (_nThreads > 1) {
+            _queue.push_back(candidate);
+            return;
+        }
+        _processCandidate(candidate, _imstats, _nRejected, _nProcessed);
+    }
+
+    /**
+     * @brief Build the candidates queued by processCandidate() using the
+     * requested number of threads
+     *
+     * @note Each thread has its own ImageStatistics; the rejection counts
+     * are summed over the candidates in the order they were visited.
+     */
+    template<typename PixelT>
+    void BuildSingleKernelVisitor<PixelT>::processQueuedCandidates() {
+        int const nCandidates = _queue.size();
+        std::vector<ImageStatistics<PixelT> > imstats(std::max(1, _nThreads), ImageStatistics<PixelT>(_policy));
+        std::vector<int> nRejected(nCandidates, 0);
+        std::vector<int> nProcessed(nCandidates, 0);
+
+        LOGL_DEBUG("TRACE2.ip.diffim.BuildSingleKernelVisitor.processQueuedCandidates",
+                   "Building %d candidates with %d threads", nCandidates, _nThreads);
+        parallelFor(nCandidates, _nThreads, [&](int i, int thread) {
+                _processCandidate(_queue[i], imstats[thread], nRejected[i], nProcessed[i]);
+            });
+
+        for (int i = 0; i < nCandidates; ++i) {
+            _nRejected += nRejected[i];
+            _nProcessed += nProcessed[i];
+        }
+        _queue.clear();
+    }
+
+    template<typename PixelT>
+    void BuildSingleKernelVisitor<PixelT>::_processCandidate(
+        lsst::afw::math::SpatialCellCandidate *candidate,
+        ImageStatistics<PixelT> &imstats,
+        int &nRejected,
+        int &nProcessed
+        ) {
+
+        ipDiffim::KernelCandidate<PixelT> *kCandidate = 
+            dynamic_cast<ipDiffim::KernelCandidate<PixelT> *>(candidate);
+
         LOGL_DEBUG("TRACE1.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                    "Processing candidate %d", kCandidate->getId());
         LOGL_DEBUG("TRACE4.ip.diffim.BuildSingleKernelVisitor.processCandidate",
@@ -163,7 +215,7 @@ namespace detail {
                        "Unable to process candidate %d; exception caught (%s)",
                        kCandidate->getId(),
                        e.what());
-            _nRejected += 1;
+            nRejected += 1;
             return;
         } 
 
@@ -171,7 +223,7 @@ namespace detail {
             LOGL_DEBUG("TRACE3.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                        "Candidate %d Returned BAD upon build, exiting",
                        kCandidate->getId());
-            _nRejected += 1;
+            nRejected += 1;
             return;
         }
             
@@ -183,18 +235,18 @@ namespace detail {
         MaskedImageT diffim = kCandidate->getDifferenceImage(ipDiffim::KernelCandidate<PixelT>::RECENT);
         try {
             if (_useCoreStats) 
-                _imstats.apply(diffim, _coreRadius);
+                imstats.apply(diffim, _coreRadius);
             else
-                _imstats.apply(diffim);
+                imstats.apply(diffim);
         } catch (pexExcept::Exception& e) {
             LOGL_DEBUG("TRACE2.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                        "Unable to calculate imstats for Candidate %d", kCandidate->getId());
             kCandidate->setStatus(afwMath::SpatialCellCandidate::BAD);
             return;
         }
-        _nProcessed += 1;
+        nProcessed += 1;
 
-        kCandidate->setChi2(_imstats.getVariance());
+        kCandidate->setChi2(imstats.getVariance());
         
         /* When using a Pca basis, we don't reset the kernel or background,
            so we need to evaluate these locally for the Trace */
@@ -210,39 +262,39 @@ namespace detail {
         LOGL_DEBUG("TRACE2.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                    "Candidate %d resids = %.3f +/- %.3f sigma (%d pix)",
                    kCandidate->getId(),
-                   _imstats.getMean(),
-                   _imstats.getRms(),
-                   _imstats.getNpix());
+                   imstats.getMean(),
+                   imstats.getRms(),
+                   imstats.getNpix());
         
-        bool meanIsNan = std::isnan(_imstats.getMean());
-        bool rmsIsNan  = std::isnan(_imstats.getRms());
+        bool meanIsNan = std::isnan(imstats.getMean());
+        bool rmsIsNan  = std::isnan(imstats.getRms());
         if (meanIsNan || rmsIsNan) {
             kCandidate->setStatus(afwMath::SpatialCellCandidate::BAD);
             LOGL_DEBUG("TRACE3.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                        "Rejecting candidate %d, encountered NaN",
                        kCandidate->getId());
-            _nRejected += 1;
+            nRejected += 1;
             return;
         }
         
         if (_policy.getBool("singleKernelClipping")) {
-            if (fabs(_imstats.getMean()) > _policy.getDouble("candidateResidualMeanMax")) {
+            if (fabs(imstats.getMean()) > _policy.getDouble("candidateResidualMeanMax")) {
                 kCandidate->setStatus(afwMath::SpatialCellCandidate::BAD);
                 LOGL_DEBUG("TRACE3.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                            "Rejecting candidate %d; bad mean residual : |%.3f| > %.3f",
                            kCandidate->getId(),
-                           _imstats.getMean(),
+                           imstats.getMean(),
                            _policy.getDouble("candidateResidualMeanMax"));
-                _nRejected += 1;
+                nRejected += 1;
             }
-            else if (_imstats.getRms() > _policy.getDouble("candidateResidualStdMax")) {
+            else if (imstats.getRms() > _policy.getDouble("candidateResidualStdMax")) {
                 kCandidate->setStatus(afwMath::SpatialCellCandidate::BAD);
                 LOGL_DEBUG("TRACE3.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                            "Rejecting candidate %d; bad residual rms : %.3f > %.3f",
                            kCandidate->getId(),
-                           _imstats.getRms(),
+                           imstats.getRms(),
                            _policy.getDouble("candidateResidualStdMax"));
-                _nRejected += 1;
+                nRejected += 1;
             }
             else {
                 kCandidate->setStatus(afwMath::SpatialCellCandidate::GOOD);
@@ -259,7 +311,7 @@ namespace detail {
         /* Core resids for debugging */
         if (!(_useCoreStats)) {
             try {
-                _imstats.apply(diffim, _coreRadius);
+                imstats.apply(diffim, _coreRadius);
             } catch (pexExcept::Exception& e) {
                 LOGL_DEBUG("TRACE2.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                            "Unable to calculate core imstats for Candidate %d",
@@ -270,9 +322,9 @@ namespace detail {
             LOGL_DEBUG("TRACE3.ip.diffim.BuildSingleKernelVisitor.processCandidate",
                        "Candidate %d core resids = %.3f +/- %.3f sigma (%d pix)",
                        kCandidate->getId(),
-                       _imstats.getMean(),
-                       _imstats.getRms(),
-                       _imstats.getNpix());
+                       imstats.getMean(),
+                       imstats.getRms(),
+                       imstats.getNpix());
         }
         
     }
@@ -9,7 +9,9 @@
  * @ingroup ip_diffim
  */
 
+#include <map>
 #include <memory>
+#include <set>
 #include "boost/timer.hpp" 
 
 #include "Eigen/Core"
@@ -77,7 +79,9 @@ namespace detail {
         ) :
         afwMath::CandidateVisitor(),
         _kernelSolution(),
-        _nCandidates(0) 
+        _nCandidates(0),
+        _constraints(),
+        _visited()
     {
         int spatialKernelOrder = policy.getInt("spatialKernelOrder");
         afwMath::Kernel::SpatialFunctionPtr spatialKernelFunction;
@@ -136,25 +140,63 @@ namespace detail {
         LOGL_DEBUG("TRACE5.ip.diffim.BuildSpatialKernelVisitor.processCandidate",
                    "Processing candidate %d", kCandidate->getId());
         _nCandidates += 1;
+        _visited.insert(kCandidate->getId());
 
         /* 
            Build the spatial kernel from the most recent fit, e.g. if its Pca
            you want to build a spatial model on the Pca basis, not original
            basis 
         */
+        std::shared_ptr<StaticKernelSolution<PixelT> > kernelSolution =
+            kCandidate->getKernelSolution(KernelCandidate<PixelT>::RECENT);
+
+        typename std::map<int, Constraint>::iterator citer = _constraints.find(kCandidate->getId());
+        if (citer != _constraints.end()) {
+            if (citer->second.second == kernelSolution) {
+                /* Already in the spatial solution */
+                return;
+            }
+            /* Candidate has been refit since it was added */
+            _kernelSolution->removeConstraint(citer->second.first.getX(),
+                                              citer->second.first.getY(),
+                                              citer->second.second->getM(),
+                                              citer->second.second->getB());
+            _constraints.erase(citer);
+        }
+
         _kernelSolution->addConstraint(kCandidate->getXCenter(),
                                        kCandidate->getYCenter(),
-                                       kCandidate->getKernelSolution(
-                                           KernelCandidate<PixelT>::RECENT
-                                           )->getM(),
-                                       kCandidate->getKernelSolution(
-                                           KernelCandidate<PixelT>::RECENT
-                                           )->getB());
-        
+                                       kernelSolution->getM(),
+                                       kernelSolution->getB());
+        _constraints[kCandidate->getId()] = Constraint(
+            afwGeom::Point2D(kCandidate->getXCenter(), kCandidate->getYCenter()), kernelSolution);
     }
 
+    /**
+     * @note Candidates added on a previous visit that were not visited since
+     * the last reset() (e.g. because they were rejected) are removed from the
+     * spatial solution first, so the visitor can be reused across rejection
+     * iterations at a cost proportional to the number of changed candidates.
+     */
     template<typename PixelT>
     void BuildSpatialKernelVisitor<PixelT>::solveLinearEquation() {
+        int nRemoved = 0;
+        for (typename std::map<int, Constraint>::iterator citer = _constraints.begin();
+             citer != _constraints.end(); ) {
+            if (_visited.count(citer->first) == 0) {
+                _kernelSolution->removeConstraint(citer->second.first.getX(),
+                                                  citer->second.first.getY(),
+                                                  citer->second.second->getM(),
+                                                  citer->second.second->getB());
+                citer = _constraints.erase(citer);
+                nRemoved += 1;
+            } else {
+                ++citer;
+            }
+        }
+        LOGL_DEBUG("TRACE4.ip.diffim.BuildSpatialKernelVisitor.solveLinearEquation",
+                   "Solving with %d candidates; %d removed since the previous solution",
+                   static_cast<int>(_constraints.size()), nRemoved);
         _kernelSolution->solve();
     }
 
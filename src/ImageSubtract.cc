@@ -99,23 +99,86 @@ Eigen::MatrixXi maskToEigenMatrix(
 }
     
 
+namespace {
+
+    /* Background at a position, for a constant or a spatially varying background */
+    inline double backgroundAt(double background, double, double) {
+        return background;
+    }
+
+    inline double backgroundAt(afwMath::Function2<double> const &background, double x, double y) {
+        return background(x, y);
+    }
+
+    /*
+     * Turn the convolved template held in differenceImage into the difference
+     * image in a single pass: add the background, subtract the science image
+     * and optionally invert, while propagating the mask and variance planes.
+     * If combinePlanes is false the convolved template has no mask or variance
+     * of its own and those of the science image are copied.
+     */
+    template <typename PixelT, typename BackgroundT>
+    void subtractConvolvedTemplate(
+        afwImage::MaskedImage<PixelT> &differenceImage,
+        afwImage::MaskedImage<PixelT> const &scienceMaskedImage,
+        BackgroundT background,
+        bool invert,
+        bool combinePlanes
+        ) {
+        typedef typename afwImage::MaskedImage<PixelT>::x_iterator x_iterator;
+        double const sign = invert ? -1.0 : 1.0;
+        /* Background functions are evaluated in parent coordinates, as by Image::operator+= */
+        int const x0 = differenceImage.getX0();
+        int const y0 = differenceImage.getY0();
+
+        for (int y = 0; y != differenceImage.getHeight(); ++y) {
+            double const yPos = y + y0;
+            double xPos = x0;
+            x_iterator sPtr = scienceMaskedImage.row_begin(y);
+            for (x_iterator dPtr = differenceImage.row_begin(y), end = differenceImage.row_end(y);
+                 dPtr != end; ++dPtr, ++sPtr, xPos += 1.0) {
+                dPtr.image() = sign * (dPtr.image() + backgroundAt(background, xPos, yPos) - sPtr.image());
+                if (combinePlanes) {
+                    dPtr.mask() |= sPtr.mask();
+                    dPtr.variance() += sPtr.variance();
+                } else {
+                    dPtr.mask() = sPtr.mask();
+                    dPtr.variance() = sPtr.variance();
+                }
+            }
+        }
+    }
+
+    template <typename PixelT>
+    void checkDifferenceDimensions(
+        afwImage::MaskedImage<PixelT> const &differenceImage,
+        afwImage::MaskedImage<PixelT> const &scienceMaskedImage,
+        afwGeom::Extent2I const &templateDimensions
+        ) {
+        if ((differenceImage.getDimensions() != templateDimensions) ||
+            (scienceMaskedImage.getDimensions() != templateDimensions)) {
+            throw LSST_EXCEPT(pexExcept::LengthError,
+                              "Template, science and difference images must have the same dimensions");
+        }
+    }
+
+} // anonymous namespace
+
 /** 
  * @brief Implement fundamental difference imaging step of convolution and
- * subtraction : D = I - (K*T + bg) where * denotes convolution
+ * subtraction : D = I - (K*T + bg) where * denotes convolution, writing D
+ * into a caller supplied MaskedImage
  * 
- * @note If you convolve the science image, D = (K*I + bg) - T, set invert=False
- *
- * @note The template is taken to be an MaskedImage; this takes c 1.6 times as long
- * as using an Image.
- *
- * @note Instantiated such that background can be a double or Function2D
- *
- * @return Difference image
+ * @note The template is convolved directly into differenceImage, which is
+ * then turned into the difference in a single pass over the pixels; no
+ * temporary image is made.  differenceImage must have the dimensions of the
+ * template and must not share pixels with either input.
  *
  * @ingroup diffim
  */
 template <typename PixelT, typename BackgroundT>
-afwImage::MaskedImage<PixelT> convolveAndSubtract(
+void convolveAndSubtract(
+    lsst::afw::image::MaskedImage<PixelT> &differenceImage,           ///< Output difference image
     lsst::afw::image::MaskedImage<PixelT> const &templateImage,      ///< Image T to convolve with Kernel
     lsst::afw::image::MaskedImage<PixelT> const &scienceMaskedImage, ///< Image I to subtract T from
     lsst::afw::math::Kernel const &convolutionKernel,                ///< PSF-matching Kernel used
@@ -126,47 +189,31 @@ afwImage::MaskedImage<PixelT> convolveAndSubtract(
     boost::timer t;
     t.restart();
 
-    afwImage::MaskedImage<PixelT> convolvedMaskedImage(templateImage.getDimensions());
+    checkDifferenceDimensions(differenceImage, scienceMaskedImage, templateImage.getDimensions());
     afwMath::ConvolutionControl convolutionControl = afwMath::ConvolutionControl();
     convolutionControl.setDoNormalize(false);
-    afwMath::convolve(convolvedMaskedImage, templateImage, 
+    afwMath::convolve(differenceImage, templateImage, 
                       convolutionKernel, convolutionControl);
     
-    /* Add in background */
-    *(convolvedMaskedImage.getImage()) += background;
-    
-    /* Do actual subtraction */
-    convolvedMaskedImage -= scienceMaskedImage;
-
-    /* Invert */
-    if (invert) {
-        convolvedMaskedImage *= -1.0;
-    }
+    subtractConvolvedTemplate<PixelT, BackgroundT>(differenceImage, scienceMaskedImage, background, invert, true);
 
     double time = t.elapsed();
     LOGL_DEBUG("TRACE4.ip.diffim.convolveAndSubtract",
                "Total compute time to convolve and subtract : %.2f s", time);
-
-    return convolvedMaskedImage;
 }
 
 /** 
  * @brief Implement fundamental difference imaging step of convolution and
- * subtraction : D = I - (K.x.T + bg)
+ * subtraction : D = I - (K.x.T + bg), writing D into a caller supplied MaskedImage
  *
  * @note The template is taken to be an Image, not a MaskedImage; it therefore
  * has neither variance nor bad pixels
  *
- * @note If you convolve the science image, D = (K*I + bg) - T, set invert=False
- * 
- * @note Instantiated such that background can be a double or Function2D
- *
- * @return Difference image
- *
  * @ingroup diffim
  */
 template <typename PixelT, typename BackgroundT>
-afwImage::MaskedImage<PixelT> convolveAndSubtract(
+void convolveAndSubtract(
+    lsst::afw::image::MaskedImage<PixelT> &differenceImage,           ///< Output difference image
     lsst::afw::image::Image<PixelT> const &templateImage,            ///< Image T to convolve with Kernel
     lsst::afw::image::MaskedImage<PixelT> const &scienceMaskedImage, ///< Image I to subtract T from
     lsst::afw::math::Kernel const &convolutionKernel,                ///< PSF-matching Kernel used
@@ -177,30 +224,77 @@ afwImage::MaskedImage<PixelT> convolveAndSubtract(
     boost::timer t;
     t.restart();
 
-    afwImage::MaskedImage<PixelT> convolvedMaskedImage(templateImage.getDimensions());
+    checkDifferenceDimensions(differenceImage, scienceMaskedImage, templateImage.getDimensions());
     afwMath::ConvolutionControl convolutionControl = afwMath::ConvolutionControl();
     convolutionControl.setDoNormalize(false);
-    afwMath::convolve(*convolvedMaskedImage.getImage(), templateImage, 
+    afwMath::convolve(*differenceImage.getImage(), templateImage, 
                       convolutionKernel, convolutionControl);
+    differenceImage.setXY0(differenceImage.getImage()->getXY0());
     
-    /* Add in background */
-    *(convolvedMaskedImage.getImage()) += background;
-    
-    /* Do actual subtraction */
-    *convolvedMaskedImage.getImage() -= *scienceMaskedImage.getImage();
-
-    /* Invert */
-    if (invert) {
-        *convolvedMaskedImage.getImage() *= -1.0;
-    }
-    convolvedMaskedImage.getMask()->assign(*scienceMaskedImage.getMask());
-    convolvedMaskedImage.getVariance()->assign(*scienceMaskedImage.getVariance());
+    subtractConvolvedTemplate<PixelT, BackgroundT>(differenceImage, scienceMaskedImage, background, invert,
+                                                  false);
     
     double time = t.elapsed();
     LOGL_DEBUG("TRACE4.ip.diffim.convolveAndSubtract",
                "Total compute time to convolve and subtract : %.2f s", time);
+}
+
+/** 
+ * @brief Implement fundamental difference imaging step of convolution and
+ * subtraction : D = I - (K*T + bg) where * denotes convolution
+ * 
+ * @note If you convolve the science image, D = (K*I + bg) - T, set invert=False
+ *
+ * @note The template is taken to be an MaskedImage; this takes c 1.6 times as long
+ * as using an Image.
+ *
+ * @note Instantiated such that background can be a double or Function2D
+ *
+ * @return Difference image
+ *
+ * @ingroup diffim
+ */
+template <typename PixelT, typename BackgroundT>
+afwImage::MaskedImage<PixelT> convolveAndSubtract(
+    lsst::afw::image::MaskedImage<PixelT> const &templateImage,      ///< Image T to convolve with Kernel
+    lsst::afw::image::MaskedImage<PixelT> const &scienceMaskedImage, ///< Image I to subtract T from
+    lsst::afw::math::Kernel const &convolutionKernel,                ///< PSF-matching Kernel used
+    BackgroundT background,                                  ///< Differential background 
+    bool invert                                              ///< Invert the output difference image
+    ) {
+    afwImage::MaskedImage<PixelT> differenceImage(templateImage.getDimensions());
+    convolveAndSubtract<PixelT, BackgroundT>(differenceImage, templateImage, scienceMaskedImage,
+                                             convolutionKernel, background, invert);
+    return differenceImage;
+}
 
-    return convolvedMaskedImage;
+/** 
+ * @brief Implement fundamental difference imaging step of convolution and
+ * subtraction : D = I - (K.x.T + bg)
+ *
+ * @note The template is taken to be an Image, not a MaskedImage; it therefore
+ * has neither variance nor bad pixels
+ *
+ * @note If you convolve the science image, D = (K*I + bg) - T, set invert=False
+ * 
+ * @note Instantiated such that background can be a double or Function2D
+ *
+ * @return Difference image
+ *
+ * @ingroup diffim
+ */
+template <typename PixelT, typename BackgroundT>
+afwImage::MaskedImage<PixelT> convolveAndSubtract(
+    lsst::afw::image::Image<PixelT> const &templateImage,            ///< Image T to convolve with Kernel
+    lsst::afw::image::MaskedImage<PixelT> const &scienceMaskedImage, ///< Image I to subtract T from
+    lsst::afw::math::Kernel const &convolutionKernel,                ///< PSF-matching Kernel used
+    BackgroundT background,                                  ///< Differential background 
+    bool invert                                              ///< Invert the output difference image
+    ) {
+    afwImage::MaskedImage<PixelT> differenceImage(templateImage.getDimensions());
+    convolveAndSubtract<PixelT, BackgroundT>(differenceImage, templateImage, scienceMaskedImage,
+                                             convolutionKernel, background, invert);
+    return differenceImage;
 }
 
 /***********************************************************************************************************/
@@ -236,6 +330,24 @@ template class ImageStatistics<double>;
         lsst::afw::math::Kernel const& convolutionKernel, \
         lsst::afw::math::Function2<double> const& backgroundFunction, \
         bool invert); \
+    \
+    template \
+    void convolveAndSubtract( \
+        lsst::afw::image::MaskedImage<TYPE>& differenceImage, \
+        lsst::afw::image::TEMPLATE_IMAGE_T<TYPE> const& templateImage, \
+        lsst::afw::image::MaskedImage<TYPE> const& scienceMaskedImage, \
+        lsst::afw::math::Kernel const& convolutionKernel, \
+        double background, \
+        bool invert); \
+    \
+    template \
+    void convolveAndSubtract( \
+        lsst::afw::image::MaskedImage<TYPE>& differenceImage, \
+        lsst::afw::image::TEMPLATE_IMAGE_T<TYPE> const& templateImage, \
+        lsst::afw::image::MaskedImage<TYPE> const& scienceMaskedImage, \
+        lsst::afw::math::Kernel const& convolutionKernel, \
+        lsst::afw::math::Function2<double> const& backgroundFunction, \
+        bool invert); \
 
 #define INSTANTIATE_convolveAndSubtract(TYPE) \
 p_INSTANTIATE_convolveAndSubtract(Image, TYPE) \
@@ -138,14 +138,21 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
     bool checkConditionNumber = _policy.getBool("checkConditionNumber");
     double maxConditionNumber = _policy.getDouble("maxConditionNumber");
     std::string conditionNumberType = _policy.getString("conditionNumberType");
+    bool storeDesignMatrix = _policy.getBool("storeDesignMatrix");
+    KernelSolution::KernelSolvedBy solveMethod = KernelSolution::parseSolveMethod(
+        _policy.getString("solveMethod"));
     KernelSolution::ConditionNumberType ctype;
     if (conditionNumberType == "SVD") {
         ctype = KernelSolution::SVD;
     } else if (conditionNumberType == "EIGENVALUE") {
         ctype = KernelSolution::EIGENVALUE;
+    } else if (conditionNumberType == "ESTIMATE") {
+        ctype = KernelSolution::ESTIMATE;
     } else {
         throw LSST_EXCEPT(pexExcept::Exception, "conditionNumberType not recognized");
     }
+    /* The estimate comes out of the solve, so is checked afterwards */
+    bool checkBeforeSolve = checkConditionNumber && (ctype != KernelSolution::ESTIMATE);
 
     /* Do we have a regularization matrix?  If so use it */
     if (hMat.size() > 0) {
@@ -155,9 +162,10 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
         if (_isInitialized) {
             _kernelSolutionPca = std::shared_ptr<StaticKernelSolution<PixelT> >(
                     new RegularizedKernelSolution<PixelT>(basisList, _fitForBackground, hMat, _policy));
+            _kernelSolutionPca->setSolveMethod(solveMethod);
             _kernelSolutionPca->build(*(_templateMaskedImage->getImage()), *(_scienceMaskedImage->getImage()),
                                       *_varianceEstimate);
-            if (checkConditionNumber) {
+            if (checkBeforeSolve) {
                 if (_kernelSolutionPca->getConditionNumber(ctype) > maxConditionNumber) {
                     LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
                                "Candidate %d solution has bad condition number", this->getId());
@@ -169,9 +177,10 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
         } else {
             _kernelSolutionOrig = std::shared_ptr<StaticKernelSolution<PixelT> >(
                     new RegularizedKernelSolution<PixelT>(basisList, _fitForBackground, hMat, _policy));
+            _kernelSolutionOrig->setSolveMethod(solveMethod);
             _kernelSolutionOrig->build(*(_templateMaskedImage->getImage()),
                                        *(_scienceMaskedImage->getImage()), *_varianceEstimate);
-            if (checkConditionNumber) {
+            if (checkBeforeSolve) {
                 if (_kernelSolutionOrig->getConditionNumber(ctype) > maxConditionNumber) {
                     LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
                                "Candidate %d solution has bad condition number", this->getId());
@@ -187,9 +196,11 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
         if (_isInitialized) {
             _kernelSolutionPca = std::shared_ptr<StaticKernelSolution<PixelT> >(
                     new StaticKernelSolution<PixelT>(basisList, _fitForBackground));
+            _kernelSolutionPca->setStoreDesignMatrix(storeDesignMatrix);
+            _kernelSolutionPca->setSolveMethod(solveMethod);
             _kernelSolutionPca->build(*(_templateMaskedImage->getImage()), *(_scienceMaskedImage->getImage()),
                                       *_varianceEstimate);
-            if (checkConditionNumber) {
+            if (checkBeforeSolve) {
                 if (_kernelSolutionPca->getConditionNumber(ctype) > maxConditionNumber) {
                     LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
                                "Candidate %d solution has bad condition number", this->getId());
@@ -201,9 +212,11 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
         } else {
             _kernelSolutionOrig = std::shared_ptr<StaticKernelSolution<PixelT> >(
                     new StaticKernelSolution<PixelT>(basisList, _fitForBackground));
+            _kernelSolutionOrig->setStoreDesignMatrix(storeDesignMatrix);
+            _kernelSolutionOrig->setSolveMethod(solveMethod);
             _kernelSolutionOrig->build(*(_templateMaskedImage->getImage()),
                                        *(_scienceMaskedImage->getImage()), *_varianceEstimate);
-            if (checkConditionNumber) {
+            if (checkBeforeSolve) {
                 if (_kernelSolutionOrig->getConditionNumber(ctype) > maxConditionNumber) {
                     LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
                                "Candidate %d solution has bad condition number", this->getId());
@@ -214,6 +227,16 @@ void KernelCandidate<PixelT>::_buildKernelSolution(lsst::afw::math::KernelList c
             _kernelSolutionOrig->solve();
         }
     }
+
+    if (checkConditionNumber && (ctype == KernelSolution::ESTIMATE)) {
+        std::shared_ptr<StaticKernelSolution<PixelT> > solution =
+            _isInitialized ? _kernelSolutionPca : _kernelSolutionOrig;
+        if (solution->getConditionNumber(ctype) > maxConditionNumber) {
+            LOGL_DEBUG("TRACE4.ip.diffim.KernelCandidate",
+                       "Candidate %d solution has bad condition number", this->getId());
+            this->setStatus(afwMath::SpatialCellCandidate::BAD);
+        }
+    }
 }
 
 template <typename PixelT>
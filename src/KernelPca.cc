@@ -9,6 +9,8 @@
  * @ingroup ip_diffim
  */
 
+#include <vector>
+
 #include "lsst/afw/math.h"
 #include "lsst/afw/image.h"
 #include "lsst/log/Log.h"
@@ -16,6 +18,7 @@
 
 #include "lsst/ip/diffim/KernelCandidate.h"
 #include "lsst/ip/diffim/KernelPca.h"
+#include "lsst/ip/diffim/ParallelFor.h"
 
 namespace afwMath        = lsst::afw::math;
 namespace afwImage       = lsst::afw::image;
@@ -58,7 +61,9 @@ namespace detail {
         ) :
         afwMath::CandidateVisitor(),
         _imagePca(imagePca),
-        _mean() 
+        _mean(),
+        _nThreads(1),
+        _queue()
     {};
 
     template<typename PixelT>
@@ -93,6 +98,50 @@ namespace detail {
             throw LSST_EXCEPT(pexExcept::LogicError,
                               "Failed to cast SpatialCellCandidate to KernelCandidate");
         }
+
+        if (_nThreads > 1) {
+            _queue.push_back(candidate);
+            return;
+        }
+
+        PTR(ImageT) kImage = _makeKernelImage(candidate);
+        if (kImage) {
+            /* Tell imagePca they have the same weighting in the Pca */
+            _imagePca->addImage(kImage, 1.0);
+        }
+    }
+
+    /**
+     * @brief Make the kernel images of the candidates queued by
+     * processCandidate() using the requested number of threads
+     *
+     * @note The images are added to the Pca in the order the candidates were
+     * visited, so the result does not depend on the number of threads.
+     */
+    template<typename PixelT>
+    void KernelPcaVisitor<PixelT>::processQueuedCandidates() {
+        int const nCandidates = _queue.size();
+        std::vector<PTR(ImageT)> kImages(nCandidates);
+
+        LOGL_DEBUG("TRACE5.ip.diffim.KernelPcaVisitor.processQueuedCandidates",
+                   "Making %d kernel images with %d threads", nCandidates, _nThreads);
+        parallelFor(nCandidates, _nThreads, [&](int i, int) {
+                kImages[i] = _makeKernelImage(_queue[i]);
+            });
+
+        for (int i = 0; i < nCandidates; ++i) {
+            if (kImages[i]) {
+                _imagePca->addImage(kImages[i], 1.0);
+            }
+        }
+        _queue.clear();
+    }
+
+    template<typename PixelT>
+    PTR(typename KernelPcaVisitor<PixelT>::ImageT) KernelPcaVisitor<PixelT>::_makeKernelImage(
+        lsst::afw::math::SpatialCellCandidate *candidate
+        ) {
+        KernelCandidate<PixelT> *kCandidate = dynamic_cast<KernelCandidate<PixelT> *>(candidate);
         LOGL_DEBUG("TRACE5.ip.diffim.SetPcaImageVisitor.processCandidate",
                    "Processing candidate %d", kCandidate->getId());
         
@@ -102,10 +151,9 @@ namespace detail {
                 KernelCandidate<PixelT>::ORIG)->makeKernelImage();
             *kImage           /= kCandidate->getKernelSolution(
                 KernelCandidate<PixelT>::ORIG)->getKsum();
-            /* Tell imagePca they have the same weighting in the Pca */
-            _imagePca->addImage(kImage, 1.0);
+            return kImage;
         } catch(pexExcept::Exception &e) {
-            return;
+            return PTR(ImageT)();
         }
     }
 
@@ -13,6 +13,7 @@
 #include <algorithm>
 #include <limits>
 
+#include <map>
 #include <memory>
 #include "boost/timer.hpp"
 
@@ -30,6 +31,7 @@
 #include "lsst/log/Log.h"
 #include "lsst/pex/exceptions/Runtime.h"
 
+#include "lsst/ip/diffim/BasisLists.h"
 #include "lsst/ip/diffim/ImageSubtract.h"
 #include "lsst/ip/diffim/KernelSolution.h"
 
@@ -39,6 +41,9 @@
 #define DEBUG_MATRIX  0
 #define DEBUG_MATRIX2 0
 
+/* Approximate number of pixels (rows of C) per block when accumulating the normal equations */
+#define DESIGN_MATRIX_BLOCK_PIXELS 16384
+
 namespace afwDet         = lsst::afw::detection;
 namespace afwMath        = lsst::afw::math;
 namespace afwGeom        = lsst::afw::geom;
@@ -49,8 +54,8 @@ namespace lsst {
 namespace ip {
 namespace diffim {
 
-    /* Unique identifier for solution */
-    int KernelSolution::_SolutionId = 0;
+    /* Unique identifier for solution; atomic since candidates may be built in parallel */
+    std::atomic<int> KernelSolution::_SolutionId(0);
 
     KernelSolution::KernelSolution(
         Eigen::MatrixXd mMat,
@@ -62,6 +67,8 @@ namespace diffim {
         _bVec(bVec),
         _aVec(),
         _solvedBy(NONE),
+        _solveMethod(CHOLESKY_LLT),
+        _conditionEstimate(std::numeric_limits<double>::quiet_NaN()),
         _fitForBackground(fitForBackground)
     {};
 
@@ -73,6 +80,8 @@ namespace diffim {
         _bVec(),
         _aVec(),
         _solvedBy(NONE),
+        _solveMethod(CHOLESKY_LLT),
+        _conditionEstimate(std::numeric_limits<double>::quiet_NaN()),
         _fitForBackground(fitForBackground)
     {};
 
@@ -82,6 +91,8 @@ namespace diffim {
         _bVec(),
         _aVec(),
         _solvedBy(NONE),
+        _solveMethod(CHOLESKY_LLT),
+        _conditionEstimate(std::numeric_limits<double>::quiet_NaN()),
         _fitForBackground(true)
     {};
 
@@ -89,7 +100,33 @@ namespace diffim {
         solve(_mMat, _bVec);
     }
 
+    void KernelSolution::setSolveMethod(KernelSolvedBy solveMethod) {
+        if (solveMethod == NONE) {
+            throw LSST_EXCEPT(pexExcept::InvalidParameterError, "Solve method NONE is not a solver");
+        }
+        _solveMethod = solveMethod;
+    }
+
+    KernelSolution::KernelSolvedBy KernelSolution::parseSolveMethod(std::string const& solveMethod) {
+        if (solveMethod == "CHOLESKY_LLT") {
+            return CHOLESKY_LLT;
+        } else if (solveMethod == "CHOLESKY_LDLT") {
+            return CHOLESKY_LDLT;
+        } else if (solveMethod == "LU") {
+            return LU;
+        } else if (solveMethod == "EIGENVECTOR") {
+            return EIGENVECTOR;
+        }
+        throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+                          "solveMethod not recognized : " + solveMethod);
+    }
+
     double KernelSolution::getConditionNumber(ConditionNumberType conditionType) {
+        if ((conditionType == ESTIMATE) && (_solvedBy != NONE)) {
+            LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.getConditionNumber",
+                       "ESTIMATE from solve = %.3e", _conditionEstimate);
+            return _conditionEstimate;
+        }
         return getConditionNumber(_mMat, conditionType);
     }
 
@@ -117,10 +154,19 @@ namespace diffim {
             return (sMax / sMin);
             break;
             }
+        case ESTIMATE:
+            {
+            /* Hager/Higham estimate of ||M^-1||_1 from the factorization */
+            double cNumber = 1.0 / mMat.ldlt().rcond();
+            LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.getConditionNumber",
+                       "ESTIMATE = %.3e", cNumber);
+            return cNumber;
+            break;
+            }
         default:
             {
             throw LSST_EXCEPT(pexExcept::InvalidParameterError,
-                              "Undefined ConditionNumberType : only EIGENVALUE, SVD allowed.");
+                              "Undefined ConditionNumberType : only EIGENVALUE, SVD, ESTIMATE allowed.");
             break;
             }
         }
@@ -143,37 +189,92 @@ namespace diffim {
 
         LOGL_DEBUG("TRACE2.ip.diffim.KernelSolution.solve",
                    "Solving for kernel");
-		_solvedBy = LU;
-		Eigen::FullPivLU<Eigen::MatrixXd> lu(mMat);
-		if (lu.isInvertible()) {
-			aVec = lu.solve(bVec);
-		} else {
-			LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
-                                   "Unable to determine kernel via LU");
-			/* LAST RESORT */
-			try {
-
-				_solvedBy = EIGENVECTOR;
-				Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> eVecValues(mMat);
-				Eigen::MatrixXd const& rMat = eVecValues.eigenvectors();
-				Eigen::VectorXd eValues = eVecValues.eigenvalues();
-
-				for (int i = 0; i != eValues.rows(); ++i) {
-					if (eValues(i) != 0.0) {
-						eValues(i) = 1.0/eValues(i);
-					}
-				}
-
-				aVec = rMat * eValues.asDiagonal() * rMat.transpose() * bVec;
-			} catch (pexExcept::Exception& e) {
-
-				_solvedBy = NONE;
-				LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
-                                           "Unable to determine kernel via eigen-values");
-
-				throw LSST_EXCEPT(pexExcept::Exception, "Unable to determine kernel solution");
-			}
-		}
+
+        /* 
+           M is symmetric positive semi-definite, so try the cheap Cholesky
+           factorizations first and only fall back to LU and the eigenvector
+           pseudo-inverse when M is (numerically) singular.  The rcond()
+           estimates are cheap given the factorizations, and are kept for
+           ESTIMATE condition numbers.
+        */
+        double const minRcond = std::numeric_limits<double>::epsilon() * mMat.rows();
+        _solvedBy = NONE;
+
+        if (_solveMethod == CHOLESKY_LLT) {
+            Eigen::LLT<Eigen::MatrixXd> llt(mMat);
+            if (llt.info() == Eigen::Success) {
+                double rcond = llt.rcond();
+                if (rcond > minRcond) {
+                    _solvedBy = CHOLESKY_LLT;
+                    _conditionEstimate = 1.0 / rcond;
+                    aVec = llt.solve(bVec);
+                }
+            }
+            if (_solvedBy == NONE) {
+                LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
+                           "Unable to determine kernel via LLT");
+            }
+        }
+
+        if ((_solvedBy == NONE) &&
+            ((_solveMethod == CHOLESKY_LLT) || (_solveMethod == CHOLESKY_LDLT))) {
+            Eigen::LDLT<Eigen::MatrixXd> ldlt(mMat);
+            /* LDLT skips zero pivots when solving, so rcond() alone misses them */
+            Eigen::VectorXd dVec = ldlt.vectorD().cwiseAbs();
+            if ((ldlt.info() == Eigen::Success) && (dVec.minCoeff() > minRcond * dVec.maxCoeff())) {
+                double rcond = ldlt.rcond();
+                if (rcond > minRcond) {
+                    _solvedBy = CHOLESKY_LDLT;
+                    _conditionEstimate = 1.0 / rcond;
+                    aVec = ldlt.solve(bVec);
+                }
+            }
+            if (_solvedBy == NONE) {
+                LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
+                           "Unable to determine kernel via LDLT");
+            }
+        }
+
+        if ((_solvedBy == NONE) && (_solveMethod != EIGENVECTOR)) {
+            Eigen::FullPivLU<Eigen::MatrixXd> lu(mMat);
+            if (lu.isInvertible()) {
+                _solvedBy = LU;
+                _conditionEstimate = 1.0 / lu.rcond();
+                aVec = lu.solve(bVec);
+            } else {
+                LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
+                           "Unable to determine kernel via LU");
+            }
+        }
+
+        if (_solvedBy == NONE) {
+            /* LAST RESORT */
+            _conditionEstimate = std::numeric_limits<double>::infinity();
+            try {
+
+                _solvedBy = EIGENVECTOR;
+                Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> eVecValues(mMat);
+                Eigen::MatrixXd const& rMat = eVecValues.eigenvectors();
+                Eigen::VectorXd eValues = eVecValues.eigenvalues();
+
+                for (int i = 0; i != eValues.rows(); ++i) {
+                    if (eValues(i) != 0.0) {
+                        eValues(i) = 1.0/eValues(i);
+                    }
+                }
+
+                aVec = rMat * eValues.asDiagonal() * rMat.transpose() * bVec;
+            } catch (pexExcept::Exception& e) {
+
+                _solvedBy = NONE;
+                LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
+                           "Unable to determine kernel via eigen-values");
+
+                throw LSST_EXCEPT(pexExcept::Exception, "Unable to determine kernel solution");
+            }
+        }
+        LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
+                   "Solved by method %d", static_cast<int>(_solvedBy));
 
         double time = t.elapsed();
         LOGL_DEBUG("TRACE3.ip.diffim.KernelSolution.solve",
@@ -199,6 +300,7 @@ namespace diffim {
         _cMat(),
         _iVec(),
         _ivVec(),
+        _storeDesignMatrix(true),
         _kernel(),
         _background(0.0),
         _kSum(0.0)
@@ -323,71 +425,209 @@ namespace diffim {
         boost::timer t;
         t.restart();
 
-        /* Eigen representation of input images; only the pixels that are unconvolved in cimage below */
-        Eigen::MatrixXd eigenTemplate = imageToEigenMatrix(templateImage).block(startRow,
-                                                                                startCol,
-                                                                                endRow-startRow,
-                                                                                endCol-startCol);
-        Eigen::MatrixXd eigenScience = imageToEigenMatrix(scienceImage).block(startRow,
-                                                                              startCol,
-                                                                              endRow-startRow,
-                                                                              endCol-startCol);
-        Eigen::MatrixXd eigeniVariance = imageToEigenMatrix(varianceEstimate).block(
-    	    startRow, startCol, endRow-startRow, endCol-startCol
-    	).array().inverse().matrix();
+        /* Eigen representation of input images */
+        Eigen::MatrixXd eigenTemplateFull = imageToEigenMatrix(templateImage);
+        Eigen::MatrixXd eigenScienceFull = imageToEigenMatrix(scienceImage);
+        Eigen::MatrixXd eigeniVarianceFull = imageToEigenMatrix(varianceEstimate).array().inverse().matrix();
 
-        /* Resize into 1-D for later usage */
-        eigenTemplate.resize(eigenTemplate.rows()*eigenTemplate.cols(), 1);
-        eigenScience.resize(eigenScience.rows()*eigenScience.cols(), 1);
-        eigeniVariance.resize(eigeniVariance.rows()*eigeniVariance.cols(), 1);
+        int const nCols = endCol - startCol;
+        if (_storeDesignMatrix) {
+            /* Only the pixels that are unconvolved in the basis convolutions */
+            int const nRows = endRow - startRow;
+            Eigen::MatrixXd eigenScience = eigenScienceFull.block(startRow, startCol, nRows, nCols);
+            Eigen::MatrixXd eigeniVariance = eigeniVarianceFull.block(startRow, startCol, nRows, nCols);
 
-        /* Holds image convolved with basis function */
-        afwImage::Image<PixelT> cimage(templateImage.getDimensions());
+            /* Resize into 1-D for later usage */
+            eigenScience.resize(eigenScience.rows()*eigenScience.cols(), 1);
+            eigeniVariance.resize(eigeniVariance.rows()*eigeniVariance.cols(), 1);
 
-        /* Holds eigen representation of image convolved with all basis functions */
-        std::vector<Eigen::MatrixXd> convolvedEigenList(nKernelParameters);
+            /* Design matrix C; one column per basis (plus background) */
+            Eigen::MatrixXd cMat(nRows*nCols, nParameters);
+            _fillDesignMatrix(templateImage, eigenTemplateFull, basisList, startRow, nRows, startCol, nCols,
+                              cMat);
 
-        /* Iterators over convolved image list and basis list */
-        typename std::vector<Eigen::MatrixXd>::iterator eiter = convolvedEigenList.begin();
-        /* Create C_i in the formalism of Alard & Lupton */
-        for (kiter = basisList.begin(); kiter != basisList.end(); ++kiter, ++eiter) {
-            afwMath::convolve(cimage, templateImage, **kiter, false); /* cimage stores convolved image */
+            double time = t.elapsed();
+            LOGL_DEBUG("TRACE3.ip.diffim.StaticKernelSolution.build",
+                       "Total compute time to do basis convolutions : %.2f s", time);
+            t.restart();
 
-            Eigen::MatrixXd cMat = imageToEigenMatrix(cimage).block(startRow,
-                                                                    startCol,
-                                                                    endRow-startRow,
-                                                                    endCol-startCol);
-            cMat.resize(cMat.size(), 1);
-            *eiter = cMat;
+            /* Treat the last "image" as all 1's to do the background calculation. */
+            if (_fitForBackground)
+                cMat.col(nParameters-1).fill(1.);
 
+            _cMat = cMat;
+            _ivVec = eigeniVariance.col(0);
+            _iVec = eigenScience.col(0);
+
+            /* Make these outside of solve() so I can check condition number */
+            _mMat = _cMat.transpose() * (_ivVec.asDiagonal() * _cMat);
+            _bVec = _cMat.transpose() * (_ivVec.asDiagonal() * _iVec);
         }
+        else {
+            /* Accumulate M and b over blocks of rows; C, I and the inverse
+               variance are never held for more than one block.  Rows of C are
+               pixels, so the order in which they are summed does not matter.
+            */
+            int const nRowsPerBlock = std::max(1, DESIGN_MATRIX_BLOCK_PIXELS / nCols);
+            Eigen::MatrixXd cMat;
+            _mMat = Eigen::MatrixXd::Zero(nParameters, nParameters);
+            _bVec = Eigen::VectorXd::Zero(nParameters);
+            for (int blockRow = startRow; blockRow < static_cast<int>(endRow); blockRow += nRowsPerBlock) {
+                int const nRows = std::min(nRowsPerBlock, static_cast<int>(endRow) - blockRow);
+
+                Eigen::MatrixXd eigenScience = eigenScienceFull.block(blockRow, startCol, nRows, nCols);
+                Eigen::MatrixXd eigeniVariance = eigeniVarianceFull.block(blockRow, startCol, nRows, nCols);
+                eigenScience.resize(eigenScience.rows()*eigenScience.cols(), 1);
+                eigeniVariance.resize(eigeniVariance.rows()*eigeniVariance.cols(), 1);
+
+                cMat.resize(nRows*nCols, nParameters);
+                _fillDesignMatrix(templateImage, eigenTemplateFull, basisList, blockRow, nRows, startCol, nCols,
+                                  cMat);
+                if (_fitForBackground)
+                    cMat.col(nParameters-1).fill(1.);
+
+                _mMat += cMat.transpose() * (eigeniVariance.col(0).asDiagonal() * cMat);
+                _bVec += cMat.transpose() * (eigeniVariance.col(0).asDiagonal() * eigenScience.col(0));
+            }
 
-        double time = t.elapsed();
-        LOGL_DEBUG("TRACE3.ip.diffim.StaticKernelSolution.build",
-                   "Total compute time to do basis convolutions : %.2f s", time);
-        t.restart();
+            _cMat.resize(0, 0);
+            _ivVec.resize(0);
+            _iVec.resize(0);
 
-        /*
-           Load matrix with all values from convolvedEigenList : all images
-           (eigeniVariance, convolvedEigenList) must be the same size
-        */
-        Eigen::MatrixXd cMat(eigenTemplate.col(0).size(), nParameters);
-        typename std::vector<Eigen::MatrixXd>::iterator eiterj = convolvedEigenList.begin();
-        typename std::vector<Eigen::MatrixXd>::iterator eiterE = convolvedEigenList.end();
-        for (unsigned int kidxj = 0; eiterj != eiterE; eiterj++, kidxj++) {
-            cMat.col(kidxj) = eiterj->col(0);
+            double time = t.elapsed();
+            LOGL_DEBUG("TRACE3.ip.diffim.StaticKernelSolution.build",
+                       "Total compute time to accumulate normal equations : %.2f s", time);
+            t.restart();
         }
-        /* Treat the last "image" as all 1's to do the background calculation. */
-        if (_fitForBackground)
-            cMat.col(nParameters-1).fill(1.);
+    }
 
-        _cMat = cMat;
-        _ivVec = eigeniVariance.col(0);
-        _iVec = eigenScience.col(0);
+    template <typename InputT>
+    void StaticKernelSolution<InputT>::_fillDesignMatrix(
+        lsst::afw::image::Image<InputT> const &templateImage,
+        Eigen::MatrixXd const &eigenTemplate,
+        lsst::afw::math::KernelList const &basisList,
+        int startRow,
+        int nRows,
+        int startCol,
+        int nCols,
+        Eigen::MatrixXd &cMat
+        ) {
 
-        /* Make these outside of solve() so I can check condition number */
-        _mMat = _cMat.transpose() * (_ivVec.asDiagonal() * _cMat);
-        _bVec = _cMat.transpose() * (_ivVec.asDiagonal() * _iVec);
+        /* Delta function bases are pure integer shifts of the template */
+        bool isDeltaFunction = true;
+        std::vector<std::shared_ptr<afwMath::Kernel> >::const_iterator kiter;
+        for (kiter = basisList.begin(); kiter != basisList.end(); ++kiter) {
+            if (!std::dynamic_pointer_cast<afwMath::DeltaFunctionKernel>(*kiter)) {
+                isDeltaFunction = false;
+                break;
+            }
+        }
+
+        /* Alard-Lupton bases are linear combinations of separable kernels and the first basis */
+        bool isAlardLupton = !isDeltaFunction;
+        for (kiter = basisList.begin(); isAlardLupton && (kiter != basisList.end()); ++kiter) {
+            std::shared_ptr<AlardLuptonKernel> alKernel = std::dynamic_pointer_cast<AlardLuptonKernel>(*kiter);
+            if (!alKernel ||
+                (alKernel->getDimensions() != basisList[0]->getDimensions()) ||
+                (alKernel->getCtr() != basisList[0]->getCtr()) ||
+                ((kiter == basisList.begin()) && (alKernel->getOffset() != 0.))) {
+                isAlardLupton = false;
+            }
+        }
+
+        if (isDeltaFunction) {
+            /* Fill C_i directly from shifted views of the template pixels; no
+               convolution and no intermediate convolved image.
+
+               The convolution by a delta function kernel with its non-zero pixel at
+               (px, py) and center (cx, cy) gives out(x, y) = T(x - cx + px, y - cy + py).
+               In the (y-inverted) Eigen representation of the template this is the
+               block offset by (cy - py) rows and (px - cx) columns from the good
+               pixel region.  Each block is written column-major, matching the
+               ordering of the science and variance pixels in build.
+            */
+            unsigned int kidx = 0;
+            for (kiter = basisList.begin(); kiter != basisList.end(); ++kiter, ++kidx) {
+                std::shared_ptr<afwMath::DeltaFunctionKernel> dfKernel =
+                    std::dynamic_pointer_cast<afwMath::DeltaFunctionKernel>(*kiter);
+                int const rowOffset = dfKernel->getCtrY() - dfKernel->getPixel().getY();
+                int const colOffset = dfKernel->getPixel().getX() - dfKernel->getCtrX();
+
+                Eigen::Map<Eigen::MatrixXd> cBlock(cMat.col(kidx).data(), nRows, nCols);
+                cBlock = eigenTemplate.block(startRow + rowOffset, startCol + colOffset, nRows, nCols);
+            }
+        }
+        else if (isAlardLupton) {
+            /* Convolve with each basis as two 1-D passes over the template pixels.
+
+               Basis i is scale_i * yFactor_i (x) xFactor_i - offset_i * K_0.  The
+               horizontal pass with xFactor_i is made over the good rows plus the
+               kernel height, and is shared between all bases with the same
+               xFactor (all the polynomial terms of a given x degree for a
+               Gaussian).  The vertical pass with yFactor_i then gives the
+               separable part of C_i; the K_0 part is C_0 since K_0 has no offset.
+               Rows of the Eigen representation run in -y, hence the reversed
+               vertical index.
+            */
+            int const kWidth  = basisList[0]->getWidth();
+            int const kHeight = basisList[0]->getHeight();
+            int const kCtrX   = basisList[0]->getCtrX();
+            int const kCtrY   = basisList[0]->getCtrY();
+            int const hStartRow = startRow + kCtrY - (kHeight - 1);
+            int const hRows     = nRows + kHeight - 1;
+
+            std::map<std::vector<double>, Eigen::MatrixXd> horizontalPasses;
+            unsigned int kidx = 0;
+            for (kiter = basisList.begin(); kiter != basisList.end(); ++kiter, ++kidx) {
+                std::shared_ptr<AlardLuptonKernel> alKernel = std::dynamic_pointer_cast<AlardLuptonKernel>(*kiter);
+                std::vector<double> const &xFactor = alKernel->getXFactor();
+                std::vector<double> const &yFactor = alKernel->getYFactor();
+
+                std::map<std::vector<double>, Eigen::MatrixXd>::iterator hiter = horizontalPasses.find(xFactor);
+                if (hiter == horizontalPasses.end()) {
+                    Eigen::MatrixXd hPass = Eigen::MatrixXd::Zero(hRows, nCols);
+                    for (int i = 0; i < kWidth; ++i) {
+                        hPass += xFactor[i] * eigenTemplate.block(hStartRow, startCol - kCtrX + i,
+                                                                  hRows, nCols);
+                    }
+                    hiter = horizontalPasses.insert(std::make_pair(xFactor, hPass)).first;
+                }
+
+                Eigen::Map<Eigen::MatrixXd> cBlock(cMat.col(kidx).data(), nRows, nCols);
+                cBlock.setZero();
+                for (int j = 0; j < kHeight; ++j) {
+                    cBlock += yFactor[j] * hiter->second.block(kHeight - 1 - j, 0, nRows, nCols);
+                }
+                cMat.col(kidx) *= alKernel->getScale();
+                if (alKernel->getOffset() != 0.) {
+                    cMat.col(kidx) -= alKernel->getOffset() * cMat.col(0);
+                }
+            }
+        }
+        else {
+            /* Convolve the rows of the template that contribute to the requested
+               rows; for the full good pixel region this is the whole template.
+            */
+            int const kHeight = basisList[0]->getHeight();
+            int const kCtrY   = basisList[0]->getCtrY();
+            int const subHeight = nRows + kHeight - 1;
+            int const subMinY = templateImage.getHeight() - startRow - nRows - kCtrY;
+            afwGeom::Box2I subBBox(afwGeom::Point2I(0, subMinY),
+                                   afwGeom::Extent2I(templateImage.getWidth(), subHeight));
+            afwImage::Image<InputT> subTemplate(templateImage, subBBox, afwImage::LOCAL, false);
+
+            /* Holds image convolved with basis function */
+            afwImage::Image<PixelT> cimage(subTemplate.getDimensions());
+
+            /* Create C_i in the formalism of Alard & Lupton */
+            unsigned int kidx = 0;
+            for (kiter = basisList.begin(); kiter != basisList.end(); ++kiter, ++kidx) {
+                afwMath::convolve(cimage, subTemplate, **kiter, false); /* cimage stores convolved image */
+
+                Eigen::Map<Eigen::MatrixXd> cBlock(cMat.col(kidx).data(), nRows, nCols);
+                cBlock = imageToEigenMatrix(cimage).block(kHeight - 1 - kCtrY, startCol, nRows, nCols);
+            }
+        }
     }
 
     template <typename InputT>
@@ -656,6 +896,12 @@ namespace diffim {
         /* Make these outside of solve() so I can check condition number */
         this->_mMat = this->_cMat.transpose() * this->_ivVec.asDiagonal() * (this->_cMat);
         this->_bVec = this->_cMat.transpose() * this->_ivVec.asDiagonal() * (this->_iVec);
+
+        if (!this->_storeDesignMatrix) {
+            this->_cMat.resize(0, 0);
+            this->_ivVec.resize(0);
+            this->_iVec.resize(0);
+        }
     }
 
 
@@ -818,6 +1064,11 @@ namespace diffim {
         this->_mMat = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_cMat;
         this->_bVec = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_iVec;
 
+        if (!this->_storeDesignMatrix) {
+            this->_cMat.resize(0, 0);
+            this->_ivVec.resize(0);
+            this->_iVec.resize(0);
+        }
     }
 
     /* NOTE - this was written before the ndarray unification.  I am rewriting
@@ -1049,6 +1300,12 @@ namespace diffim {
         /* Make these outside of solve() so I can check condition number */
         this->_mMat = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_cMat;
         this->_bVec = this->_cMat.transpose() * this->_ivVec.asDiagonal() * this->_iVec;
+
+        if (!this->_storeDesignMatrix) {
+            this->_cMat.resize(0, 0);
+            this->_ivVec.resize(0);
+            this->_iVec.resize(0);
+        }
     }
     /*******************************************************************************************************/
 
@@ -1066,11 +1323,16 @@ namespace diffim {
         _policy(policy)
     {};
 
+    /**
+     * @note The risk is evaluated for every lambda from a single diagonalisation
+     * of the (H, M + lambdaRef H) pencil, where lambdaRef is the "relative"
+     * regularization strength.  With U^T (M + lambdaRef H) U = I and
+     * U^T H U = D, (M + lambda H)^{-1} = U (I + (lambda - lambdaRef) D)^{-1} U^T,
+     * so each lambda only rescales the columns of U rather than requiring a
+     * new factorization.
+     */
     template <typename InputT>
     double RegularizedKernelSolution<InputT>::estimateRisk(double maxCond) {
-        Eigen::MatrixXd vMat      = this->_cMat.jacobiSvd().matrixV();
-        Eigen::MatrixXd vMatvMatT = vMat * vMat.transpose();
-
         /* Find pseudo inverse of mMat, which may be ill conditioned */
         Eigen::SelfAdjointEigenSolver<Eigen::MatrixXd> eVecValues(this->_mMat);
         Eigen::MatrixXd const& rMat = eVecValues.eigenvectors();
@@ -1090,39 +1352,56 @@ namespace diffim {
                 eValues(i) = 1.0 / eValues(i);
             }
         }
-        Eigen::MatrixXd mInv    = rMat * eValues.asDiagonal() * rMat.transpose();
+        Eigen::VectorXd mInvB = rMat * (eValues.asDiagonal() * (rMat.transpose() * this->_bVec));
+
+        /* Diagonalise the pencil once; M + lambdaRef H is positive definite
+           even when M alone is singular */
+        double lambdaRef = 0.0;
+        if (_hMat.trace() > 0.0) {
+            lambdaRef = this->_mMat.trace() / _hMat.trace();
+        }
+        Eigen::GeneralizedSelfAdjointEigenSolver<Eigen::MatrixXd> pencil(
+            _hMat, this->_mMat + lambdaRef * _hMat, Eigen::ComputeEigenvectors | Eigen::Ax_lBx);
+        if (pencil.info() != Eigen::Success) {
+            throw LSST_EXCEPT(pexExcept::Exception,
+                              "Unable to diagonalise regularized kernel matrix");
+        }
+        Eigen::MatrixXd const& uMat = pencil.eigenvectors();
+        Eigen::VectorXd const& dVec = pencil.eigenvalues();
+
+        Eigen::MatrixXd gMat = uMat.transpose() * uMat;          /* Metric of a in the U basis */
+        Eigen::VectorXd cVec = uMat.transpose() * this->_bVec;   /* a = U f c */
+        Eigen::VectorXd pVec = (uMat.transpose() * mInvB).cwiseProduct(cVec);
 
         std::vector<double> lambdas = _createLambdaSteps();
         std::vector<double> risks;
+        Eigen::VectorXd fVec(dVec.size());
         for (unsigned int i = 0; i < lambdas.size(); i++) {
             double l = lambdas[i];
-            Eigen::MatrixXd mLambda = this->_mMat + l * _hMat;
-
-            try {
-                KernelSolution::solve(mLambda, this->_bVec);
-            } catch (pexExcept::Exception &e) {
-                LSST_EXCEPT_ADD(e, "Unable to solve regularized kernel matrix");
-                throw e;
+            for (int j = 0; j < dVec.size(); j++) {
+                fVec(j) = 1.0 / (1.0 + (l - lambdaRef) * dVec(j));
             }
-            Eigen::VectorXd term1 = (this->_aVec.transpose() * vMatvMatT * this->_aVec);
-            if (term1.size() != 1)
-                throw LSST_EXCEPT(pexExcept::Exception, "Matrix size mismatch");
-
-            double term2a = (vMatvMatT * mLambda.inverse()).trace();
+            Eigen::VectorXd fcVec = fVec.cwiseProduct(cVec);
 
-            Eigen::VectorXd term2b = (this->_aVec.transpose() * (mInv * this->_bVec));
-            if (term2b.size() != 1)
-                throw LSST_EXCEPT(pexExcept::Exception, "Matrix size mismatch");
+            /* a^T a */
+            double term1 = fcVec.dot(gMat * fcVec);
+            /* Tr[(M + lambda H)^{-1}] */
+            double term2a = fVec.dot(gMat.diagonal());
+            /* a^T M^{-1} b */
+            double term2b = fVec.dot(pVec);
 
-            double risk   = term1(0) + 2 * (term2a - term2b(0));
+            double risk   = term1 + 2 * (term2a - term2b);
             LOGL_DEBUG("TRACE4.ip.diffim.RegularizedKernelSolution.estimateRisk",
                        "Lambda = %.3f, Risk = %.5e",
                        l, risk);
             LOGL_DEBUG("TRACE5.ip.diffim.RegularizedKernelSolution.estimateRisk",
                        "%.5e + 2 * (%.5e - %.5e)",
-                       term1(0), term2a, term2b(0));
+                       term1, term2a, term2b);
             risks.push_back(risk);
         }
+        if (risks.empty()) {
+            throw LSST_EXCEPT(pexExcept::Exception, "No lambda steps to evaluate the risk over");
+        }
         std::vector<double>::iterator it = min_element(risks.begin(), risks.end());
         int index = distance(risks.begin(), it);
         LOGL_DEBUG("TRACE3.ip.diffim.RegularizedKernelSolution.estimateRisk",
@@ -1150,6 +1429,11 @@ namespace diffim {
                    this->_cMat.rows(), this->_cMat.cols(), this->_ivVec.size(),
                    this->_iVec.size(), _hMat.rows(), _hMat.cols());
 
+        if (!this->_storeDesignMatrix) {
+            throw LSST_EXCEPT(pexExcept::Exception,
+                              "Regularized kernel solution requires the stored design matrix");
+        }
+
         if (DEBUG_MATRIX2) {
             std::cout << "ID: " << (this->_id) << std::endl;
             std::cout << "C:" << std::endl;
@@ -1255,17 +1539,17 @@ namespace diffim {
 
         std::string lambdaStepType = _policy.getString("lambdaStepType");
         if (lambdaStepType == "linear") {
-            double lambdaLinMin   = _policy.getDouble("lambdaLinMin");
-            double lambdaLinMax   = _policy.getDouble("lambdaLinMax");
-            double lambdaLinStep  = _policy.getDouble("lambdaLinStep");
+            double lambdaLinMin   = _policy.getDouble("lambdaMin");
+            double lambdaLinMax   = _policy.getDouble("lambdaMax");
+            double lambdaLinStep  = _policy.getDouble("lambdaStep");
             for (double l = lambdaLinMin; l <= lambdaLinMax; l += lambdaLinStep) {
                 lambdas.push_back(l);
             }
         }
         else if (lambdaStepType == "log") {
-            double lambdaLogMin   = _policy.getDouble("lambdaLogMin");
-            double lambdaLogMax   = _policy.getDouble("lambdaLogMax");
-            double lambdaLogStep  = _policy.getDouble("lambdaLogStep");
+            double lambdaLogMin   = _policy.getDouble("lambdaMin");
+            double lambdaLogMax   = _policy.getDouble("lambdaMax");
+            double lambdaLogStep  = _policy.getDouble("lambdaStep");
             for (double l = lambdaLogMin; l <= lambdaLogMax; l += lambdaLogStep) {
                 lambdas.push_back(pow(10, l));
             }
@@ -1302,6 +1586,7 @@ namespace diffim {
             _constantFirstTerm = true;
         }
         this->_fitForBackground = _policy.getBool("fitForBackground");
+        this->setSolveMethod(parseSolveMethod(_policy.getString("solveMethod")));
 
         _nbases = basisList.size();
         _nkt = _spatialKernelFunction->getParameters().size();
@@ -1338,6 +1623,28 @@ namespace diffim {
 
         LOGL_DEBUG("TRACE5.ip.diffim.SpatialKernelSolution.addConstraint",
                    "Adding candidate at %f, %f", xCenter, yCenter);
+        _addConstraint(xCenter, yCenter, qMat, wVec);
+    }
+
+    /**
+     * @brief Remove the contribution of a candidate previously added with addConstraint
+     *
+     * @note qMat and wVec must be those the candidate was added with.  This
+     * allows the spatial matrices to be updated in place when only a few
+     * candidates change between iterations, instead of being rebuilt.
+     */
+    void SpatialKernelSolution::removeConstraint(float xCenter, float yCenter,
+                                                 Eigen::MatrixXd const& qMat,
+                                                 Eigen::VectorXd const& wVec) {
+
+        LOGL_DEBUG("TRACE5.ip.diffim.SpatialKernelSolution.removeConstraint",
+                   "Removing candidate at %f, %f", xCenter, yCenter);
+        _addConstraint(xCenter, yCenter, -qMat, -wVec);
+    }
+
+    void SpatialKernelSolution::_addConstraint(float xCenter, float yCenter,
+                                               Eigen::MatrixXd const& qMat,
+                                               Eigen::VectorXd const& wVec) {
 
         /* Calculate P matrices */
         /* Pure kernel terms */
@@ -1358,13 +1665,15 @@ namespace diffim {
         if (_fitForBackground) {
             pB = Eigen::VectorXd(_nbt);
 
-            /* Pure background terms */
-            std::vector<double> paramsB = _background->getParameters();
+            /* Pure background terms; evaluated on a copy so that a background
+               returned by getSolutionPair is not modified */
+            afwMath::Kernel::SpatialFunctionPtr background = _background->clone();
+            std::vector<double> paramsB = background->getParameters();
             for (int idx = 0; idx < _nbt; idx++) { paramsB[idx] = 0.0; }
             for (int idx = 0; idx < _nbt; idx++) {
                 paramsB[idx] = 1.0;
-                _background->setParameters(paramsB);
-                pB(idx) = (*_background)(xCenter, yCenter);       /* Assume things don't vary over stamp */
+                background->setParameters(paramsB);
+                pB(idx) = (*background)(xCenter, yCenter);        /* Assume things don't vary over stamp */
                 paramsB[idx] = 0.0;
             }
             pBpBt = (pB * pB.transpose());
@@ -1537,6 +1846,11 @@ namespace diffim {
                     }
                 }
             }
+            /* New kernel, so that a kernel returned by a previous solve is not modified */
+            lsst::afw::math::KernelList basisList = _kernel->getKernelList();
+            _kernel.reset(
+                new afwMath::LinearCombinationKernel(basisList, *_spatialKernelFunction)
+                );
             _kernel->setSpatialParameters(kCoeffs);
         }
 
@@ -1560,6 +1874,7 @@ namespace diffim {
         else {
             bgCoeffs[0] = 0.;
         }
+        _background = _background->clone();
         _background->setParameters(bgCoeffs);
     }
 
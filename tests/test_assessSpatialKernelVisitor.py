@@ -80,6 +80,43 @@ class DiffimTestCases(unittest.TestCase):
         self.assertEqual(askv.getNRejected(), 0)
         self.assertEqual(kc.getStatus(), afwMath.SpatialCellCandidate.GOOD)
 
+    def testGoodThreaded(self):
+        ti = afwImage.MaskedImageF(afwGeom.Extent2I(100, 100))
+        ti.getVariance().set(0.1)
+        ti[50, 50, afwImage.LOCAL] = (1., 0x0, 1.)
+        sKernel = self.makeSpatialKernel(2)
+        si = afwImage.MaskedImageF(ti.getDimensions())
+        afwMath.convolve(si, ti, sKernel, True)
+
+        bbox = afwGeom.Box2I(afwGeom.Point2I(25, 25),
+                             afwGeom.Point2I(75, 75))
+        si = afwImage.MaskedImageF(si, bbox, origin=afwImage.LOCAL)
+        ti = afwImage.MaskedImageF(ti, bbox, origin=afwImage.LOCAL)
+        kcList = [ipDiffim.KernelCandidateF(50., 50., ti, si, self.policy) for i in range(3)]
+
+        sBg = afwMath.PolynomialFunction2D(1)
+        sBg.setParameters([0., 0., 0.])
+
+        bskv = ipDiffim.BuildSingleKernelVisitorF(self.kList, self.policy)
+        bskv.setNThreads(3)
+        for kc in kcList:
+            bskv.processCandidate(kc)
+        bskv.processQueuedCandidates()
+
+        # queued candidates are assessed by processQueuedCandidates
+        askv = ipDiffim.AssessSpatialKernelVisitorF(sKernel, sBg, self.policy)
+        askv.setNThreads(3)
+        for kc in kcList:
+            askv.processCandidate(kc)
+        self.assertEqual(askv.getNProcessed(), 0)
+        askv.processQueuedCandidates()
+
+        self.assertEqual(askv.getNProcessed(), 3)
+        self.assertEqual(askv.getNRejected(), 0)
+        self.assertEqual(askv.getNGood(), 3)
+        for kc in kcList:
+            self.assertEqual(kc.getStatus(), afwMath.SpatialCellCandidate.GOOD)
+
     def testBad(self):
         ti = afwImage.MaskedImageF(afwGeom.Extent2I(100, 100))
         ti.getVariance().set(0.1)
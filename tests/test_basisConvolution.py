@@ -0,0 +1,104 @@
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
+import lsst.ip.diffim as ipDiffim
+
+
+class BasisConvolutionTest(lsst.utils.tests.TestCase):
+
+    def setUp(self):
+        bbox = afwGeom.Box2I(afwGeom.Point2I(30, 50), afwGeom.Extent2I(120, 90))
+        self.maskedImage = afwImage.MaskedImageF(bbox)
+        rng = np.random.RandomState(12345)
+        self.maskedImage.getImage().getArray()[:, :] = rng.normal(100., 10., (90, 120))
+        self.maskedImage.getVariance().getArray()[:, :] = rng.uniform(90., 110., (90, 120))
+        mask = self.maskedImage.getMask()
+        mask.getArray()[40, 60] = mask.getPlaneBitMask("SAT")
+        mask.getArray()[20:23, 30] = mask.getPlaneBitMask("BAD")
+        self.basisList = ipDiffim.makeAlardLuptonBasisList(5, 2, [1.0, 2.5], [2, 1])
+        self.rng = rng
+
+    def tearDown(self):
+        del self.maskedImage
+        del self.basisList
+
+    def makeKernel(self, spatialFunction):
+        kernel = afwMath.LinearCombinationKernel(self.basisList, spatialFunction)
+        nTerms = len(spatialFunction.getParameters())
+        params = [[1.0] + [0.0]*(nTerms - 1)]
+        for i in range(1, len(self.basisList)):
+            params.append(list(self.rng.normal(0., 0.1, nTerms)))
+        kernel.setSpatialParameters(params)
+        return kernel
+
+    def compare(self, kernel, nThreads=1, blockSize=None):
+        expected = afwImage.MaskedImageF(self.maskedImage.getBBox())
+        convControl = afwMath.ConvolutionControl()
+        convControl.setDoNormalize(False)
+        convControl.setDoCopyEdge(False)
+        convControl.setMaxInterpolationDistance(0)
+        afwMath.convolve(expected, self.maskedImage, kernel, convControl)
+
+        result = afwImage.MaskedImageF(self.maskedImage.getBBox())
+        ipDiffim.convolveSpatialBasis(result, self.maskedImage, kernel, nThreads=nThreads,
+                                      blockSize=blockSize)
+
+        bbox = self.maskedImage.getBBox()
+        good = afwGeom.Box2I(bbox.getMin() + afwGeom.Extent2I(kernel.getCtr()),
+                             bbox.getDimensions() - kernel.getDimensions() + afwGeom.Extent2I(1, 1))
+        self.assertFloatsAlmostEqual(result.Factory(result, good).getImage().getArray(),
+                                     expected.Factory(expected, good).getImage().getArray(), rtol=1e-5)
+        self.assertFloatsAlmostEqual(result.Factory(result, good).getVariance().getArray(),
+                                     expected.Factory(expected, good).getVariance().getArray(), rtol=1e-5)
+        self.assertFloatsEqual(result.getMask().getArray(), expected.getMask().getArray())
+        self.assertTrue(np.isnan(result.getImage().getArray()[0, 0]))
+        self.assertEqual(result.getVariance().getArray()[0, 0], np.inf)
+
+    def testPolynomial(self):
+        self.compare(self.makeKernel(afwMath.PolynomialFunction2D(2)))
+
+    def testChebyshev(self):
+        spatialFunction = afwMath.Chebyshev1Function2D(2, afwGeom.Box2D(self.maskedImage.getBBox()))
+        self.compare(self.makeKernel(spatialFunction), nThreads=3)
+
+    def testBlocks(self):
+        # Blocks smaller than the image, overlapping by the kernel size
+        self.compare(self.makeKernel(afwMath.PolynomialFunction2D(2)), nThreads=2, blockSize=24)
+
+    def testConstant(self):
+        kernel = afwMath.LinearCombinationKernel(self.basisList, [1.0] + [0.05]*(len(self.basisList) - 1))
+        self.compare(kernel)
+
+    def testNan(self):
+        kernel = self.makeKernel(afwMath.PolynomialFunction2D(1))
+        self.maskedImage.getImage().getArray()[45, 70] = np.nan
+        result = afwImage.MaskedImageF(self.maskedImage.getBBox())
+        ipDiffim.convolveSpatialBasis(result, self.maskedImage, kernel)
+        array = result.getImage().getArray()
+        self.assertTrue(np.isnan(array[45, 70]))
+        self.assertTrue(np.isnan(array[40:51, 65:76]).all())
+        self.assertTrue(np.isfinite(array[30, 50]))
+
+    def testBadDimensions(self):
+        kernel = self.makeKernel(afwMath.PolynomialFunction2D(1))
+        result = afwImage.MaskedImageF(10, 10)
+        with self.assertRaises(ValueError):
+            ipDiffim.convolveSpatialBasis(result, self.maskedImage, kernel)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
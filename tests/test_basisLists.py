@@ -101,6 +101,29 @@ class DiffimTestCases(unittest.TestCase):
         # right orthogonality
         self.alardLuptonTest(ks)
 
+    def testAlardLuptonFactors(self):
+        kHalfWidth = self.kSize // 2
+        ks = ipDiffim.makeAlardLuptonBasisList(kHalfWidth, 3, [0.7, 1.5, 3.0], [4, 3, 2])
+
+        kim0 = afwImage.ImageD(ks[0].getDimensions())
+        ks[0].computeImage(kim0, False)
+        self.assertEqual(ks[0].getOffset(), 0.0)
+
+        # each basis is a scaled separable kernel minus some of the first basis
+        kim = afwImage.ImageD(ks[0].getDimensions())
+        for kernel in ks:
+            self.assertIsInstance(kernel, ipDiffim.AlardLuptonKernel)
+            kernel.computeImage(kim, False)
+            separable = num.outer(kernel.getYFactor(), kernel.getXFactor())
+            expected = kernel.getScale() * separable - kernel.getOffset() * kim0.getArray()
+            self.assertFloatsAlmostEqual(kim.getArray(), expected, atol=1e-12)
+
+            # clones keep their factorisation
+            clone = kernel.clone()
+            self.assertIsInstance(clone, ipDiffim.AlardLuptonKernel)
+            self.assertEqual(clone.getScale(), kernel.getScale())
+            self.assertEqual(clone.getOffset(), kernel.getOffset())
+
     def testGenerateAlardLupton(self):
         # defaults
         ks = ipDiffim.generateAlardLuptonBasisList(self.subconfigAL)
@@ -223,8 +223,9 @@ class DiffimTestCases(unittest.TestCase):
         self.assertEqual(kc3.getStatus(), afwMath.SpatialCellCandidate.GOOD)
         self.assertEqual(kc4.getStatus(), afwMath.SpatialCellCandidate.BAD)
 
-    def testVisit(self, nCell=3):
+    def testVisit(self, nCell=3, nThreads=1):
         bskv = ipDiffim.BuildSingleKernelVisitorF(self.kList, self.policy)
+        bskv.setNThreads(nThreads)
 
         sizeCellX = self.policy.get("sizeCellX")
         sizeCellY = self.policy.get("sizeCellY")
@@ -249,6 +250,10 @@ class DiffimTestCases(unittest.TestCase):
                 nTot += 1
 
         kernelCellSet.visitCandidates(bskv, 1)
+        if nThreads > 1:
+            # candidates are only queued during the visit
+            self.assertEqual(bskv.getNProcessed(), 0)
+        bskv.processQueuedCandidates()
         self.assertEqual(bskv.getNProcessed(), nTot)
         self.assertEqual(bskv.getNRejected(), 0)
 
@@ -256,6 +261,9 @@ class DiffimTestCases(unittest.TestCase):
             for cand in cell.begin(False):
                 self.assertEqual(cand.getStatus(), afwMath.SpatialCellCandidate.GOOD)
 
+    def testVisitThreaded(self):
+        self.testVisit(nThreads=4)
+
     def tearDown(self):
         del self.config
         del self.policy
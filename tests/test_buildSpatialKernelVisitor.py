@@ -90,6 +90,54 @@ class DiffimTestCases(unittest.TestCase):
         nBgTerms = 1
         self.assertEqual(len(spatialBgSolution), nBgTerms)
 
+    def testRevisit(self):
+        basisList = ipDiffim.makeKernelBasisList(self.subconfig)
+        self.policy.set('spatialKernelOrder', 1)
+        self.policy.set('spatialBgOrder', 1)
+        self.policy.set('fitForBackground', True)
+
+        bbox = afwGeom.Box2I(afwGeom.Point2I(0, 0),
+                             afwGeom.Extent2I(self.size*10, self.size*10))
+
+        bsikv = ipDiffim.BuildSingleKernelVisitorF(basisList, self.policy)
+        bspkv = ipDiffim.BuildSpatialKernelVisitorF(basisList, bbox, self.policy)
+
+        cands = []
+        for x in range(1, self.size, 10):
+            for y in range(1, self.size, 10):
+                cand = self.makeCandidate(1.0 + 0.01 * x, x, y)
+                bsikv.processCandidate(cand)
+                bspkv.processCandidate(cand)
+                cands.append(cand)
+        bspkv.solveLinearEquation()
+
+        # Drop every third candidate and refit one of the others
+        kept = [cand for i, cand in enumerate(cands) if i % 3]
+        oldId = kept[0].getKernelSolution(ipDiffim.KernelCandidateF.RECENT).getId()
+        bsikv.reset()
+        bsikv.setSkipBuilt(False)
+        bsikv.processCandidate(kept[0])
+        self.assertEqual(bsikv.getNProcessed(), 1)
+        newId = kept[0].getKernelSolution(ipDiffim.KernelCandidateF.RECENT).getId()
+        self.assertNotEqual(newId, oldId)
+        bspkv.reset()
+        for cand in kept:
+            bspkv.processCandidate(cand)
+        bspkv.solveLinearEquation()
+        self.assertEqual(bspkv.getNCandidates(), len(kept))
+
+        # Same normal equations as a visitor that only ever saw those
+        fresh = ipDiffim.BuildSpatialKernelVisitorF(basisList, bbox, self.policy)
+        for cand in kept:
+            fresh.processCandidate(cand)
+        fresh.solveLinearEquation()
+
+        mat = bspkv.getKernelSolution().getM()
+        self.assertFloatsAlmostEqual(mat, fresh.getKernelSolution().getM(),
+                                     atol=1e-10 * abs(mat).max())
+        self.assertFloatsAlmostEqual(bspkv.getKernelSolution().getB(), fresh.getKernelSolution().getB(),
+                                     rtol=1e-8, atol=1e-10)
+
     def testModelType(self):
         bbox = afwGeom.Box2I(afwGeom.Point2I(10, 10),
                              afwGeom.Extent2I(10, 10))
@@ -0,0 +1,155 @@
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
+import lsst.ip.diffim as ipDiffim
+
+
+class FftConvolutionTest(lsst.utils.tests.TestCase):
+
+    def setUp(self):
+        bbox = afwGeom.Box2I(afwGeom.Point2I(12, 34), afwGeom.Extent2I(300, 200))
+        self.maskedImage = afwImage.MaskedImageF(bbox)
+        rng = np.random.RandomState(12345)
+        self.maskedImage.getImage().getArray()[:, :] = rng.normal(100., 10., (200, 300))
+        self.maskedImage.getVariance().getArray()[:, :] = rng.uniform(90., 110., (200, 300))
+        mask = self.maskedImage.getMask()
+        mask.getArray()[100, 150] = mask.getPlaneBitMask("SAT")
+        mask.getArray()[50:53, 20] = mask.getPlaneBitMask("BAD")
+
+        # An asymmetric kernel with an off-center center catches flips
+        kernelArray = np.exp(-0.5*((np.arange(17) - 9.)[:, np.newaxis]**2/4. +
+                                   (np.arange(13) - 5.)[np.newaxis, :]**2/9.))
+        kernelArray[2, 3] = -0.05
+        kernelImage = afwImage.ImageD(13, 17)
+        kernelImage.getArray()[:, :] = kernelArray
+        self.kernel = afwMath.FixedKernel(kernelImage)
+        self.kernel.setCtrX(4)
+        self.kernel.setCtrY(10)
+
+    def tearDown(self):
+        del self.maskedImage
+        del self.kernel
+
+    def compare(self, inImage, doCopyEdge):
+        convControl = afwMath.ConvolutionControl(False, doCopyEdge, 0)
+        expected = inImage.Factory(inImage.getBBox())
+        afwMath.convolve(expected, inImage, self.kernel, convControl)
+        result = inImage.Factory(inImage.getBBox())
+        ipDiffim.convolveFft(result, inImage, self.kernel, doCopyEdge=doCopyEdge, blockSize=64)
+
+        if hasattr(inImage, "getMask"):
+            planes = [(result.getImage(), expected.getImage()),
+                      (result.getVariance(), expected.getVariance())]
+            self.assertFloatsEqual(result.getMask().getArray(), expected.getMask().getArray())
+        else:
+            planes = [(result, expected)]
+        for resultPlane, expectedPlane in planes:
+            resultArray = resultPlane.getArray()
+            expectedArray = expectedPlane.getArray()
+            finite = np.isfinite(expectedArray)
+            self.assertFloatsEqual(np.isfinite(resultArray), finite)
+            self.assertFloatsAlmostEqual(resultArray[finite], expectedArray[finite], rtol=1e-5)
+
+    def testMaskedImage(self):
+        self.compare(self.maskedImage, doCopyEdge=False)
+        self.compare(self.maskedImage, doCopyEdge=True)
+
+    def testImage(self):
+        self.compare(self.maskedImage.getImage(), doCopyEdge=False)
+
+    def testNan(self):
+        self.maskedImage.getImage().getArray()[120, 200] = np.nan
+        self.compare(self.maskedImage, doCopyEdge=False)
+
+    def testConvolveImage(self):
+        convControl = afwMath.ConvolutionControl(False, False, 0)
+        direct = afwImage.MaskedImageF(self.maskedImage.getBBox())
+        ipDiffim.convolveImage(direct, self.maskedImage, self.kernel, convControl, fftMinSize=0)
+        fft = afwImage.MaskedImageF(self.maskedImage.getBBox())
+        ipDiffim.convolveImage(fft, self.maskedImage, self.kernel, convControl, fftMinSize=15)
+        good = np.isfinite(direct.getImage().getArray())
+        self.assertFloatsAlmostEqual(fft.getImage().getArray()[good], direct.getImage().getArray()[good],
+                                     rtol=1e-5)
+
+    def testFftBackend(self):
+        array = self.maskedImage.getImage().getArray().astype(float)
+        numpyFft = ipDiffim.FftBackend("numpy")
+        try:
+            scipyFft = ipDiffim.FftBackend("scipy", nThreads=2)
+        except RuntimeError:
+            self.skipTest("scipy.fft is not available")
+        for method in ("fft2", "ifft2", "rfft2"):
+            self.assertFloatsAlmostEqual(getattr(scipyFft, method)(array), getattr(numpyFft, method)(array),
+                                         atol=1e-10*np.abs(array).sum())
+        spectrum = numpyFft.rfft2(array, (256, 320))
+        self.assertFloatsAlmostEqual(scipyFft.irfft2(spectrum, (256, 320)),
+                                     numpyFft.irfft2(spectrum, (256, 320)), atol=1e-10)
+        with self.assertRaises(ValueError):
+            ipDiffim.FftBackend("fftw")
+
+        # The image-sized convolutions also go through the backend
+        expected = afwImage.MaskedImageF(self.maskedImage.getBBox())
+        ipDiffim.convolveFft(expected, self.maskedImage, self.kernel, blockSize=64)
+        result = afwImage.MaskedImageF(self.maskedImage.getBBox())
+        ipDiffim.convolveFft(result, self.maskedImage, self.kernel, blockSize=64, fft=scipyFft)
+        finite = np.isfinite(expected.getImage().getArray())
+        self.assertFloatsAlmostEqual(result.getImage().getArray()[finite],
+                                     expected.getImage().getArray()[finite], rtol=1e-5)
+        self.assertEqual(ipDiffim.goodFftSize(97), 100)
+        self.assertEqual(ipDiffim.goodFftSize(128), 128)
+
+    def testConvolveLowRank(self):
+        kernelImage = afwImage.ImageD(self.kernel.getDimensions())
+        self.kernel.computeImage(kernelImage, False)
+        kernelArray = kernelImage.getArray()
+        for doCopyEdge in (False, True):
+            convControl = afwMath.ConvolutionControl(False, doCopyEdge, 0)
+            expected = afwImage.MaskedImageF(self.maskedImage.getBBox())
+            afwMath.convolve(expected, self.maskedImage, self.kernel, convControl)
+            result = afwImage.MaskedImageF(self.maskedImage.getBBox())
+            ipDiffim.convolveLowRank(result, self.maskedImage, kernelArray,
+                                     kernelCtr=(self.kernel.getCtrY(), self.kernel.getCtrX()),
+                                     doCopyEdge=doCopyEdge)
+            self.assertFloatsEqual(result.getMask().getArray(), expected.getMask().getArray())
+            for resultPlane, expectedPlane in [(result.getImage(), expected.getImage()),
+                                               (result.getVariance(), expected.getVariance())]:
+                resultArray = resultPlane.getArray()
+                expectedArray = expectedPlane.getArray()
+                finite = np.isfinite(expectedArray)
+                self.assertFloatsEqual(np.isfinite(resultArray), finite)
+                self.assertFloatsAlmostEqual(resultArray[finite], expectedArray[finite], rtol=1e-5)
+
+        # A Gaussian is separable
+        gaussian = np.exp(-0.5*((np.arange(15) - 7.)[:, np.newaxis]**2/4. +
+                                (np.arange(11) - 5.)[np.newaxis, :]**2/9.))
+        self.assertEqual(len(ipDiffim.lowRankTerms(gaussian, maxRank=1)[0].T), 1)
+        self.assertIsNone(ipDiffim.lowRankTerms(kernelArray, maxRank=1))
+
+        result = afwImage.MaskedImageF(afwGeom.Extent2I(10, 10))
+        with self.assertRaises(ValueError):
+            ipDiffim.convolveLowRank(result, self.maskedImage, kernelArray)
+
+    def testSpatiallyVarying(self):
+        basisList = ipDiffim.makeAlardLuptonBasisList(5, 1, [2.0], [1])
+        kernel = afwMath.LinearCombinationKernel(basisList, afwMath.PolynomialFunction2D(1))
+        result = afwImage.MaskedImageF(self.maskedImage.getBBox())
+        with self.assertRaises(ValueError):
+            ipDiffim.convolveFft(result, self.maskedImage, kernel)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -85,6 +85,62 @@ def getPsfSecondMoments(psfArray):
     return mxx, myy
 
 
+def makeGridCornersLoop(config, bbox, forceEvenSized=False):
+    """Grid ``bbox`` one box at a time, as `ImageMapReduceTask` once did,
+    returning the corners of the "main" and "expanded" boxes.
+    """
+    cellSizeX, cellSizeY = int(np.rint(config.cellSizeX)), int(np.rint(config.cellSizeY))
+    gridStepX, gridStepY = int(np.rint(config.gridStepX)), int(np.rint(config.gridStepY))
+    borderSizeX, borderSizeY = int(np.rint(config.borderSizeX)), int(np.rint(config.borderSizeY))
+    if config.adjustGridOption == 'spacing':
+        xLinSpace = np.linspace(cellSizeX//2, bbox.getWidth() - cellSizeX//2, bbox.getWidth()//cellSizeX + 1)
+        yLinSpace = np.linspace(cellSizeY//2, bbox.getHeight() - cellSizeY//2,
+                                bbox.getHeight()//cellSizeY + 1)
+    elif config.adjustGridOption == 'size':
+        cellSizeX, cellSizeY = gridStepX, gridStepY
+        xLinSpace = np.arange(cellSizeX//2, bbox.getWidth() + cellSizeX//2, cellSizeX)
+        yLinSpace = np.arange(cellSizeY//2, bbox.getHeight() + cellSizeY//2, cellSizeY)
+        cellSizeX += 1
+        cellSizeY += 1
+    else:
+        xLinSpace = np.arange(cellSizeX//2, bbox.getWidth() + cellSizeX//2, gridStepX)
+        yLinSpace = np.arange(cellSizeY//2, bbox.getHeight() + cellSizeY//2, gridStepY)
+
+    def makeEvenSized(bb):
+        if bb.getWidth() % 2 == 1:
+            bb.include(afwGeom.Point2I(bb.getMaxX() + 1, bb.getMaxY()))
+            bb.clip(bbox)
+            if bb.getWidth() % 2 == 1:
+                bb.include(afwGeom.Point2I(bb.getMinX() - 1, bb.getMaxY()))
+                bb.clip(bbox)
+        if bb.getHeight() % 2 == 1:
+            bb.include(afwGeom.Point2I(bb.getMaxX(), bb.getMaxY() + 1))
+            bb.clip(bbox)
+            if bb.getHeight() % 2 == 1:
+                bb.include(afwGeom.Point2I(bb.getMaxX(), bb.getMinY() - 1))
+                bb.clip(bbox)
+
+    bbox0 = afwGeom.Box2I(afwGeom.Point2I(bbox.getBegin()), afwGeom.Extent2I(cellSizeX, cellSizeY))
+    bbox1 = afwGeom.Box2I(bbox0)
+    bbox1.grow(afwGeom.Extent2I(borderSizeX, borderSizeY))
+    corners0, corners1 = [], []
+    for x in xLinSpace:
+        for y in yLinSpace:
+            offset = afwGeom.Extent2I(int(np.floor(x)) - cellSizeX//2, int(np.floor(y)) - cellSizeY//2)
+            boxes = []
+            for box in (bbox0, bbox1):
+                bb = afwGeom.Box2I(box)
+                bb.shift(offset)
+                bb.clip(bbox)
+                if forceEvenSized:
+                    makeEvenSized(bb)
+                boxes.append(bb)
+            if boxes[0].getArea() > 1 and boxes[1].getArea() > 1:
+                for corners, bb in zip((corners0, corners1), boxes):
+                    corners.append((bb.getMinX(), bb.getMinY(), bb.getMaxX(), bb.getMaxY()))
+    return corners0, corners1
+
+
 class AddAmountImageMapperConfig(ImageMapperConfig):
     """Configuration parameters for the AddAmountImageMapper
     """
@@ -141,6 +197,41 @@ class AddAmountImageMapReduceConfig(ImageMapReduceConfig):
     )
 
 
+class AddCellAmountImageMapper(ImageMapper):
+    """Image mapper subTask that adds a different constant value to each
+    input subexposure, depending on its position
+    """
+    ConfigClass = AddAmountImageMapperConfig
+    _DefaultName = "ip_diffim_AddCellAmountImageMapper"
+
+    @staticmethod
+    def getCellAmount(bbox, addAmount):
+        return addAmount*(bbox.getMinX() + 3.*bbox.getMinY())
+
+    def run(self, subExposure, expandedSubExp, fullBBox, **kwargs):
+        """Add `addAmount` times a function of its position to given
+        `subExposure`.
+
+        Returns
+        -------
+        `pipeBase.Struct` containing (with name 'subExposure') the
+        copy of `subExposure` to which the amount has been added
+        """
+        subExp = subExposure.clone()
+        img = subExp.getMaskedImage().getImage()
+        img += self.getCellAmount(subExp.getBBox(), self.config.addAmount)
+        return pipeBase.Struct(subExposure=subExp)
+
+
+class AddCellAmountImageMapReduceConfig(ImageMapReduceConfig):
+    """Configuration parameters for the AddCellAmountImageMapReduceTask
+    """
+    mapper = pexConfig.ConfigurableField(
+        doc="Mapper subtask to run on each subimage",
+        target=AddCellAmountImageMapper,
+    )
+
+
 class GetMeanImageMapper(ImageMapper):
     """ImageMapper subtask that computes and returns the mean value of the
     input sub-exposure
@@ -256,6 +347,101 @@ class ImageMapReduceTest(lsst.utils.tests.TestCase):
                                      msg='Failed on withNaNs: %s' % str(withNaNs))
         self._testCoaddPsf(newExp)
 
+    def testFeather(self):
+        """Test the 'feather' `reduceOperation`, which should reproduce a
+        constant offset of the input exactly, and 'average' for a zero
+        `featherWidth`.
+        """
+        exposure = self.exposure.clone()
+        afwMath.randomGaussianImage(exposure.getMaskedImage().getImage(), afwMath.Random())
+        exposure.getMaskedImage().getVariance().set(1.)
+        results = {}
+        for reduceOp, featherWidth in (('average', 0.), ('feather', 0.), ('feather', 3.)):
+            config = AddAmountImageMapReduceConfig()
+            config.gridStepX = config.gridStepY = 8.
+            config.mapper.addAmount = 5.
+            config.reducer.reduceOperation = reduceOp
+            config.reducer.featherWidth = featherWidth
+            task = ImageMapReduceTask(config)
+            results[reduceOp, featherWidth] = task.run(exposure).exposure.getMaskedImage()
+
+        mi = exposure.getMaskedImage()
+        for newMI in results.values():
+            self.assertFloatsAlmostEqual(newMI.getImage().getArray() - 5., mi.getImage().getArray(),
+                                         atol=1e-5)
+            self.assertFloatsAlmostEqual(newMI.getVariance().getArray(), mi.getVariance().getArray(),
+                                         rtol=1e-6)
+        self.assertFloatsAlmostEqual(results['feather', 0.].getImage().getArray(),
+                                     results['average', 0.].getImage().getArray(), rtol=1e-6)
+        self._testCoaddPsf(task.run(exposure).exposure)
+
+    def testFeatherWeights(self):
+        """Test that overlapping cells with different values are blended by
+        their raised-cosine weights.
+        """
+        exposure = self.exposure.clone()
+        afwMath.randomGaussianImage(exposure.getMaskedImage().getImage(), afwMath.Random())
+        exposure.getMaskedImage().getVariance().set(1.)
+        featherWidth = 2.
+        config = AddCellAmountImageMapReduceConfig()
+        config.scaleByFwhm = False
+        config.adjustGridOption = 'none'
+        config.gridStepX = config.gridStepY = 8.
+        config.cellSizeX = config.cellSizeY = 12.
+        config.mapper.addAmount = 0.1
+        config.reducer.reduceOperation = 'feather'
+        config.reducer.featherWidth = featherWidth
+        task = ImageMapReduceTask(config)
+        newMI = task.run(exposure).exposure.getMaskedImage()
+
+        def taper(n):
+            distance = np.minimum(np.arange(n), np.arange(n)[::-1]) + 0.5
+            return np.sin(0.5*np.pi*np.minimum(distance/featherWidth, 1.))**2
+
+        image = exposure.getMaskedImage().getImage().getArray()
+        xy0 = exposure.getXY0()
+        weightedSum = np.zeros_like(image, dtype=float)
+        weightSum = np.zeros_like(image, dtype=float)
+        nCells = np.zeros(image.shape, dtype=int)
+        for box in task.boxes0:
+            box = afwGeom.Box2I(box)
+            box.clip(exposure.getBBox())
+            cell = (slice(box.getMinY() - xy0.getY(), box.getMaxY() + 1 - xy0.getY()),
+                    slice(box.getMinX() - xy0.getX(), box.getMaxX() + 1 - xy0.getX()))
+            weights = np.outer(taper(box.getHeight()), taper(box.getWidth()))
+            amount = AddCellAmountImageMapper.getCellAmount(box, config.mapper.addAmount)
+            weightedSum[cell] += weights*(image[cell] + amount)
+            weightSum[cell] += weights
+            nCells[cell] += 1
+
+        # Pixels in overlaps have fractional weights that do not sum to the
+        # number of cells, and their values differ from the plain average
+        overlap = nCells > 1
+        self.assertGreater(overlap.sum(), 0)
+        self.assertTrue(np.any(weightSum[overlap] < nCells[overlap] - 1e-3))
+        covered = weightSum > 0
+        expected = weightedSum[covered]/weightSum[covered]
+        newArr = newMI.getImage().getArray()
+        self.assertFloatsAlmostEqual(newArr[covered], expected, rtol=1e-5, atol=1e-5)
+        # The weights are normalized, so the unchanged variance is reproduced
+        self.assertFloatsAlmostEqual(newMI.getVariance().getArray()[covered], 1., rtol=1e-5)
+
+        # A single overlap pixel of two cells, by hand
+        y, x = np.argwhere(nCells == 2)[0]
+        values, weights = [], []
+        for box in task.boxes0:
+            box = afwGeom.Box2I(box)
+            box.clip(exposure.getBBox())
+            if box.contains(afwGeom.Point2I(int(x) + xy0.getX(), int(y) + xy0.getY())):
+                j = y + xy0.getY() - box.getMinY()
+                i = x + xy0.getX() - box.getMinX()
+                weights.append(taper(box.getHeight())[j]*taper(box.getWidth())[i])
+                values.append(image[y, x] + AddCellAmountImageMapper.getCellAmount(box,
+                                                                                   config.mapper.addAmount))
+        self.assertEqual(len(values), 2)
+        self.assertNotAlmostEqual(values[0], values[1], places=3)
+        self.assertFloatsAlmostEqual(newArr[y, x], np.dot(weights, values)/np.sum(weights), rtol=1e-5)
+
     def _testCoaddPsf(self, newExposure):
         """Test that the new CoaddPsf of the `newExposure` returns PSF images
         ~identical to the input PSF of `self.exposure` across a grid
@@ -338,6 +524,104 @@ class ImageMapReduceTest(lsst.utils.tests.TestCase):
         firstPixel = testExposure.getMaskedImage().getImage().getArray()[0, 0]
         self.assertFloatsAlmostEqual(np.array(subMeans), firstPixel)
 
+    def testParallel(self):
+        """Test that running the mapper over a pool of processes gives
+        results identical to those of the serial run, in the same order.
+        """
+        exposure = self.exposure.clone()
+        afwMath.randomGaussianImage(exposure.getMaskedImage().getImage(), afwMath.Random())
+        results = []
+        for nWorkers in (1, 3):
+            config = AddAmountImageMapReduceConfig()
+            config.gridStepX = config.gridStepY = 8.
+            config.reducer.reduceOperation = 'average'
+            config.nWorkers = nWorkers
+            task = ImageMapReduceTask(config)
+            results.append(task.run(exposure).exposure.getMaskedImage())
+        self.assertFloatsEqual(results[1].getImage().getArray(), results[0].getImage().getArray())
+        self.assertFloatsEqual(results[1].getVariance().getArray(), results[0].getVariance().getArray())
+        self.assertFloatsEqual(results[1].getMask().getArray(), results[0].getMask().getArray())
+
+        config = GetMeanImageMapReduceConfig()
+        config.reducer.reduceOperation = 'none'
+        subMeans = []
+        for nWorkers in (1, 3):
+            config.nWorkers = nWorkers
+            task = ImageMapReduceTask(config)
+            subMeans.append([x.subExposure for x in task.run(exposure).result])
+        self.assertEqual(subMeans[1], subMeans[0])
+
+    def testStreamReduce(self):
+        """Test that reducing the mapper results as they are produced gives
+        results identical to reducing the collected list.
+        """
+        exposure = self.exposure.clone()
+        afwMath.randomGaussianImage(exposure.getMaskedImage().getImage(), afwMath.Random())
+        for reduceOp in ('copy', 'sum', 'average'):
+            results = []
+            for doStreamReduce in (False, True):
+                config = AddAmountImageMapReduceConfig()
+                config.gridStepX = config.gridStepY = 8.
+                config.reducer.reduceOperation = reduceOp
+                config.doStreamReduce = doStreamReduce
+                task = ImageMapReduceTask(config)
+                results.append(task.run(exposure, addNans=True).exposure)
+            mi0, mi1 = results[0].getMaskedImage(), results[1].getMaskedImage()
+            for plane0, plane1 in [(mi0.getImage(), mi1.getImage()), (mi0.getVariance(), mi1.getVariance())]:
+                finite = np.isfinite(plane0.getArray())
+                self.assertFloatsEqual(np.isfinite(plane1.getArray()), finite, msg=reduceOp)
+                self.assertFloatsEqual(plane1.getArray()[finite], plane0.getArray()[finite], msg=reduceOp)
+            self.assertFloatsEqual(mi1.getMask().getArray(), mi0.getMask().getArray(), msg=reduceOp)
+            if reduceOp != 'copy':
+                self._testCoaddPsf(results[1])
+
+    def testRunRegions(self):
+        """Test mapping only the cells overlapping given regions, and mapping
+        further cells on demand.
+        """
+        exposure = self.exposure.clone()
+        afwMath.randomGaussianImage(exposure.getMaskedImage().getImage(), afwMath.Random())
+        config = AddAmountImageMapReduceConfig()
+        config.gridStepX = config.gridStepY = 8.
+        config.reducer.reduceOperation = 'average'
+        task = ImageMapReduceTask(config)
+        fullMI = task.run(exposure).exposure.getMaskedImage()
+
+        task = ImageMapReduceTask(config)
+        point = afwGeom.Point2D(40.2, 70.7)
+        cells = task.runRegions(exposure, [point])
+        expected = [i for i, bb in enumerate(task.boxes0) if bb.contains(afwGeom.Point2I(40, 71))]
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(cells.findCells([point]), expected)
+        self.assertEqual(cells.computedCells, expected)
+        self.assertLess(len(cells.computedCells), len(cells))
+
+        # Results are memoised
+        results = cells.getResults([point])
+        self.assertTrue(all(r1 is r2 for r1, r2 in zip(results, cells.getResults(indices=expected))))
+
+        newMI = cells.reduce().exposure.getMaskedImage()
+        self.assertEqual(newMI.getImage().getArray()[71, 40], fullMI.getImage().getArray()[71, 40])
+
+        box = afwGeom.Box2I(afwGeom.Point2I(0, 0), afwGeom.Extent2I(20, 30))
+        newMI = cells.reduce([box]).exposure.getMaskedImage()
+        self.assertFloatsEqual(newMI.getImage().getArray()[:30, :20], fullMI.getImage().getArray()[:30, :20])
+        self.assertGreater(len(cells.computedCells), len(expected))
+
+        # The cells keep their grid when the task grids a smaller exposure
+        cells = task.runRegions(exposure, [point])
+        boxes0 = list(cells.boxes0)
+        smallExposure = afwImage.ExposureF(afwGeom.Box2I(afwGeom.Point2I(10, 20), afwGeom.Extent2I(24, 32)))
+        smallExposure.setPsf(exposure.getPsf())
+        smallExposure.setWcs(exposure.getWcs())
+        task.run(smallExposure)
+        self.assertLess(len(task.boxes0), len(boxes0))
+        results = cells.getResults()
+        self.assertEqual(len(results), len(boxes0))
+        self.assertEqual([r.subExposure.getBBox() for r in results], boxes0)
+        newMI = cells.reduce().exposure.getMaskedImage()
+        self.assertFloatsEqual(newMI.getImage().getArray(), fullMI.getImage().getArray())
+
     def testCellCentroids(self):
         """Test sample grid task which is provided a set of `cellCentroids` and
         returns the mean of the subimages surrounding those centroids using 'none'
@@ -374,6 +658,60 @@ class ImageMapReduceTest(lsst.utils.tests.TestCase):
         with self.assertRaises(ValueError):
             task.run(self.exposure)
 
+    def testGridCache(self):
+        """Test that grids are shared between tasks with the same config and
+        exposure geometry, and regenerated for a differently sized exposure.
+        """
+        config = AddAmountImageMapReduceConfig()
+        config.gridStepX = config.gridStepY = 8.
+        config.reducer.reduceOperation = 'average'
+        task1 = ImageMapReduceTask(config)
+        task1._generateGrid(self.exposure)
+        task2 = ImageMapReduceTask(config)
+        task2._generateGrid(self.exposure)
+        self.assertIs(task2.corners0, task1.corners0)
+        self.assertIs(task2.corners1, task1.corners1)
+        self.assertEqual(len(task1.boxes0), len(task1.corners0))
+        for bb, corners in zip(task1.boxes0, task1.corners0):
+            self.assertEqual((bb.getMinX(), bb.getMinY(), bb.getMaxX(), bb.getMaxY()), tuple(corners))
+
+        exposure = afwImage.ExposureF(afwGeom.Box2I(afwGeom.Point2I(10, 20), afwGeom.Extent2I(64, 96)))
+        exposure.setPsf(self.exposure.getPsf())
+        exposure.setWcs(self.exposure.getWcs())
+        exposure.getMaskedImage().set(2.)
+        newArr = task1.run(exposure).exposure.getMaskedImage().getImage().getArray()
+        self.assertFloatsAlmostEqual(newArr, 12.)
+        self.assertTrue(all(exposure.getBBox().contains(bb) for bb in task1.boxes1))
+        newArr = task1.run(self.exposure).exposure.getMaskedImage().getImage().getArray()
+        self.assertFloatsAlmostEqual(newArr, 10.)
+        self.assertIs(task1.corners0, task2.corners0)
+
+    def testGridCorners(self):
+        """Test the vectorised grid against gridding one box at a time.
+        """
+        bbox = afwGeom.Box2I(afwGeom.Point2I(10, 20), afwGeom.Extent2I(64, 95))
+        for adjustGridOption in ('spacing', 'size', 'none'):
+            for forceEvenSized in (False, True):
+                for gridStep, cellSize, borderSize in ((8., 8., 3.), (7., 9., 2.), (5., 11., 0.)):
+                    config = AddAmountImageMapReduceConfig()
+                    config.adjustGridOption = adjustGridOption
+                    config.gridStepX = config.gridStepY = gridStep
+                    config.cellSizeX, config.cellSizeY = cellSize, cellSize + 2
+                    config.borderSizeX = config.borderSizeY = borderSize
+                    config.scaleByFwhm = False  # makeGridCornersLoop does not scale by FWHM
+                    task = ImageMapReduceTask(config)
+                    corners0, corners1 = task._computeGridCorners(bbox, forceEvenSized)
+                    expected0, expected1 = makeGridCornersLoop(config, bbox, forceEvenSized)
+                    self.assertGreater(len(expected0), 0)
+                    self.assertEqual([tuple(c) for c in corners0], expected0)
+                    self.assertEqual([tuple(c) for c in corners1], expected1)
+
+        config = AddAmountImageMapReduceConfig()
+        config.scaleByFwhm = True
+        task = ImageMapReduceTask(config)
+        with self.assertRaises(ValueError):
+            task._computeGridCorners(bbox)
+
     def testMasks(self):
         """Test the mask for an exposure produced by a sample grid task
         where we provide a set of `cellCentroids` and thus should have
@@ -22,6 +22,7 @@
 import os
 import unittest
 
+import numpy as np
 
 import lsst.utils.tests
 import lsst.utils
@@ -30,6 +31,7 @@ import lsst.afw.image as afwImage
 import lsst.afw.math as afwMath
 import lsst.ip.diffim as ipDiffim
 import lsst.log.utils as logUtils
+import lsst.pex.exceptions
 
 verbosity = 3
 logUtils.traceSetAt("ip.diffim", verbosity)
@@ -118,6 +120,70 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
         self.runConvolveAndSubtract2(bgOrder=0)
         self.runConvolveAndSubtract2(bgOrder=2)
 
+    def _makeImages(self, imsize=60):
+        rng = np.random.RandomState(12345)
+        bbox = afwGeom.Box2I(afwGeom.Point2I(100, 200), afwGeom.Extent2I(imsize, imsize))
+        tmi = afwImage.MaskedImageF(bbox)
+        tmi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        tmi.variance.array[:, :] = rng.uniform(1., 2., size=(imsize, imsize))
+        tmi.mask.array[10, 10] = 0x1
+        smi = afwImage.MaskedImageF(bbox)
+        smi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        smi.variance.array[:, :] = rng.uniform(1., 2., size=(imsize, imsize))
+        smi.mask.array[20, 30] = 0x2
+        return tmi, smi
+
+    def testConvolveAndSubtractInto(self):
+        # The single pass into a supplied image matches convolving, then
+        # adding the background, subtracting and inverting
+        tmi, smi = self._makeImages()
+        bgFunc = afwMath.PolynomialFunction2D(1)
+        bgFunc.setParameters([3.0, 0.01, -0.02])
+        convolutionControl = afwMath.ConvolutionControl()
+        convolutionControl.setDoNormalize(False)
+
+        # backgrounds are evaluated in parent coordinates
+        xPos = np.arange(tmi.getX0(), tmi.getX0() + tmi.getWidth())
+        yPos = np.arange(tmi.getY0(), tmi.getY0() + tmi.getHeight())
+        bgArray = np.array([[bgFunc(x, y) for x in xPos] for y in yPos])
+
+        # compare away from the edge pixels left by the convolution
+        inner = self.gaussKernel.shrinkBBox(tmi.getBBox())
+
+        def interior(mi):
+            return afwImage.MaskedImageF(mi, inner, afwImage.PARENT)
+
+        for background, bgExpected in ((10.0, 10.0), (bgFunc, bgArray)):
+            for invert in (True, False):
+                expected = afwImage.MaskedImageF(tmi.getBBox())
+                afwMath.convolve(expected, tmi, self.gaussKernel, convolutionControl)
+                expected.image.array[:, :] += bgExpected
+                expected -= smi
+                if invert:
+                    expected *= -1.0
+
+                diffIm = afwImage.MaskedImageF(tmi.getDimensions())
+                ipDiffim.convolveAndSubtract(diffIm, tmi, smi, self.gaussKernel, background, invert)
+                self.assertEqual(diffIm.getXY0(), tmi.getXY0())
+                self.assertMaskedImagesAlmostEqual(interior(diffIm), interior(expected), rtol=1e-6, atol=1e-3)
+
+                # the template Image version takes the science mask and variance
+                diffIm = afwImage.MaskedImageF(tmi.getDimensions())
+                ipDiffim.convolveAndSubtract(diffIm, tmi.image, smi, self.gaussKernel, background, invert)
+                self.assertImagesAlmostEqual(interior(diffIm).image, interior(expected).image,
+                                             rtol=1e-6, atol=1e-3)
+                self.assertMasksEqual(diffIm.mask, smi.mask)
+                self.assertImagesEqual(diffIm.variance, smi.variance)
+
+                # the returned image is the same
+                diffIm2 = ipDiffim.convolveAndSubtract(tmi, smi, self.gaussKernel, background, invert)
+                self.assertMaskedImagesAlmostEqual(interior(diffIm2), interior(expected),
+                                                   rtol=1e-6, atol=1e-3)
+
+        with self.assertRaises(lsst.pex.exceptions.LengthError):
+            diffIm = afwImage.MaskedImageF(afwGeom.Extent2I(10, 10))
+            ipDiffim.convolveAndSubtract(diffIm, tmi, smi, self.gaussKernel, 0.0)
+
 #####
 
 
@@ -22,6 +22,8 @@
 import os
 import unittest
 
+import numpy as np
+
 import lsst.utils.tests
 import lsst.utils
 import lsst.afw.geom as afwGeom
@@ -29,6 +31,7 @@ import lsst.afw.image as afwImage
 import lsst.afw.math as afwMath
 import lsst.ip.diffim as ipDiffim
 import lsst.pex.config as pexConfig
+import lsst.pex.exceptions
 import lsst.log.utils as logUtils
 import lsst.afw.table as afwTable
 
@@ -468,6 +471,170 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
                 self.assertAlmostEqual(kImageOut[i, j, afwImage.LOCAL]/kImageIn[i, j, afwImage.LOCAL],
                                        1.0, 5)
 
+    def _compareBuild(self, kList, imsize=30):
+        """Compare the normal equations from StaticKernelSolution.build with
+        those from explicit basis convolutions.
+        """
+        rng = np.random.RandomState(12345)
+        tmi = afwImage.MaskedImageF(afwGeom.Extent2I(imsize, imsize))
+        tmi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        smi = afwImage.MaskedImageF(afwGeom.Extent2I(imsize, imsize))
+        smi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        var = afwImage.ImageF(afwGeom.Extent2I(imsize, imsize))
+        var.array[:, :] = rng.uniform(1., 2., size=(imsize, imsize))
+
+        bbox = kList[0].shrinkBBox(tmi.getBBox(afwImage.LOCAL))
+        goodSlice = (slice(bbox.getMinY(), bbox.getMaxY() + 1), slice(bbox.getMinX(), bbox.getMaxX() + 1))
+
+        cimage = afwImage.ImageD(tmi.getDimensions())
+        cList = []
+        for kernel in kList:
+            afwMath.convolve(cimage, tmi.image, kernel, False)
+            cList.append(cimage.array[goodSlice].ravel().copy())
+        cList.append(np.ones_like(cList[0]))
+        cMat = np.array(cList).T
+        ivVec = 1./var.array[goodSlice].ravel().astype(np.float64)
+        iVec = smi.image.array[goodSlice].ravel().astype(np.float64)
+
+        mMat = np.dot(cMat.T, ivVec[:, np.newaxis]*cMat)
+        bVec = np.dot(cMat.T, ivVec*iVec)
+        # Either keeping the design matrix or accumulating the normal equations
+        # in blocks of rows
+        for storeDesignMatrix in (True, False):
+            kSoln = ipDiffim.StaticKernelSolutionF(kList, True)
+            kSoln.setStoreDesignMatrix(storeDesignMatrix)
+            kSoln.build(tmi.image, smi.image, var)
+            self.assertFloatsAlmostEqual(kSoln.getM(), mMat, rtol=1e-6, atol=1e-10*np.abs(mMat).max())
+            self.assertFloatsAlmostEqual(kSoln.getB(), bVec, rtol=1e-6, atol=1e-10*np.abs(bVec).max())
+
+    def testDeltaFunctionBuild(self, ksize=5):
+        # The delta function build path fills the design matrix from shifted
+        # template pixels
+        self._compareBuild(ipDiffim.makeDeltaFunctionBasisList(ksize, ksize))
+        self._compareBuild(ipDiffim.makeDeltaFunctionBasisList(ksize, ksize), imsize=150)
+
+    def testAlardLuptonBuild(self, kHalfWidth=3):
+        # The Alard-Lupton build path convolves with the separable factors of
+        # the bases
+        kList = ipDiffim.makeAlardLuptonBasisList(kHalfWidth, 3, [0.7, 1.5, 3.0], [4, 3, 2])
+        self._compareBuild(kList)
+        self._compareBuild(kList, imsize=150)
+
+    def testGenericBuild(self, kHalfWidth=3):
+        # Bases without a special build path are convolved directly
+        kList = ipDiffim.renormalizeKernelList(
+            ipDiffim.makeAlardLuptonBasisList(kHalfWidth, 2, [1.0, 2.5], [2, 1]))
+        self._compareBuild(kList)
+        self._compareBuild(kList, imsize=150)
+
+    def testConditionEstimate(self, ksize=5, imsize=30):
+        # The estimate from the solve bounds the 1-norm condition number from below
+        rng = np.random.RandomState(12345)
+        tmi = afwImage.MaskedImageF(afwGeom.Extent2I(imsize, imsize))
+        tmi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        smi = afwImage.MaskedImageF(afwGeom.Extent2I(imsize, imsize))
+        smi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        smi.variance.set(1.0)
+        kList = ipDiffim.makeDeltaFunctionBasisList(ksize, ksize)
+
+        kSoln = ipDiffim.StaticKernelSolutionF(kList, True)
+        kSoln.build(tmi.image, smi.image, smi.variance)
+        cUnsolved = kSoln.getConditionNumber(ipDiffim.KernelSolution.ESTIMATE)
+        kSoln.solve()
+        cSolved = kSoln.getConditionNumber(ipDiffim.KernelSolution.ESTIMATE)
+        cExact = np.linalg.cond(kSoln.getM(), 1)
+        for cNumber in (cUnsolved, cSolved):
+            self.assertLessEqual(cNumber, cExact*(1 + 1e-6))
+            self.assertGreater(cNumber, 0.1*cExact)
+
+        # Candidates are rejected on the estimate after solving
+        self.policy.set("kernelSize", ksize)
+        self.policy.set("checkConditionNumber", True)
+        self.policy.set("conditionNumberType", "ESTIMATE")
+        self.policy.set("maxConditionNumber", 0.5*cSolved)
+        kc = ipDiffim.KernelCandidateF(0.0, 0.0, tmi, smi, self.policy)
+        kc.build(kList)
+        self.assertEqual(kc.getStatus(), afwMath.SpatialCellCandidate.BAD)
+
+        self.policy.set("maxConditionNumber", 2.0*cSolved)
+        kc = ipDiffim.KernelCandidateF(0.0, 0.0, tmi, smi, self.policy)
+        kc.build(kList)
+        self.assertNotEqual(kc.getStatus(), afwMath.SpatialCellCandidate.BAD)
+
+    def testSolveMethod(self, ksize=5, imsize=30):
+        # Each solver gives the same solution and is recorded
+        rng = np.random.RandomState(12345)
+        tmi = afwImage.MaskedImageF(afwGeom.Extent2I(imsize, imsize))
+        tmi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        smi = afwImage.MaskedImageF(afwGeom.Extent2I(imsize, imsize))
+        smi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        smi.variance.set(1.0)
+        kList = ipDiffim.makeDeltaFunctionBasisList(ksize, ksize)
+
+        kSums = []
+        for method in (ipDiffim.KernelSolution.CHOLESKY_LLT, ipDiffim.KernelSolution.CHOLESKY_LDLT,
+                       ipDiffim.KernelSolution.LU, ipDiffim.KernelSolution.EIGENVECTOR):
+            kSoln = ipDiffim.StaticKernelSolutionF(kList, True)
+            kSoln.setSolveMethod(method)
+            kSoln.build(tmi.image, smi.image, smi.variance)
+            kSoln.solve()
+            self.assertEqual(kSoln.getSolvedBy(), method)
+            kSums.append((kSoln.getKsum(), kSoln.getBackground()))
+        for kSum, background in kSums[1:]:
+            self.assertAlmostEqual(kSum, kSums[0][0], 6)
+            self.assertAlmostEqual(background, kSums[0][1], 4)
+
+        # A singular matrix falls through to the eigenvector solution
+        mMat = kSoln.getM()
+        mMat[3, :] = 0.
+        mMat[:, 3] = 0.
+        bVec = kSoln.getB()
+        bVec[3] = 0.
+        soln = ipDiffim.KernelSolution(mMat, bVec, True)
+        soln.solve()
+        self.assertEqual(soln.getSolvedBy(), ipDiffim.KernelSolution.EIGENVECTOR)
+
+        with self.assertRaises(lsst.pex.exceptions.Exception):
+            ipDiffim.KernelSolution.parseSolveMethod("foo")
+
+    def testRiskScan(self, ksize=5, imsize=30):
+        # The lambda minimizing the risk matches a direct evaluation of the
+        # risk at every lambda
+        self.policy.set("kernelSize", ksize)
+        self.policy.set("regularizationType", "forwardDifference")
+        self.policy.set("lambdaType", "minimizeUnbiasedRisk")
+        self.policy.set("lambdaStepType", "log")
+        self.policy.set("lambdaMin", -2.0)
+        self.policy.set("lambdaMax", 3.0)
+        self.policy.set("lambdaStep", 0.25)
+        hMat = ipDiffim.makeRegularizationMatrix(self.policy)
+        kList = ipDiffim.makeDeltaFunctionBasisList(ksize, ksize)
+
+        rng = np.random.RandomState(12345)
+        tmi = afwImage.MaskedImageF(afwGeom.Extent2I(imsize, imsize))
+        tmi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        smi = afwImage.MaskedImageF(afwGeom.Extent2I(imsize, imsize))
+        smi.image.array[:, :] = rng.normal(100., 10., size=(imsize, imsize))
+        var = afwImage.ImageF(afwGeom.Extent2I(imsize, imsize))
+        var.array[:, :] = rng.uniform(1., 2., size=(imsize, imsize))
+
+        kSoln = ipDiffim.RegularizedKernelSolutionF(kList, True, hMat, self.policy)
+        kSoln.build(tmi.image, smi.image, var)
+        kSoln.solve()
+
+        mMat = kSoln.getM(False)
+        bVec = kSoln.getB()
+        eValues, eVectors = np.linalg.eigh(mMat)
+        eInv = np.array([1./e if e != 0. else 0. for e in eValues])
+        mInvB = np.dot(eVectors, eInv*np.dot(eVectors.T, bVec))
+        lambdas = 10**np.arange(-2.0, 3.0 + 1e-9, 0.25)
+        risks = []
+        for lam in lambdas:
+            mLambda = mMat + lam*hMat
+            aVec = np.linalg.solve(mLambda, bVec)
+            risks.append(np.dot(aVec, aVec) + 2*(np.trace(np.linalg.inv(mLambda)) - np.dot(aVec, mInvB)))
+        self.assertAlmostEqual(kSoln.getLambda(), lambdas[np.argmin(risks)])
+
     def testZeroVariance(self, imsize=50):
         gsize = self.policy.getInt("kernelSize")
         tsize = imsize + gsize
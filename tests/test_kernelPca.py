@@ -199,9 +199,10 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
                 else:
                     self.assertAlmostEqual(imageMean[x, y, afwImage.LOCAL], 0.0)
 
-    def testVisit(self, nCell=3):
+    def testVisit(self, nCell=3, nThreads=1):
         imagePca = ipDiffim.KernelPcaD()
         kpv = ipDiffim.makeKernelPcaVisitor(imagePca)
+        kpv.setNThreads(nThreads)
 
         sizeCellX = self.policy.get("sizeCellX")
         sizeCellY = self.policy.get("sizeCellY")
@@ -227,6 +228,7 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
                 kernelCellSet.insertCandidate(kc)
 
         kernelCellSet.visitCandidates(kpv, 1)
+        kpv.processQueuedCandidates()
         imagePca.analyze()
         eigenImages = imagePca.getEigenImages()
         eigenValues = imagePca.getEigenValues()
@@ -240,6 +242,9 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
         self.assertAlmostEqual(eigenValues[1], 0.0)
         self.assertAlmostEqual(eigenValues[2], 0.0)
 
+    def testVisitThreaded(self):
+        self.testVisit(nThreads=4)
+
 #####
 
 
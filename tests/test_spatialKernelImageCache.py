@@ -0,0 +1,94 @@
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
+import lsst.ip.diffim as ipDiffim
+
+
+class SpatialKernelImageCacheTest(lsst.utils.tests.TestCase):
+
+    def setUp(self):
+        self.bbox = afwGeom.Box2I(afwGeom.Point2I(10, 20), afwGeom.Extent2I(400, 300))
+        basisList = ipDiffim.makeAlardLuptonBasisList(5, 2, [1.0, 2.5], [2, 1])
+        spatialFunction = afwMath.PolynomialFunction2D(2)
+        self.kernel = afwMath.LinearCombinationKernel(basisList, spatialFunction)
+        rng = np.random.RandomState(12345)
+        nTerms = len(spatialFunction.getParameters())
+        params = [[1.0] + [0.0]*(nTerms - 1)]
+        for i in range(1, len(basisList)):
+            params.append(list(rng.normal(0., [0.1, 1e-4, 1e-4, 1e-7, 1e-7, 1e-7][:nTerms])))
+        self.kernel.setSpatialParameters(params)
+        self.kimage = afwImage.ImageD(self.kernel.getDimensions())
+
+    def tearDown(self):
+        del self.kernel
+
+    def computeImage(self, x, y):
+        self.kernel.computeImage(self.kimage, False, x, y)
+        return self.kimage.getArray().copy()
+
+    def testNodes(self):
+        cache = ipDiffim.SpatialKernelImageCache(self.kernel, self.bbox, 5, 4)
+        self.assertEqual(cache.getDimensions(), self.kernel.getDimensions())
+        for y in cache.yGrid:
+            for x in cache.xGrid:
+                self.assertFloatsEqual(cache.computeArray(x, y), self.computeImage(x, y))
+
+    def testInterpolation(self):
+        cache = ipDiffim.SpatialKernelImageCache(self.kernel, self.bbox, 5, 4)
+        errorBound = cache.getErrorBound()
+        self.assertGreater(errorBound, 0.)
+
+        image = afwImage.ImageD(cache.getDimensions())
+        rng = np.random.RandomState(54321)
+        for i in range(20):
+            x = rng.uniform(self.bbox.getMinX(), self.bbox.getMaxX())
+            y = rng.uniform(self.bbox.getMinY(), self.bbox.getMaxY())
+            kSum = cache.computeImage(image, False, x, y)
+            expected = self.computeImage(x, y)
+            self.assertFloatsAlmostEqual(image.getArray(), expected, atol=errorBound*(1 + 1e-6), rtol=0)
+            self.assertAlmostEqual(kSum, image.getArray().sum())
+
+            cache.computeImage(image, True, x, y)
+            self.assertAlmostEqual(image.getArray().sum(), 1.0)
+
+        # A finer grid is more accurate
+        fineCache = ipDiffim.SpatialKernelImageCache(self.kernel, self.bbox, 9, 7)
+        self.assertLess(fineCache.getErrorBound(), errorBound)
+
+    def testConstantKernel(self):
+        kernel = afwMath.FixedKernel(afwImage.ImageD(self.computeImage(100., 100.)))
+        cache = ipDiffim.SpatialKernelImageCache(kernel, self.bbox)
+        self.assertEqual(cache.images.shape[:2], (1, 1))
+        self.assertFloatsEqual(cache.computeArray(300., 50.), self.computeImage(100., 100.))
+        self.assertEqual(cache.getErrorBound(), 0.)
+
+    def testNarrowBBox(self):
+        for extent in (afwGeom.Extent2I(1, 300), afwGeom.Extent2I(400, 1), afwGeom.Extent2I(3, 2)):
+            bbox = afwGeom.Box2I(afwGeom.Point2I(10, 20), extent)
+            cache = ipDiffim.SpatialKernelImageCache(self.kernel, bbox, 5, 4)
+            self.assertEqual(cache.images.shape[:2], (min(4, extent.getY()), min(5, extent.getX())))
+            for y in cache.yGrid:
+                for x in cache.xGrid:
+                    self.assertFloatsEqual(cache.computeArray(x, y), self.computeImage(x, y))
+            x = bbox.getMinX() + 0.4*(extent.getX() - 1)
+            y = bbox.getMinY() + 0.4*(extent.getY() - 1)
+            self.assertFloatsAlmostEqual(cache.computeArray(x, y), self.computeImage(x, y),
+                                         atol=cache.getErrorBound()*(1 + 1e-6) + 1e-12, rtol=0)
+
+
+class TestMemory(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
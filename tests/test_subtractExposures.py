@@ -172,6 +172,93 @@ class DiffimTestCases(lsst.utils.tests.TestCase):
         else:
             self.fail()
 
+    @unittest.skipIf(not defDataDir, "Warning: afwdata is not set up")
+    def testBands(self):
+        templateSubImage = afwImage.ExposureF(self.templateImage, self.bbox)
+        scienceSubImage = afwImage.ExposureF(self.scienceImage, self.bbox)
+
+        # The basis convolution is exact, so bands match the full image
+        self.subconfig.convolutionMode = "basis"
+        psfmatch = ipDiffim.ImagePsfMatchTask(config=self.config)
+        results1 = psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True)
+
+        self.config.maxBandMemory = 8.0
+        psfmatch = ipDiffim.ImagePsfMatchTask(config=self.config)
+        bandHeight = psfmatch._getBandHeight(self.bbox.getWidth(), results1.psfMatchingKernel)
+        self.assertLess(bandHeight, self.bbox.getHeight()//2)
+        results2 = psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True)
+        self.assertIsNone(results2.matchedExposure)
+        with self.assertRaises(ValueError):
+            psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True,
+                                       matchedExposure=afwImage.ExposureF(self.bbox))
+        with self.assertRaises(ValueError):
+            psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True,
+                                       convolveTemplate=False, inPlace=True)
+
+        diffim1 = results1.subtractedExposure.getMaskedImage()
+        diffim2 = results2.subtractedExposure.getMaskedImage()
+        self.assertEqual(diffim1.getBBox(), diffim2.getBBox())
+        # Compare away from the kernel border, which is NaN in both
+        border = results1.psfMatchingKernel.getWidth()
+        interior = (slice(border, -border), slice(border, -border))
+        self.assertFloatsAlmostEqual(diffim1.getImage().getArray()[interior],
+                                     diffim2.getImage().getArray()[interior], rtol=1e-4, atol=1e-3)
+        self.assertFloatsAlmostEqual(diffim1.getVariance().getArray()[interior],
+                                     diffim2.getVariance().getArray()[interior], rtol=1e-4)
+        self.assertFloatsEqual(diffim1.getMask().getArray(), diffim2.getMask().getArray())
+
+    @unittest.skipIf(not defDataDir, "Warning: afwdata is not set up")
+    def testPreallocated(self):
+        templateSubImage = afwImage.ExposureF(self.templateImage, self.bbox)
+        scienceSubImage = afwImage.ExposureF(self.scienceImage, self.bbox)
+        scienceSubImage.getInfo().setApCorrMap(afwImage.ApCorrMap())
+        scienceSubImage.getInfo().setValidPolygon(afwGeom.Polygon(afwGeom.Box2D(self.bbox)))
+        psfmatch = ipDiffim.ImagePsfMatchTask(config=self.config)
+        results1 = psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True)
+        border = results1.psfMatchingKernel.getWidth()
+        interior = (slice(border, -border), slice(border, -border))
+
+        def assertSame(exposure1, exposure2):
+            for plane in ("getImage", "getVariance", "getMask"):
+                array1 = getattr(exposure1.getMaskedImage(), plane)().getArray()
+                array2 = getattr(exposure2.getMaskedImage(), plane)().getArray()
+                self.assertFloatsAlmostEqual(array1[interior], array2[interior], rtol=1e-6)
+
+        for convolveTemplate in (True, False):
+            results1 = psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True,
+                                                  convolveTemplate=convolveTemplate)
+            subtractedExposure = afwImage.ExposureF(self.bbox)
+            matchedExposure = afwImage.ExposureF(self.bbox)
+            results2 = psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True,
+                                                  convolveTemplate=convolveTemplate,
+                                                  subtractedExposure=subtractedExposure,
+                                                  matchedExposure=matchedExposure)
+            self.assertIs(results2.subtractedExposure, subtractedExposure)
+            self.assertIs(results2.matchedExposure, matchedExposure)
+            assertSame(results1.subtractedExposure, subtractedExposure)
+            assertSame(results1.matchedExposure, matchedExposure)
+            self.assertEqual(subtractedExposure.getWcs(), scienceSubImage.getWcs())
+            self.assertTrue(subtractedExposure.getInfo().hasApCorrMap())
+            self.assertEqual(subtractedExposure.getInfo().getValidPolygon(),
+                             scienceSubImage.getInfo().getValidPolygon())
+
+        # Subtract into the science image itself
+        results1 = psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True)
+        scienceCopy = afwImage.ExposureF(scienceSubImage, True)
+        results2 = psfmatch.subtractExposures(templateSubImage, scienceCopy, doWarping=True, inPlace=True)
+        self.assertIs(results2.subtractedExposure, scienceCopy)
+        assertSame(results1.subtractedExposure, scienceCopy)
+
+        with self.assertRaises(ValueError):
+            psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True,
+                                       subtractedExposure=afwImage.ExposureF(10, 10))
+        with self.assertRaises(ValueError):
+            psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True,
+                                       matchedExposure=afwImage.ExposureF(10, 10))
+        with self.assertRaises(ValueError):
+            psfmatch.subtractExposures(templateSubImage, scienceSubImage, doWarping=True,
+                                       subtractedExposure=afwImage.ExposureF(self.bbox), inPlace=True)
+
     def testXY0(self):
         self.runXY0('polynomial')
         self.runXY0('chebyshev1')
@@ -30,6 +30,7 @@ from test_imageDecorrelation import makeFakeImages
 from lsst.ip.diffim.zogy import ZogyTask, ZogyConfig, ZogyMapReduceConfig, \
     ZogyImagePsfMatchConfig, ZogyImagePsfMatchTask
 from lsst.ip.diffim.imageMapReduce import ImageMapReduceTask
+from lsst.ip.diffim.fftConvolution import lowRankTerms, FftBackend
 
 try:
     type(verbose)
@@ -141,6 +142,43 @@ class ZogyTest(lsst.utils.tests.TestCase):
         # This is a known issue with the image-space version.
         self._compareExposures(D_F.D, D_R.D, tol=0.03)
 
+    def testZogyDiffimFourierPrereqs(self):
+        """Check the PSF transforms are reused for the same PSFs and noise,
+        and the real-FFT result matches the full complex FFT one.
+        """
+        self._setUpImages()
+        config = ZogyConfig()
+        task = ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+        res1 = task.computeDiffimFourierSpace(returnMatchedTemplate=True)
+        shape = task.im1.shape
+        preqs = task._computeFourierPrereqs(shape)
+        res2 = task.computeDiffimFourierSpace(returnMatchedTemplate=True)
+        self.assertIs(task._computeFourierPrereqs(shape), preqs)
+        self.assertFloatsEqual(res1.D, res2.D)
+        self.assertFloatsEqual(res1.R_var, res2.R_var)
+
+        # The same difference from complex FFTs of the whole image
+        psf1 = ZogyTask._padPsfToSize(task.im1_psf, shape)
+        psf2 = ZogyTask._padPsfToSize(task.im2_psf, shape)
+        fullPreqs = task.computePrereqs(psf1, psf2, padSize=0)
+        D_hat = (task.Fr*fullPreqs.Pr_hat*np.fft.fft2(task.im2) -
+                 task.Fn*fullPreqs.Pn_hat*np.fft.fft2(task.im1))/fullPreqs.denom
+        D = np.fft.ifftshift(np.fft.ifft2(D_hat).real)/fullPreqs.Fd
+        self.assertFloatsAlmostEqual(res1.D, D, atol=1e-8*np.abs(D).max())
+
+        # A different noise level invalidates them
+        task.sig1 *= 2.
+        self.assertIsNot(task._computeFourierPrereqs(shape), preqs)
+
+        # 255 and 257 pixels pad to 256 and 270
+        config.padToFastFftSize = True
+        task = ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+        self.assertEqual(sorted(task._getFftShape(shape)), [256, 270])
+        res3 = task.computeDiffimFourierSpace()
+        self.assertEqual(res3.D.shape, shape)
+        self.assertTrue(np.all(np.isfinite(res3.D)))
+        self.assertIsNone(res3.R)
+
     def _testZogyScorr(self, varAst=0.):
         """Compute Zogy likelihood images (Scorr) using Fourier- and Real-space methods.
 
@@ -162,6 +200,147 @@ class ZogyTest(lsst.utils.tests.TestCase):
         self._testZogyScorr()
         self._testZogyScorr(varAst=0.1)
 
+    def testZogyComputeAll(self):
+        """Check the single-pass diffim, Scorr and matched template match
+        those computed separately.
+        """
+        self._setUpImages()
+        config = ZogyConfig()
+        task = ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+        res = task.computeAll(xVarAst=0.1, yVarAst=0.1, returnMatchedTemplate=True)
+        task = ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+        D = task.computeDiffim(returnMatchedTemplate=True)
+        S = task.computeScorr(xVarAst=0.1, yVarAst=0.1).S
+
+        for exp1, exp2 in [(res.D, D.D), (res.R, D.R), (res.S, S)]:
+            for plane in ("getImage", "getVariance"):
+                array1 = getattr(exp1.getMaskedImage(), plane)().getArray()
+                array2 = getattr(exp2.getMaskedImage(), plane)().getArray()
+                self.assertFloatsAlmostEqual(array1, array2, atol=1e-5*np.abs(array2).max())
+        self.assertFloatsAlmostEqual(res.S.getPsf().computeKernelImage().getArray(),
+                                     S.getPsf().computeKernelImage().getArray(), atol=1e-10)
+
+        # Without the diffim, the same likelihood image and matched template
+        resNoD = task.computeAll(xVarAst=0.1, yVarAst=0.1, returnMatchedTemplate=True, returnDiffim=False)
+        self.assertIsNone(resNoD.D)
+        for exp1, exp2 in [(resNoD.R, res.R), (resNoD.S, res.S)]:
+            for plane in ("getImage", "getVariance"):
+                array1 = getattr(exp1.getMaskedImage(), plane)().getArray()
+                array2 = getattr(exp2.getMaskedImage(), plane)().getArray()
+                self.assertFloatsAlmostEqual(array1, array2, rtol=1e-10, atol=1e-10*np.abs(array2).max())
+
+        # In image space, Scorr is filtered from the single diffim
+        resImage = task.computeAll(xVarAst=0.1, yVarAst=0.1, inImageSpace=True)
+        S = task.computeScorr(xVarAst=0.1, yVarAst=0.1, inImageSpace=True, padSize=task.padSize).S
+        for plane in ("getImage", "getVariance"):
+            array1 = getattr(resImage.S.getMaskedImage(), plane)().getArray()
+            array2 = getattr(S.getMaskedImage(), plane)().getArray()
+            self.assertFloatsAlmostEqual(array1, array2, atol=1e-10*np.nanmax(np.abs(array2)),
+                                         ignoreNaNs=True)
+
+        # The likelihood image and its variance from complex FFTs of the whole image
+        res = task.computeAllFourierSpace()
+        shape = task.im1.shape
+        psf1 = ZogyTask._padPsfToSize(task.im1_psf, shape)
+        psf2 = ZogyTask._padPsfToSize(task.im2_psf, shape)
+        preqs = task.computePrereqs(psf1, psf2, padSize=0)
+        Pr_hat2 = np.conj(preqs.Pr_hat)*preqs.Pr_hat
+        Pn_hat2 = np.conj(preqs.Pn_hat)*preqs.Pn_hat
+        Kr_hat = task.Fr*task.Fn**2*np.conj(preqs.Pr_hat)*Pn_hat2/preqs.denom**2
+        Kn_hat = task.Fn*task.Fr**2*np.conj(preqs.Pn_hat)*Pr_hat2/preqs.denom**2
+        S = np.fft.ifftshift(np.fft.ifft2(Kn_hat*np.fft.fft2(task.im2) -
+                                          Kr_hat*np.fft.fft2(task.im1)).real)*preqs.Fd
+        S_var = np.fft.ifft2(np.fft.fft2(np.fft.ifft2(Kr_hat).real**2)*np.fft.fft2(task.im1_var) +
+                             np.fft.fft2(np.fft.ifft2(Kn_hat).real**2)*np.fft.fft2(task.im2_var))
+        S_var = np.sqrt(np.fft.ifftshift(S_var.real))*preqs.Fd
+        self.assertFloatsAlmostEqual(res.S, S, atol=1e-8*np.abs(S).max())
+        self.assertFloatsAlmostEqual(res.S_var, S_var, rtol=1e-8)
+
+    def testZogyFloat32(self):
+        """Compare the single- and double-precision Fourier-space results.
+        """
+        self._setUpImages()
+        results = {}
+        for precision in ("float64", "float32"):
+            config = ZogyConfig()
+            config.precision = precision
+            config.fftBackend = self._singlePrecisionFftBackend()
+            task = ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+            results[precision] = task.computeAllFourierSpace(xVarAst=0.1, yVarAst=0.1,
+                                                             returnMatchedTemplate=True)
+
+        for name in ("D", "D_var", "R", "R_var", "S", "S_var"):
+            array32 = getattr(results["float32"], name)
+            array64 = getattr(results["float64"], name)
+            self.assertEqual(array32.dtype, np.float32)
+            self.assertEqual(array64.dtype, np.float64)
+            diff = np.abs(array32 - array64).max()/np.abs(array64).max()
+            if verbose:
+                print("float32 %s: maximum difference %.3g of the maximum" % (name, diff))
+            self.assertLess(diff, 1e-4)
+
+    def testZogyFloat32Transforms(self):
+        """Check that the float32 transforms themselves are single precision,
+        and that a backend upcasting them is rejected.
+        """
+        self._setUpImages()
+        config = ZogyConfig()
+        config.precision = "float32"
+        config.fftBackend = self._singlePrecisionFftBackend()
+        task = ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+        fftShape = task._getFftShape(task.im1.shape)
+        spectra = task._rfft2Planes([task.im1, task.im2], fftShape)
+        self.assertEqual(spectra.dtype, np.complex64)
+        self.assertEqual(task._fft.irfft2(spectra, fftShape).dtype, np.float32)
+        preqs = task._computeFourierPrereqs(fftShape)
+        self.assertEqual(preqs.Pr_hat.dtype, np.complex64)
+        self.assertEqual(preqs.denom.dtype, np.complex64)
+
+        if not FftBackend("numpy").keepsSinglePrecision:
+            config.fftBackend = "numpy"
+            with self.assertRaises(ValueError):
+                ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+
+    def _singlePrecisionFftBackend(self):
+        """Return the name of an FFT backend keeping single precision, or
+        skip the test if there is none.
+        """
+        for name in ("numpy", "scipy"):
+            try:
+                if FftBackend(name).keepsSinglePrecision:
+                    return name
+            except RuntimeError:
+                pass
+        self.skipTest("No FFT backend keeps single precision")
+
+    def testZogyImageSpaceKernels(self):
+        """Compare image-space results with truncated, low-rank kernels to
+        those with the full kernels, and check the kernels are reused.
+        """
+        self._setUpImages()
+        config = ZogyConfig()
+        task = ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+        fullKernel = task._computeImageSpaceKernels(task.padSize).Kr
+        D = task.computeDiffim(inImageSpace=True).D
+        S = task.computeScorr(inImageSpace=True).S
+
+        config = ZogyConfig()
+        config.kernelEnergyFraction = 0.9999
+        config.kernelMaxRank = 3
+        task = ZogyTask(templateExposure=self.im2ex, scienceExposure=self.im1ex, config=config)
+        kernels = task._computeImageSpaceKernels(task.padSize)
+        self.assertIs(task._computeImageSpaceKernels(task.padSize), kernels)
+        # Truncation and the separable terms together keep kernelEnergyFraction of the energy
+        columns, rows = lowRankTerms(kernels.Kr, np.sqrt(config.kernelEnergyFraction))
+        kept = (columns.dot(rows)**2).sum()/(fullKernel**2).sum()
+        self.assertGreaterEqual(kept, config.kernelEnergyFraction - 1e-9)
+        D_fast = task.computeDiffim(inImageSpace=True).D
+        S_fast = task.computeScorr(inImageSpace=True).S
+        self.assertIs(task._computeImageSpaceKernels(task.padSize), kernels)
+
+        self._compareExposures(D_fast, D, tol=0.04)
+        self._compareExposures(S_fast, S, tol=0.04, Scorr=True)
+
     def _testZogyDiffimMapReduced(self, inImageSpace=False, doScorr=False, **kwargs):
         """Test running Zogy using ImageMapReduceTask framework.
 
@@ -205,6 +384,41 @@ class ZogyTest(lsst.utils.tests.TestCase):
         self._testZogyDiffimMapReduced(inImageSpace=False, doScorr=True, xVarAst=0.1, yVarAst=0.1)
         self._testZogyDiffimMapReduced(inImageSpace=True, doScorr=True, xVarAst=0.1, yVarAst=0.1)
 
+    def testZogyMapperPsfCache(self):
+        """Check the PSFs and their transforms are reused across cells, with
+        the same result for these spatially constant PSFs.
+        """
+        self._setUpImages()
+        results = []
+        for cacheSize in (0, 16):
+            config = ZogyMapReduceConfig()
+            config.gridStepX = config.gridStepY = 9
+            config.borderSizeX = config.borderSizeY = 3
+            config.reducer.reduceOperation = 'average'
+            config.mapper.psfCacheSize = cacheSize
+            config.mapper.psfCachePositionQuantum = 1000.
+            task = ImageMapReduceTask(config=config)
+            results.append(task.run(self.im1ex, template=self.im2ex, forceEvenSized=False).exposure)
+
+        self.assertGreater(task.mapper.metadata.get("psfCacheHitRate"), 0.5)
+        self.assertGreater(task.mapper.metadata.get("psfCacheHits"), 0)
+        array1 = results[0].getMaskedImage().getImage().getArray()
+        array2 = results[1].getMaskedImage().getImage().getArray()
+        finite = np.isfinite(array1)
+        self.assertFloatsAlmostEqual(array2[finite], array1[finite], atol=1e-8*np.abs(array1[finite]).max())
+
+        # The image-space kernels are shared by cells whose noise rounds to the same level
+        config = ZogyMapReduceConfig()
+        config.gridStepX = config.gridStepY = 8
+        config.borderSizeX = config.borderSizeY = 6
+        config.reducer.reduceOperation = 'average'
+        config.mapper.psfCacheSize = 16
+        config.mapper.psfCachePositionQuantum = 1000.
+        config.mapper.psfCacheSigmaPrecision = 1.
+        task = ImageMapReduceTask(config=config)
+        task.run(self.im1ex, template=self.im2ex, inImageSpace=True, forceEvenSized=False)
+        self.assertGreater(task.mapper.metadata.get("psfCacheHitRate"), 0.5)
+
     def _testZogyImagePsfMatchTask(self, spatiallyVarying=False, inImageSpace=False,
                                    doScorr=False, **kwargs):
         """Test running Zogy using ZogyImagePsfMatchTask framework.
@@ -227,6 +441,25 @@ class ZogyTest(lsst.utils.tests.TestCase):
         D = task.computeDiffim(inImageSpace=inImageSpace, **kwargs).D
         self._compareExposures(D_fromTask, D, tol=0.04, Scorr=doScorr)
 
+    def testZogyImagePsfMatchTaskOutputs(self):
+        """Check which optional outputs the non-spatially-varying Fourier-space
+        ZogyImagePsfMatchTask computes.
+        """
+        self._setUpImages()
+        config = ZogyImagePsfMatchConfig()
+        task = ZogyImagePsfMatchTask(config=config)
+        result = task.subtractExposures(self.im2ex.clone(), self.im1ex.clone(), doWarping=False,
+                                        spatiallyVarying=False)
+        self.assertIsNone(result.matchedExposure)
+        self.assertFalse(hasattr(result, 'scoreExposure'))
+
+        config.doMatchedTemplate = True
+        task = ZogyImagePsfMatchTask(config=config)
+        result = task.subtractExposures(self.im2ex.clone(), self.im1ex.clone(), doWarping=False,
+                                        spatiallyVarying=False, doPreConvolve=True)
+        self.assertIsNotNone(result.matchedExposure)
+        self.assertIs(result.subtractedExposure, result.scoreExposure)
+
     def testZogyImagePsfMatchTask(self):
         """Test running ZogyTask both with and without the spatiallyVarying option.
         """